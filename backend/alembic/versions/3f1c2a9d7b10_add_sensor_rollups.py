@@ -0,0 +1,60 @@
+"""add sensor rollups
+
+Revision ID: 3f1c2a9d7b10
+Revises: c7e5a0f2d914
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9d7b10'
+down_revision: Union[str, None] = 'c7e5a0f2d914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sensor_rollups',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('resolution', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('gsr_sum', sa.Float(), nullable=False),
+        sa.Column('gsr_min', sa.Float(), nullable=False),
+        sa.Column('gsr_max', sa.Float(), nullable=False),
+        sa.Column('heart_rate_sum', sa.Float(), nullable=False),
+        sa.Column('heart_rate_min', sa.Float(), nullable=False),
+        sa.Column('heart_rate_max', sa.Float(), nullable=False),
+        sa.Column('temperature_sum', sa.Float(), nullable=False),
+        sa.Column('temperature_min', sa.Float(), nullable=False),
+        sa.Column('temperature_max', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'sensor_rollups_user_resolution_bucket_idx',
+        'sensor_rollups',
+        ['user_id', 'resolution', 'bucket_start'],
+        unique=True
+    )
+    op.create_table(
+        'rollup_watermarks',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('last_sensor_data_id', sa.Integer(), nullable=False),
+        sa.Column('pending_sensor_data_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_watermarks')
+    op.drop_index('sensor_rollups_user_resolution_bucket_idx', table_name='sensor_rollups')
+    op.drop_table('sensor_rollups')
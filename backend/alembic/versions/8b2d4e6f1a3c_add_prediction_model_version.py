@@ -0,0 +1,26 @@
+"""add prediction model version
+
+Revision ID: 8b2d4e6f1a3c
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2d4e6f1a3c'
+down_revision: Union[str, None] = '3f1c2a9d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('predictions', sa.Column('model_version', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('predictions', 'model_version')
@@ -0,0 +1,172 @@
+"""initial schema
+
+Revision ID: c7e5a0f2d914
+Revises:
+Create Date: 2026-10-17 08:00:00.000000
+
+Databases created before migrations were tracked already have these tables:
+run `alembic stamp c7e5a0f2d914` once, then `alembic upgrade head`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e5a0f2d914'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('first_name', sa.String(length=100), nullable=False),
+        sa.Column('last_name', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('hashed_password', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('child_name', sa.String(length=100), nullable=True),
+        sa.Column('child_age', sa.Integer(), nullable=True),
+        sa.Column('child_bio', sa.String(length=500), nullable=True),
+        sa.Column('child_avatar', sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_table(
+        'sensor_data',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('gsr', sa.Float(), nullable=False),
+        sa.Column('heart_rate', sa.Float(), nullable=False),
+        sa.Column('temperature', sa.Float(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sensor_data_id'), 'sensor_data', ['id'], unique=False)
+    op.create_index(op.f('ix_sensor_data_timestamp'), 'sensor_data', ['timestamp'], unique=False)
+    op.create_index('sensor_data_user_timestamp_idx', 'sensor_data', ['user_id', 'timestamp'], unique=False)
+    op.create_table(
+        'processed_data',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('gsr_max', sa.Float(), nullable=False),
+        sa.Column('gsr_min', sa.Float(), nullable=False),
+        sa.Column('gsr_mean', sa.Float(), nullable=False),
+        sa.Column('gsr_sd', sa.Float(), nullable=False),
+        sa.Column('hrate_mean', sa.Float(), nullable=False),
+        sa.Column('temp_avg', sa.Float(), nullable=False),
+        sa.Column('sensor_data_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['sensor_data_id'], ['sensor_data.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_processed_data_id'), 'processed_data', ['id'], unique=False)
+    op.create_table(
+        'predictions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('stress_level', sa.Integer(), nullable=False),
+        sa.Column('inference_time', sa.Float(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_predictions_id'), 'predictions', ['id'], unique=False)
+    op.create_index(op.f('ix_predictions_timestamp'), 'predictions', ['timestamp'], unique=False)
+    op.create_index('predictions_user_timestamp_idx', 'predictions', ['user_id', 'timestamp'], unique=False)
+    op.create_table(
+        'notifications',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('prediction_id', sa.Integer(), nullable=False),
+        sa.Column('level', sa.String(length=50), nullable=False),
+        sa.Column('message', sa.String(length=255), nullable=False),
+        sa.Column('recommendation', sa.String(length=255), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('dismissed', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['prediction_id'], ['predictions.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_notifications_id'), 'notifications', ['id'], unique=False)
+    op.create_index('notifications_user_timestamp_idx', 'notifications', ['user_id', 'timestamp'], unique=False)
+    op.create_table(
+        'caregivers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=True),
+        sa.Column('relation_type', sa.String(length=50), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id')
+    )
+    op.create_index(op.f('ix_caregivers_id'), 'caregivers', ['id'], unique=False)
+    op.create_table(
+        'children',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('caregiver_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('age', sa.Integer(), nullable=False),
+        sa.Column('gender', sa.String(length=20), nullable=True),
+        sa.Column('conditions', sa.Text(), nullable=True),
+        sa.Column('allergies', sa.Text(), nullable=True),
+        sa.Column('milestones', sa.Text(), nullable=True),
+        sa.Column('behavioral_notes', sa.Text(), nullable=True),
+        sa.Column('emergency_contacts', sa.Text(), nullable=True),
+        sa.Column('medical_history', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['caregiver_id'], ['caregivers.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_children_id'), 'children', ['id'], unique=False)
+    op.create_table(
+        'dosages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('child_id', sa.Integer(), nullable=False),
+        sa.Column('medication', sa.String(length=100), nullable=False),
+        sa.Column('condition', sa.String(length=100), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('dosage', sa.String(length=50), nullable=False),
+        sa.Column('frequency', sa.String(length=50), nullable=False),
+        sa.Column('intervals', sa.Text(), nullable=True),
+        sa.Column('status', sa.Enum('active', 'inactive', name='dosagestatus'), nullable=False),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['child_id'], ['children.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_dosages_id'), 'dosages', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_dosages_id'), table_name='dosages')
+    op.drop_table('dosages')
+    op.drop_index(op.f('ix_children_id'), table_name='children')
+    op.drop_table('children')
+    op.drop_index(op.f('ix_caregivers_id'), table_name='caregivers')
+    op.drop_table('caregivers')
+    op.drop_index('notifications_user_timestamp_idx', table_name='notifications')
+    op.drop_index(op.f('ix_notifications_id'), table_name='notifications')
+    op.drop_table('notifications')
+    op.drop_index('predictions_user_timestamp_idx', table_name='predictions')
+    op.drop_index(op.f('ix_predictions_timestamp'), table_name='predictions')
+    op.drop_index(op.f('ix_predictions_id'), table_name='predictions')
+    op.drop_table('predictions')
+    op.drop_index(op.f('ix_processed_data_id'), table_name='processed_data')
+    op.drop_table('processed_data')
+    op.drop_index('sensor_data_user_timestamp_idx', table_name='sensor_data')
+    op.drop_index(op.f('ix_sensor_data_timestamp'), table_name='sensor_data')
+    op.drop_index(op.f('ix_sensor_data_id'), table_name='sensor_data')
+    op.drop_table('sensor_data')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_table('users')
+    sa.Enum(name='dosagestatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,57 @@
+'''
+Latency of the compiled array-backed forest against sklearn's RandomForestClassifier.predict,
+for single-row calls (one predict per row, as /predict does) and batched evaluation.
+Also checks that both give the same labels on every input benchmarked.
+
+Run from backend/: python -m benchmarks.bench_compiled_forest
+'''
+import time
+import numpy as np
+from utils.model_utils import load_model
+from utils.compiled_forest import CompiledForest, compile_forest
+from utils.data_processing import FEATURE_NAMES
+
+BATCH_SIZES = [1, 100, 10_000]
+SINGLE_ROW_CALLS = 500
+REPEATS = 5
+
+def best_of(fn, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    # Both sides take scaled features: unwrap the sklearn estimator from the pipeline
+    model = load_model(compiled=False).model
+    if isinstance(model, CompiledForest):
+        raise SystemExit("The served artifact is already compiled; point MODEL_PATH at a bare sklearn model")
+    start = time.perf_counter()
+    forest = compile_forest(model)
+    print(
+        f"Compiled {forest.n_trees} trees / {forest.n_nodes} nodes (depth {forest.max_depth}) "
+        f"in {(time.perf_counter() - start) * 1000:.1f}ms"
+    )
+    rng = np.random.default_rng(42)
+
+    rows = rng.uniform(0.0, 1.0, size=(SINGLE_ROW_CALLS, len(FEATURE_NAMES)))
+    sk = best_of(lambda: [model.predict(row[np.newaxis, :]) for row in rows], repeats=1)
+    compiled = best_of(lambda: [forest.predict(row[np.newaxis, :]) for row in rows], repeats=1)
+    print(f"{'single row':>10} {'sklearn (us/row)':>18} {'compiled (us/row)':>18} {'speedup':>9}")
+    print(
+        f"{1:>10} {sk / SINGLE_ROW_CALLS * 1e6:>18.1f} {compiled / SINGLE_ROW_CALLS * 1e6:>18.1f} "
+        f"{sk / compiled:>8.1f}x"
+    )
+
+    print(f"{'batch':>10} {'sklearn (us/row)':>18} {'compiled (us/row)':>18} {'speedup':>9}")
+    for n in BATCH_SIZES:
+        X = rng.uniform(0.0, 1.0, size=(n, len(FEATURE_NAMES)))
+        assert np.array_equal(model.predict(X), forest.predict(X)), "compiled forest disagrees with sklearn"
+        sk = best_of(lambda: model.predict(X))
+        compiled = best_of(lambda: forest.predict(X))
+        print(f"{n:>10} {sk / n * 1e6:>18.1f} {compiled / n * 1e6:>18.1f} {sk / compiled:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+'''
+Peak RSS of history export for 1, 30 and 365 days of synthetic 1 Hz data.
+Compares the streaming NDJSON path (lazy merge + chunked serialisation)
+against building the merged list in memory and serialising it at once,
+as /history/processed_data does. Each case runs in a fresh process so
+ru_maxrss is not polluted by earlier cases. The database is not involved;
+rows come from generators shaped like the cursor rows.
+
+Run from backend/: python -m benchmarks.bench_history_export [--hz 1.0]
+'''
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+from utils.history_export import merge_by_timestamp, ndjson_chunks
+
+DAYS = [1, 30, 365]
+PREDICTION_INTERVAL = 300
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+async def sensor_rows(start, n, step):
+    for i in range(n):
+        yield (start + timedelta(seconds=i * step), 80.0 + i % 40, 36.5 + (i % 10) / 10, 2.0 + (i % 50) / 10)
+
+async def prediction_rows(start, n):
+    for i in range(n):
+        yield (start + timedelta(seconds=i * PREDICTION_INTERVAL), i % 4)
+
+async def run_streaming(start, n_sensor, step, n_pred):
+    written = 0
+    async for chunk in ndjson_chunks(merge_by_timestamp(sensor_rows(start, n_sensor, step), prediction_rows(start, n_pred))):
+        written += len(chunk)
+    return written
+
+async def run_materialised(start, n_sensor, step, n_pred):
+    sensor = [row async for row in sensor_rows(start, n_sensor, step)]
+    predictions = [row async for row in prediction_rows(start, n_pred)]
+    sensor_dict = {s[0]: {"heart_rate": s[1], "temperature": s[2], "gsr": s[3]} for s in sensor}
+    prediction_dict = {p[0]: p[1] for p in predictions}
+    combined = []
+    for timestamp in sorted(set(sensor_dict) | set(prediction_dict)):
+        entry = {"timestamp": timestamp.isoformat()}
+        if timestamp in sensor_dict:
+            entry.update(sensor_dict[timestamp])
+        if timestamp in prediction_dict:
+            entry["stress_level"] = prediction_dict[timestamp]
+        combined.append(entry)
+    return len(json.dumps(combined))
+
+def run_case(mode, days, hz, queue):
+    start = datetime(2026, 1, 1)
+    step = 1.0 / hz
+    n_sensor = int(days * 86400 * hz)
+    n_pred = int(days * 86400 / PREDICTION_INTERVAL)
+    runner = run_streaming if mode == "streaming" else run_materialised
+    began = time.perf_counter()
+    size = asyncio.run(runner(start, n_sensor, step, n_pred))
+    queue.put((n_sensor + n_pred, size, time.perf_counter() - began, peak_rss_mb()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hz", type=float, default=1.0, help="sensor sampling rate")
+    parser.add_argument("--max-materialised-rows", type=int, default=5_000_000,
+                        help="skip the in-memory baseline above this many rows")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'days':>5} {'mode':>13} {'rows':>12} {'MB out':>9} {'seconds':>9} {'peak RSS MB':>12}")
+    for days in DAYS:
+        for mode in ("streaming", "materialised"):
+            if mode == "materialised" and days * 86400 * args.hz > args.max_materialised_rows:
+                print(f"{days:>5} {mode:>13} {'skipped (--max-materialised-rows)':>45}")
+                continue
+            queue = ctx.Queue()
+            process = ctx.Process(target=run_case, args=(mode, days, args.hz, queue))
+            process.start()
+            rows, size, seconds, rss = queue.get()
+            process.join()
+            print(f"{days:>5} {mode:>13} {rows:>12} {size / 1e6:>9.1f} {seconds:>9.1f} {rss:>12.1f}")
+
+if __name__ == "__main__":
+    main()
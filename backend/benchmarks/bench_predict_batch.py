@@ -0,0 +1,46 @@
+'''
+Micro-benchmark for per-row inference cost.
+Compares predict_stress called once per row against predict_stress_batch
+over a single (n_users, 6) matrix at batch sizes 1, 100 and 10k.
+
+Run from backend/: python -m benchmarks.bench_predict_batch
+'''
+import time
+import numpy as np
+from utils.model_utils import load_model, predict_stress, predict_stress_batch
+from utils.data_processing import FEATURE_NAMES
+
+BATCH_SIZES = [1, 100, 10_000]
+REPEATS = 5
+
+def random_features(n, rng):
+    # Roughly the ranges seen in ASD_data.csv
+    low = np.array([0.5, 0.1, 0.3, 0.0, 60.0, 35.5])
+    high = np.array([15.0, 6.0, 10.0, 4.0, 180.0, 40.0])
+    return rng.uniform(low, high, size=(n, len(FEATURE_NAMES)))
+
+def best_of(fn, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    model = load_model()
+    rng = np.random.default_rng(42)
+    print(f"{'batch':>8} {'per-row loop (us/row)':>24} {'batched (us/row)':>18} {'speedup':>9}")
+    for n in BATCH_SIZES:
+        X = random_features(n, rng)
+        rows = [dict(zip(FEATURE_NAMES, row)) for row in X]
+        # Cap the per-row loop so the 10k case finishes in reasonable time
+        loop_rows = rows[:min(n, 500)]
+        loop = best_of(lambda: [predict_stress(model, f) for f in loop_rows], repeats=1 if n > 100 else REPEATS)
+        batched = best_of(lambda: predict_stress_batch(model, X))
+        loop_us = loop / len(loop_rows) * 1e6
+        batched_us = batched / n * 1e6
+        print(f"{n:>8} {loop_us:>24.1f} {batched_us:>18.1f} {loop_us / batched_us:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
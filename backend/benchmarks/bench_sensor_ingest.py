@@ -0,0 +1,92 @@
+'''
+Throughput benchmark for sensor ingestion against a running API.
+Compares rows/s for one reading per POST /sensor/data against
+POST /sensor/data/batch (JSON) and POST /sensor/data/batch/packed (binary).
+
+Run from backend/ with the server up:
+    python -m benchmarks.bench_sensor_ingest --url http://localhost:8000 --user-id 1
+'''
+import argparse
+import asyncio
+import time
+import httpx
+import numpy as np
+from routes_api.sensors import PACKED_READING
+
+def make_readings(n, rng):
+    now = time.time()
+    readings = np.zeros(n, dtype=PACKED_READING)
+    readings["timestamp"] = now - np.arange(n)[::-1]
+    readings["gsr"] = rng.uniform(0.5, 10.0, n)
+    readings["heart_rate"] = rng.uniform(60.0, 140.0, n)
+    readings["temperature"] = rng.uniform(35.5, 39.5, n)
+    return readings
+
+async def bench_single(client, user_id, readings, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(reading):
+        async with semaphore:
+            response = await client.post("/sensor/data", json={
+                "user_id": user_id,
+                "gsr": float(reading["gsr"]),
+                "heart_rate": float(reading["heart_rate"]),
+                "temperature": float(reading["temperature"]),
+            })
+            response.raise_for_status()
+
+    await asyncio.gather(*(post(r) for r in readings))
+
+async def bench_json_batch(client, user_id, readings, batch_size):
+    for start in range(0, len(readings), batch_size):
+        chunk = readings[start:start + batch_size]
+        response = await client.post("/sensor/data/batch", json={
+            "user_id": user_id,
+            "readings": [
+                {
+                    "timestamp": float(r["timestamp"]),
+                    "gsr": float(r["gsr"]),
+                    "heart_rate": float(r["heart_rate"]),
+                    "temperature": float(r["temperature"]),
+                }
+                for r in chunk
+            ],
+        })
+        response.raise_for_status()
+
+async def bench_packed_batch(client, user_id, readings, batch_size):
+    for start in range(0, len(readings), batch_size):
+        response = await client.post(
+            "/sensor/data/batch/packed",
+            params={"user_id": user_id},
+            content=readings[start:start + batch_size].tobytes(),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        response.raise_for_status()
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--batch-size", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    readings = make_readings(args.rows, np.random.default_rng(42))
+    async with httpx.AsyncClient(base_url=args.url, timeout=30.0) as client:
+        runs = [
+            (f"single POST x{args.concurrency}", bench_single(client, args.user_id, readings, args.concurrency)),
+            (f"JSON batch of {args.batch_size}", bench_json_batch(client, args.user_id, readings, args.batch_size)),
+            (f"packed batch of {args.batch_size}", bench_packed_batch(client, args.user_id, readings, args.batch_size)),
+        ]
+        print(f"{'path':>24} {'rows/s':>10}")
+        for name, run in runs:
+            start = time.perf_counter()
+            await run
+            elapsed = time.perf_counter() - start
+            print(f"{name:>24} {args.rows / elapsed:>10.0f}")
+    print(f"Packed record size: {PACKED_READING.itemsize} bytes")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+'''
+Load test for WebSocketManager.broadcast and ping with many simulated clients.
+Fake sockets are registered directly with a fresh manager; a fraction of them
+are slow (sleep longer than the send timeout) to show that stalled peers do not
+hold back everyone else and are evicted in bulk.
+
+Run from backend/: python -m benchmarks.bench_ws_load --clients 10000 --slow 0.01
+'''
+import argparse
+import asyncio
+import os
+import random
+import time
+from starlette.websockets import WebSocketState
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--slow", type=float, default=0.01, help="fraction of clients that stall")
+    parser.add_argument("--stall", type=float, default=5.0, help="seconds a slow client blocks each send")
+    parser.add_argument("--latency", type=float, default=0.002, help="max send latency of a normal client")
+    parser.add_argument("--timeout", type=float, default=1.0, help="WS_SEND_TIMEOUT")
+    parser.add_argument("--concurrency", type=int, default=500, help="WS_BROADCAST_CONCURRENCY")
+    parser.add_argument("--rounds", type=int, default=5)
+    return parser.parse_args()
+
+class FakeWebSocket:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.client_state = WebSocketState.CONNECTED
+        self.received = 0
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(self.delay)
+        self.received += 1
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.client_state = WebSocketState.DISCONNECTED
+
+async def run(args):
+    from utils.websocket_manager import WebSocketManager
+    manager = WebSocketManager()
+    rng = random.Random(42)
+    n_slow = int(args.clients * args.slow)
+    sockets = [FakeWebSocket(args.stall) for _ in range(n_slow)]
+    sockets += [FakeWebSocket(rng.uniform(0, args.latency)) for _ in range(args.clients - n_slow)]
+    rng.shuffle(sockets)
+    for i, websocket in enumerate(sockets):
+        await manager.connect(websocket, str(i))
+
+    print(f"clients={args.clients} slow={n_slow} timeout={args.timeout}s concurrency={args.concurrency}")
+    print(f"{'round':>5} {'op':>9} {'connected':>10} {'seconds':>9}")
+    for round_no in range(args.rounds):
+        for op in ("broadcast", "ping"):
+            connected = len(manager.subscribers())
+            start = time.perf_counter()
+            if op == "broadcast":
+                await manager.broadcast(f'{{"type": "announcement", "round": {round_no}}}')
+            else:
+                failed = await manager._send_all(manager.subscribers(), "ping")
+                await manager._evict(failed, "ping")
+            print(f"{round_no:>5} {op:>9} {connected:>10} {time.perf_counter() - start:>9.3f}")
+
+    delivered = sum(ws.received for ws in sockets)
+    print(f"Remaining connections: {len(manager.subscribers())}, messages delivered: {delivered}")
+    for subscriber in manager.subscribers():
+        subscriber.task.cancel()
+
+def main():
+    args = parse_args()
+    # Must be set before config is imported
+    os.environ["WS_SEND_TIMEOUT"] = str(args.timeout)
+    os.environ["WS_BROADCAST_CONCURRENCY"] = str(args.concurrency)
+    import logging
+    logging.getLogger("websocket_manager").setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
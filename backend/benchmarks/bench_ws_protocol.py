@@ -0,0 +1,101 @@
+'''
+Bandwidth and CPU of the WebSocket sensor stream per wire format.
+Simulates a 1 Hz x 3-channel stream fanned out to N clients for a number of seconds
+and compares JSON text, JSON + permessage-deflate, binary (auticare.bin.v1) and
+binary + permessage-deflate, for every-reading ("immediate") and 1 s "batch" delivery.
+
+Encoding happens once per message (shared by all clients); permessage-deflate keeps
+a compressor per connection (context takeover), so its cost is paid once per client.
+The deflate cost is measured on a sample of clients and scaled to N.
+
+Run from backend/: python -m benchmarks.bench_ws_protocol --clients 1000 --seconds 60
+'''
+import argparse
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from utils.ws_protocol import sensor_record, encode_sensor_frame
+
+# Clients whose deflate streams are actually compressed
+DEFLATE_SAMPLE = 50
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--batch", type=int, default=5, help="readings per frame in batch mode")
+    return parser.parse_args()
+
+def sensor_messages(seconds: int):
+    start = datetime.utcnow()
+    for i in range(seconds):
+        yield json.dumps({
+            "type": "sensor_data",
+            "timestamp": (start + timedelta(seconds=i)).isoformat(),
+            "heart_rate": round(random.gauss(85, 8), 1),
+            "temperature": round(random.gauss(36.6, 0.3), 2),
+            "gsr": round(random.gauss(450, 40), 1),
+            "stress_level": random.choice([0, 1, 2, None])
+        })
+
+def json_frames(messages, batch):
+    if batch == 1:
+        return list(messages)
+    return [
+        '{"type": "sensor_batch", "data": [' + ", ".join(messages[i:i + batch]) + "]}"
+        for i in range(0, len(messages), batch)
+    ]
+
+def binary_frames(messages, batch):
+    records = [sensor_record(m) for m in messages]
+    return [encode_sensor_frame(records[i:i + batch], min(i + batch, len(records))) for i in range(0, len(records), batch)]
+
+def deflated(frames):
+    """Wire bytes and seconds for one connection's permessage-deflate stream."""
+    compressor = zlib.compressobj(wbits=-15)
+    size = 0
+    started = time.perf_counter()
+    for frame in frames:
+        data = frame.encode() if isinstance(frame, str) else frame
+        # RFC 7692: each message ends with a sync flush whose 4-byte tail is not sent
+        size += len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return size, time.perf_counter() - started
+
+def run_case(name, encode, messages, batch, clients, deflate):
+    started = time.perf_counter()
+    frames = encode(messages, batch)
+    encode_seconds = time.perf_counter() - started
+
+    if deflate:
+        results = [deflated(frames) for _ in range(min(DEFLATE_SAMPLE, clients))]
+        per_client_bytes = sum(size for size, _ in results) / len(results)
+        deflate_seconds = sum(seconds for _, seconds in results) / len(results) * clients
+    else:
+        per_client_bytes = sum(len(f.encode() if isinstance(f, str) else f) for f in frames)
+        deflate_seconds = 0.0
+
+    seconds = len(messages)
+    cpu_ms_per_s = (encode_seconds + deflate_seconds) / seconds * 1000
+    print(
+        f"{name:<26} {len(frames) * clients / seconds:>9.0f} "
+        f"{per_client_bytes / seconds:>12.1f} "
+        f"{per_client_bytes * clients / seconds / 1024:>12.1f} "
+        f"{cpu_ms_per_s:>12.3f}"
+    )
+
+def main():
+    args = parse_args()
+    random.seed(0)
+    messages = list(sensor_messages(args.seconds))
+    print(f"{args.clients} clients, 1 Hz x 3 channels, {args.seconds}s of readings")
+    print(f"{'format':<26} {'frames/s':>9} {'B/s/client':>12} {'KiB/s total':>12} {'CPU ms/s':>12}")
+    for batch, label in [(1, "immediate"), (args.batch, f"batch x{args.batch}")]:
+        run_case(f"json {label}", json_frames, messages, batch, args.clients, deflate=False)
+        run_case(f"json+deflate {label}", json_frames, messages, batch, args.clients, deflate=True)
+        run_case(f"binary {label}", binary_frames, messages, batch, args.clients, deflate=False)
+        run_case(f"binary+deflate {label}", binary_frames, messages, batch, args.clients, deflate=True)
+
+if __name__ == "__main__":
+    main()
@@ -11,4 +11,64 @@ ACCESS_TOKEN_EXPIRE_MINUTES:int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 3
 DATABASE_URL = os.getenv("DATABASE_URL")
 WEBSOCKET_URL = os.getenv("WEBSOCKET_URL")
 
+# Scheduler: number of users processed concurrently per tick (one DB session per worker)
+SCHEDULER_CONCURRENCY:int = int(os.getenv("SCHEDULER_CONCURRENCY", 8))
+# Scheduler: extract features for all users in one grouped query instead of one query per user
+SCHEDULER_BATCH_FEATURES:bool = os.getenv("SCHEDULER_BATCH_FEATURES", "true").lower() == "true"
+# Scheduler: read features from the in-memory rolling windows instead of the database.
+# Only valid when every reading is ingested by this process (single worker).
+SCHEDULER_STREAM_FEATURES:bool = os.getenv("SCHEDULER_STREAM_FEATURES", "false").lower() == "true"
+# Scheduler: where users with new readings are found. "auto" uses the in-memory index once it has
+# watched a full window and a grouped sensor_data query before that, and always queries when
+# WS_BACKPLANE is not "inprocess" (several API processes ingesting); "db" always queries; "memory" never does.
+ACTIVE_USERS_SOURCE:str = os.getenv("ACTIVE_USERS_SOURCE", "auto")
+# Scheduler: which process runs the jobs. "auto": the holder of a Postgres advisory lock, so one of
+# several workers; "true": this process; "false": never here. Lock retry/health check interval (seconds)
+RUN_SCHEDULER:str = os.getenv("RUN_SCHEDULER", "auto").lower()
+SCHEDULER_LOCK_RETRY:float = float(os.getenv("SCHEDULER_LOCK_RETRY", 15.0))
+
 # openssl rand -hex 32 
+
+# Sensor ingestion write-behind buffer
+INGEST_BATCH_SIZE:int = int(os.getenv("INGEST_BATCH_SIZE", 500))
+INGEST_FLUSH_INTERVAL:float = float(os.getenv("INGEST_FLUSH_INTERVAL", 0.5))
+INGEST_MAX_PENDING:int = int(os.getenv("INGEST_MAX_PENDING", 10000))
+INGEST_SUBMIT_TIMEOUT:float = float(os.getenv("INGEST_SUBMIT_TIMEOUT", 5.0))
+# "sync": acknowledge after the batch commits; "async": acknowledge once queued
+INGEST_DURABILITY:str = os.getenv("INGEST_DURABILITY", "sync")
+# Longest a sync submitter waits for its batch to commit (seconds)
+INGEST_COMMIT_TIMEOUT:float = float(os.getenv("INGEST_COMMIT_TIMEOUT", 10.0))
+
+# WebSocket fan-out: per-connection send queue length and send timeout (seconds)
+WS_SEND_QUEUE_SIZE:int = int(os.getenv("WS_SEND_QUEUE_SIZE", 100))
+WS_SEND_TIMEOUT:float = float(os.getenv("WS_SEND_TIMEOUT", 10.0))
+# WebSocket broadcast/ping: sends in flight at once
+WS_BROADCAST_CONCURRENCY:int = int(os.getenv("WS_BROADCAST_CONCURRENCY", 500))
+# WebSocket backplane across worker processes: "inprocess", "postgres" (LISTEN/NOTIFY) or "redis"
+WS_BACKPLANE:str = os.getenv("WS_BACKPLANE", "inprocess")
+REDIS_URL:str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Default sensor delivery per socket: "immediate", "latest" (newest reading per interval) or "batch"
+WS_DELIVERY_MODE:str = os.getenv("WS_DELIVERY_MODE", "immediate")
+WS_DELIVERY_INTERVAL_MS:int = int(os.getenv("WS_DELIVERY_INTERVAL_MS", 250))
+# Recent messages kept per user for replay on reconnect (0 disables)
+WS_REPLAY_BUFFER_SIZE:int = int(os.getenv("WS_REPLAY_BUFFER_SIZE", 300))
+# How long after a user's last socket here closes a resume is still possible (seconds);
+# then the user's sequence and replay buffer are dropped
+WS_REPLAY_TTL:float = float(os.getenv("WS_REPLAY_TTL", 120.0))
+# Latest-prediction cache entry lifetime (seconds); bounds staleness when another worker
+# runs the scheduler. 0 keeps entries until overwritten (single process)
+PREDICTION_CACHE_TTL:float = float(os.getenv("PREDICTION_CACHE_TTL", 30.0))
+# Most users the latest-prediction cache holds; the least recently stored are evicted beyond it
+PREDICTION_CACHE_MAX_ENTRIES:int = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", 10000))
+
+# Model serving: artifact archive, MODEL_PATH change polling (seconds) and inference threads
+MODEL_VERSIONS_DIR:str = os.getenv("MODEL_VERSIONS_DIR", "models/versions")
+MODEL_RELOAD_INTERVAL:float = float(os.getenv("MODEL_RELOAD_INTERVAL", 30.0))
+MODEL_INFERENCE_THREADS:int = int(os.getenv("MODEL_INFERENCE_THREADS", 2))
+
+# CPU-bound feature extraction and inference: "thread" or "process" pool, its size and users per submitted chunk
+COMPUTE_POOL:str = os.getenv("COMPUTE_POOL", "thread")
+COMPUTE_POOL_WORKERS:int = int(os.getenv("COMPUTE_POOL_WORKERS", MODEL_INFERENCE_THREADS))
+COMPUTE_POOL_BATCH_USERS:int = int(os.getenv("COMPUTE_POOL_BATCH_USERS", 512))
+# Event-loop lag sampling period (ms)
+LOOP_LAG_INTERVAL_MS:int = int(os.getenv("LOOP_LAG_INTERVAL_MS", 100))
@@ -1,11 +1,16 @@
 '''
 Uses environment variables for secure DB connection
 Supports async operations
+Counts pool checkouts/checkins and how long callers wait for a pooled connection
 '''
 
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,15 +19,75 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL not found in .env file")
 
+# Checkouts that waited longer than this are counted as slow (seconds)
+POOL_SLOW_WAIT = 0.01
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.slow_waits = 0
+        self.timeouts = 0
+
+    def record_wait(self, seconds: float):
+        self.waits += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        if seconds > POOL_SLOW_WAIT:
+            self.slow_waits += 1
+
+    def metrics(self, pool) -> dict:
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "wait_avg_ms": self.wait_total / self.waits * 1000 if self.waits else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+            "slow_waits": self.slow_waits,
+            "timeouts": self.timeouts
+        }
+
+pool_stats = PoolStats()
+
+class MeteredPool(AsyncAdaptedQueuePool):
+    """Queue pool that times each checkout, including waits for a free connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.record_wait(time.perf_counter() - started)
+
 engine = create_async_engine(
     DATABASE_URL,
     echo=True,
     future=True,
+    poolclass=MeteredPool,
     pool_size=20,
     max_overflow=20
 )
 SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_stats.checkouts += 1
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    pool_stats.checkins += 1
+
+def pool_metrics() -> dict:
+    return pool_stats.metrics(engine.sync_engine.pool)
+
 async def get_db():
     async with SessionLocal() as session:
         yield session
@@ -2,7 +2,7 @@ from pydantic import BaseModel, EmailStr, Field
 from datetime import date
 from typing import List, Optional
 from enum import Enum
-from sqlalchemy import Column, Integer, String, Float, DateTime, func, ForeignKey, Index, Boolean, Date, Enum as SQLAlchemyEnum, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, func, ForeignKey, Index, Boolean, Date, Enum as SQLAlchemyEnum, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 import enum
@@ -108,6 +108,33 @@ class SensorData(Base):
     processed_data = relationship("ProcessedData", back_populates="sensor_data", uselist=False)
     __table_args__ = (Index('sensor_data_user_timestamp_idx', "user_id", "timestamp"),)
 
+class SensorRollup(Base):
+    __tablename__ = "sensor_rollups"
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    resolution = Column(Integer, nullable=False)  # bucket size in seconds
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    count = Column(Integer, nullable=False)
+    gsr_sum = Column(Float, nullable=False)
+    gsr_min = Column(Float, nullable=False)
+    gsr_max = Column(Float, nullable=False)
+    heart_rate_sum = Column(Float, nullable=False)
+    heart_rate_min = Column(Float, nullable=False)
+    heart_rate_max = Column(Float, nullable=False)
+    temperature_sum = Column(Float, nullable=False)
+    temperature_min = Column(Float, nullable=False)
+    temperature_max = Column(Float, nullable=False)
+    __table_args__ = (Index('sensor_rollups_user_resolution_bucket_idx', "user_id", "resolution", "bucket_start", unique=True),)
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+    name = Column(String(50), primary_key=True)
+    # sensor_data ids up to last_sensor_data_id are rolled up; ids up to pending_sensor_data_id
+    # were seen last tick and are rolled up next tick, once their transactions have committed
+    last_sensor_data_id = Column(Integer, nullable=False, default=0)
+    pending_sensor_data_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+
 class ProcessedData(Base):
     __tablename__ = "processed_data"
     id = Column(Integer, primary_key=True, index=True)
@@ -129,6 +156,8 @@ class Prediction(Base):
     timestamp = Column(DateTime(timezone=True), default=func.now(), nullable=False, index=True)
     stress_level = Column(Integer, nullable=False)
     inference_time = Column(Float, nullable=True)
+    # Content hash of the model artifact that produced this prediction
+    model_version = Column(String(32), nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     user = relationship("User", back_populates="predictions")
     notification = relationship("Notification", back_populates="prediction", uselist=False)
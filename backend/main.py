@@ -1,6 +1,6 @@
 '''
 Registers API routes
-Starts the scheduled task
+Starts the scheduled task in one process (see utils/scheduler_leader.py)
 '''
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -9,6 +9,16 @@ from fastapi.responses import FileResponse
 from routes_api import auth, history, predict, sensors, users, notifications, caregivers, children, dosages, chat, test
 from tasks import scheduler_startup
 from utils.websocket_manager import websocket_manager
+from utils.stream_aggregator import sensor_aggregator
+from utils.ingestion_buffer import ingest_buffer
+from utils.backplane import create_backplane
+from utils.model_registry import model_registry
+from utils.compute_pool import compute_pool
+from utils.loop_monitor import loop_monitor
+from utils.scheduler_leader import scheduler_leader
+from utils.active_users import active_users
+from config import DATABASE_URL, WS_BACKPLANE, REDIS_URL
+from database.db import SessionLocal
 import logging
 import asyncio
 
@@ -60,14 +70,55 @@ async def favicon():
 
 scheduler = scheduler_startup()
 
+def _background_done(task: asyncio.Task):
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error(f"Background task {task.get_name()} failed: {str(error)}", exc_info=error)
+
+def start_background(name: str, coroutine) -> asyncio.Task:
+    """Run a long-lived coroutine; the task is kept on app.state, failures are logged, shutdown cancels it."""
+    task = asyncio.create_task(coroutine, name=name)
+    task.add_done_callback(_background_done)
+    app.state.background_tasks.append(task)
+    return task
+
 @app.on_event("startup")
 async def startup_event():
-    if not scheduler.running:
-        scheduler.start()
-    asyncio.create_task(websocket_manager.ping_connections())
+    app.state.background_tasks = []
+    start_background("scheduler_leader", scheduler_leader.run(scheduler))
+    # Users become due for the scheduler only once their readings are committed
+    ingest_buffer.add_commit_listener(active_users.mark_rows)
+    ingest_buffer.start()
+    start_background("loop_monitor", loop_monitor.run())
+    compute_pool.start()
+    try:
+        model_registry.load()
+        await compute_pool.warm(model_registry.current)
+    except Exception as e:
+        logger.error(f"Failed to load model, will retry on reload: {str(e)}")
+    start_background("model_watch", model_registry.watch())
+    try:
+        async with SessionLocal() as db:
+            await sensor_aggregator.warm_up(db)
+    except Exception as e:
+        logger.error(f"Failed to warm up sensor windows: {str(e)}")
+    try:
+        await websocket_manager.start_backplane(create_backplane(WS_BACKPLANE, DATABASE_URL, REDIS_URL))
+    except Exception as e:
+        logger.error(f"Failed to start {WS_BACKPLANE} backplane, staying in-process: {str(e)}")
+    start_background("ws_ping", websocket_manager.ping_connections())
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    scheduler.shutdown()
+    tasks = getattr(app.state, "background_tasks", [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await scheduler_leader.stop()
+    await ingest_buffer.stop()
+    compute_pool.shutdown()
+    await websocket_manager.stop_backplane()
     for user_id in list(websocket_manager.active_connections.keys()):
         await websocket_manager.disconnect(user_id)
\ No newline at end of file
@@ -0,0 +1,55 @@
+'''
+Exports the trained forest as a CompiledForest (utils/compiled_forest.py).
+Verifies that its predictions are identical to sklearn's on ASD_data.csv,
+both as stored and scaled the way train.py scales it, before saving.
+Point MODEL_PATH at the output to serve it.
+
+Run from backend/: python models/export_forest.py [model.pkl] [output.pkl]
+'''
+import os
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.compiled_forest import compile_forest, verify
+from utils.data_processing import FEATURE_NAMES
+
+MODEL_PATH = os.getenv("MODEL_PATH", "models/auticare_model.pkl")
+SCALER_PATH = os.getenv("SCALER_PATH", "models/scaler.pkl")
+DATA_PATH = "models/ASD_data.csv"
+OUTPUT_PATH = "models/auticare_forest.pkl"
+
+def export_forest(model_path: str = MODEL_PATH, output_path: str = OUTPUT_PATH) -> bool:
+    model = joblib.load(model_path)
+    forest = compile_forest(model)
+    print(f"Compiled {forest.n_trees} trees, {forest.n_nodes} nodes, max depth {forest.max_depth}")
+
+    data = pd.read_csv(DATA_PATH)
+    X = data[FEATURE_NAMES]
+    X = X.fillna(X.mean()).to_numpy(dtype=np.float64)
+    checks = {"ASD_data.csv": X}
+    if os.path.exists(SCALER_PATH):
+        checks["ASD_data.csv scaled"] = joblib.load(SCALER_PATH).transform(X)
+    rng = np.random.default_rng(0)
+    checks["random [0, 1]"] = rng.uniform(0.0, 1.0, size=(10_000, len(FEATURE_NAMES)))
+
+    ok = True
+    for name, rows in checks.items():
+        result = verify(model, forest, rows)
+        print(
+            f"{name}: {result['rows']} rows, {result['label_mismatches']} label mismatches, "
+            f"max proba diff {result['max_proba_diff']:.3g}"
+        )
+        ok = ok and result["ok"]
+    if not ok:
+        print("Error: compiled forest does not match the model; not saved.")
+        return False
+
+    joblib.dump(forest, output_path)
+    print(f"Compiled forest saved as '{output_path}'.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if export_forest(*sys.argv[1:3]) else 1)
@@ -1,36 +1,28 @@
 '''
 Handles single predictions for testing.
-Tests predictions with sample data, ensuring the model and scaler work together.
+Tests predictions with sample data through the fused pipeline (scaler + model in one artifact).
+The pipeline is loaded once; a bare model pickle is fused with scaler.pkl on load.
 '''
-import joblib
 import os
-import numpy as np
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.model_pipeline import load_pipeline
+from utils.data_processing import FEATURE_NAMES
 
 MODEL_PATH = os.getenv("MODEL_PATH", "models/auticare_model.pkl")
-SCALER_PATH = os.getenv("SCALER_PATH", "models/scaler.pkl")
 
-def load_model():
-    return joblib.load(MODEL_PATH)
+_pipeline = None
 
-def load_scaler():
-    return joblib.load(SCALER_PATH)
+def get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = load_pipeline(MODEL_PATH)
+    return _pipeline
 
 def predict_stress(features):
-    model = load_model()
-    scaler = load_scaler()
-    
-    feature_list = [
-        features["gsr_max"],
-        features["gsr_min"],
-        features["gsr_mean"],
-        features["gsr_sd"],
-        features["hrate_mean"],
-        features["temp_avg"]
-    ]
-    
-    normalized_features = scaler.transform([feature_list])
-    prediction = model.predict(normalized_features)[0]
-    return prediction
+    feature_list = [features[name] for name in FEATURE_NAMES]
+    return get_pipeline().predict([feature_list])[0]
 
 if __name__ == "__main__":
     sample_features = {
@@ -42,4 +34,4 @@ if __name__ == "__main__":
         "temp_avg": 39.7
     }
     result = predict_stress(sample_features)
-    print(f"Predicted stress level: {result}")
\ No newline at end of file
+    print(f"Predicted stress level: {result}")
@@ -1,34 +1,76 @@
 '''
 Replicates train_model.ipynb
 Runs the training process from the command line, useful for automation.
+Caches the cleaned, outlier-filtered dataset under models/cache/, keyed by the CSV's content hash.
+Optionally runs a cross-validated hyperparameter search in parallel across all cores (--search),
+reporting accuracy against inference cost: tree count, depth and us per prediction of the served pipeline.
+Picks the most accurate candidate within --latency-budget-us.
+Runs are reproducible from --seed, and write their artifacts and metrics to models/runs/<version>/.
+Emits a fused pipeline artifact (scaler folded in, forest compiled) and, unless --no-promote,
+atomically replaces models/auticare_pipeline.joblib, auticare_model.pkl and scaler.pkl with it.
+Distillation mode (--distill tree|forest) trains a single shallow tree or a small forest to mimic
+the served model on the training rows plus synthetic augmentation, reports agreement, size and latency
+against it, and writes models/auticare_distilled.joblib (served with MODEL_VARIANT=distilled).
+
+Run from backend/: python models/train.py [--search] [--folds 5] [--jobs -1] [--latency-budget-us 200]
+                   python models/train.py --distill tree [--student-depth 8] [--augment 20000]
 '''
+import argparse
+import hashlib
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
 import pandas as pd
 import numpy as np
+import sklearn
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+from sklearn.pipeline import Pipeline
 from sklearn import metrics
 from sklearn import preprocessing
 import joblib
 
-def train_model():
-    try:
-        data = pd.read_csv('models/ASD_data.csv')
-        print("Dataset loaded successfully. Shape:", data.shape)
-    except FileNotFoundError:
-        print("Error: ASD_data.csv not found. Please ensure the file exists in the working directory.")
-        return
-    
-    features = ['gsr_max', 'gsr_min', 'gsr_mean', 'gsr_sd', 'hrate_mean', 'temp_avg']
-    target = 'class'
-    
-    missing_cols = [col for col in features + [target] if col not in data.columns]
-    if missing_cols:
-        print(f"Error: Missing columns in dataset: {missing_cols}")
-        return
-    
-    X = data[features]
-    y = data[target]
-    
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.model_pipeline import fuse, load_pipeline, save_pipeline
+
+DATA_PATH = 'models/ASD_data.csv'
+CACHE_DIR = 'models/cache'
+RUNS_DIR = 'models/runs'
+MODEL_PATH = 'models/auticare_model.pkl'
+SCALER_PATH = 'models/scaler.pkl'
+PIPELINE_PATH = 'models/auticare_pipeline.joblib'
+DISTILLED_PATH = 'models/auticare_distilled.joblib'
+
+FEATURES = ['gsr_max', 'gsr_min', 'gsr_mean', 'gsr_sd', 'hrate_mean', 'temp_avg']
+TARGET = 'class'
+# Bump when the cleaning below changes, so cached datasets are rebuilt
+CLEANING_VERSION = 1
+
+# Default model, as trained by the notebook
+DEFAULT_PARAMS = {'n_estimators': 100, 'max_depth': None, 'min_samples_leaf': 1}
+SEARCH_GRID = {
+    'n_estimators': [10, 25, 50, 100, 200],
+    'max_depth': [None, 6, 10, 16],
+    'min_samples_leaf': [1, 2, 4]
+}
+LATENCY_CALLS = 300
+LATENCY_BATCH = 10_000
+# Synthetic rows are jittered copies of real rows (noise in units of each feature's std)
+# and uniform draws from the box the real rows span, half each
+AUGMENT_JITTER = 0.1
+# A distilled model is only promoted if it agrees with the teacher on this share of real test rows
+MIN_AGREEMENT = 0.99
+
+def clean(data):
+    X = data[FEATURES]
+    y = data[TARGET]
+
     print('Missing values:\n', X.isnull().sum())
     X = X.fillna(X.mean())
 
@@ -36,44 +78,359 @@ def train_model():
     Q3 = X.quantile(0.75)
     IQR = Q3 - Q1
     outlier_mask = ~((X < (Q1 - 1.5 * IQR)) | (X > (Q3 + 1.5 * IQR))).any(axis=1)
-    X = X[outlier_mask]
-    y = y[outlier_mask]
+    return X[outlier_mask].to_numpy(dtype=np.float64), y[outlier_mask].to_numpy()
+
+def load_dataset(path=DATA_PATH, cache_dir=CACHE_DIR, use_cache=True):
+    """Cleaned, outlier-filtered (X, y) and the CSV's content hash. Reuses a cached copy when the CSV is unchanged."""
+    with open(path, 'rb') as f:
+        data_hash = hashlib.sha256(f.read()).hexdigest()[:12]
+    cache_path = os.path.join(cache_dir, f'asd_clean_{data_hash}_v{CLEANING_VERSION}.npz')
+    if use_cache and os.path.exists(cache_path):
+        cached = np.load(cache_path, allow_pickle=False)
+        print(f"Cleaned dataset loaded from cache '{cache_path}'. Shape:", cached['X'].shape)
+        return cached['X'], cached['y'], data_hash
+
+    data = pd.read_csv(path)
+    print("Dataset loaded successfully. Shape:", data.shape)
+    missing_cols = [col for col in FEATURES + [TARGET] if col not in data.columns]
+    if missing_cols:
+        raise ValueError(f"Missing columns in dataset: {missing_cols}")
+    X, y = clean(data)
     print(f"Dataset shape after outlier removal: {X.shape}")
-    
 
-    scaler = preprocessing.MinMaxScaler()
-    X_scaled = scaler.fit_transform(X)
-    
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f'{cache_path}.tmp.npz'
+        np.savez(tmp, X=X, y=y)
+        os.replace(tmp, cache_path)
+    return X, y, data_hash
+
+def make_model(params, seed, jobs=1):
+    return RandomForestClassifier(random_state=seed, n_jobs=jobs, **params)
+
+def cross_validate(grid, X, y, folds, seed, jobs):
+    """Mean and std of CV accuracy and weighted F1 for every parameter combination in grid."""
+    # The scaler is refitted inside each fold so the held-out fold never leaks into it
+    search = GridSearchCV(
+        Pipeline([('scaler', preprocessing.MinMaxScaler()), ('model', make_model({}, seed))]),
+        {f'model__{name}': values for name, values in grid.items()},
+        scoring={'accuracy': 'accuracy', 'f1': 'f1_weighted'},
+        cv=StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed),
+        refit=False,
+        n_jobs=jobs
+    )
+    search.fit(X, y)
+    results = search.cv_results_
+    return [
+        {
+            'params': {name[len('model__'):]: value for name, value in params.items()},
+            'cv_accuracy': float(results['mean_test_accuracy'][i]),
+            'cv_accuracy_std': float(results['std_test_accuracy'][i]),
+            'cv_f1': float(results['mean_test_f1'][i])
+        }
+        for i, params in enumerate(results['params'])
+    ]
+
+def inference_cost(pipeline, X):
+    """Size and latency of the served pipeline: us per single-row call and per row in a batch."""
+    forest = pipeline.model
+    rows = X[np.arange(LATENCY_CALLS) % len(X)]
+    start = time.perf_counter()
+    for row in rows:
+        pipeline.predict(row[np.newaxis, :])
+    single_us = (time.perf_counter() - start) / LATENCY_CALLS * 1e6
+    batch = X[np.arange(LATENCY_BATCH) % len(X)]
+    start = time.perf_counter()
+    pipeline.predict(batch)
+    batch_us = (time.perf_counter() - start) / LATENCY_BATCH * 1e6
+    return {
+        'n_trees': forest.n_trees,
+        'depth': forest.max_depth,
+        'n_nodes': forest.n_nodes,
+        'us_per_prediction': single_us,
+        'us_per_row_batched': batch_us
+    }
+
+def evaluate(y_test, y_pred):
+    return {
+        'accuracy': metrics.accuracy_score(y_test, y_pred),
+        'precision': metrics.precision_score(y_test, y_pred, average='weighted', zero_division=0),
+        'recall': metrics.recall_score(y_test, y_pred, average='weighted', zero_division=0),
+        'f1': metrics.f1_score(y_test, y_pred, average='weighted', zero_division=0)
+    }
+
+def print_report(candidates):
+    print(
+        f"{'trees':>6} {'max_depth':>9} {'leaf':>5} {'depth':>6} {'nodes':>7} "
+        f"{'cv acc':>13} {'cv f1':>7} {'us/pred':>8} {'us/row':>7}"
+    )
+    for c in candidates:
+        p = c['params']
+        print(
+            f"{p['n_estimators']:>6} {str(p['max_depth']):>9} {p['min_samples_leaf']:>5} {c['depth']:>6} {c['n_nodes']:>7} "
+            f"{c['cv_accuracy']:>6.4f}±{c['cv_accuracy_std']:.3f} {c['cv_f1']:>7.4f} "
+            f"{c['us_per_prediction']:>8.1f} {c['us_per_row_batched']:>7.2f}"
+        )
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'machine': platform.machine()
+    }
 
-    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+def artifact_bytes(pipeline):
+    """Size of a pipeline as save_pipeline writes it."""
+    buffer = io.BytesIO()
+    joblib.dump(pipeline, buffer)
+    return buffer.tell()
+
+def write_atomic(obj, path, dump=joblib.dump):
+    dump(obj, f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+
+def train_model(search=False, folds=5, jobs=-1, seed=42, latency_budget_us=None, use_cache=True, promote=True):
+    try:
+        X, y, data_hash = load_dataset(use_cache=use_cache)
+    except FileNotFoundError:
+        print("Error: ASD_data.csv not found. Please ensure the file exists in the working directory.")
+        return
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    np.random.seed(seed)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed, stratify=y)
     print(f"Training set shape: {X_train.shape}, Test set shape: {X_test.shape}")
-    
-    # Train RF Model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
+
+    grid = SEARCH_GRID if search else {name: [value] for name, value in DEFAULT_PARAMS.items()}
+    n_candidates = len(list(itertools.product(*grid.values())))
+    print(f"Cross-validating {n_candidates} candidate(s) with {folds} folds (n_jobs={jobs})...")
+    candidates = cross_validate(grid, X_train, y_train, folds, seed, jobs)
+
+    # Inference cost of each candidate as it would be served
+    for candidate in candidates:
+        scaler = preprocessing.MinMaxScaler().fit(X_train)
+        model = make_model(candidate['params'], seed, jobs).fit(scaler.transform(X_train), y_train)
+        candidate.update(inference_cost(fuse(model, scaler), X_test))
+    # Ties go to the smaller forest; latency is measured, so it is not used to order (runs stay reproducible)
+    candidates.sort(key=lambda c: (-c['cv_accuracy'], c['n_nodes'], c['n_trees']))
+    print_report(candidates)
+
+    eligible = [c for c in candidates if latency_budget_us is None or c['us_per_prediction'] <= latency_budget_us]
+    if not eligible:
+        print(f"Error: no candidate predicts within {latency_budget_us}us.")
+        return
+    chosen = eligible[0]
+    print(f"Selected: {chosen['params']} (cv accuracy {chosen['cv_accuracy']:.4f}, {chosen['us_per_prediction']:.1f}us/prediction)")
+
+    # Train selected model
+    scaler = preprocessing.MinMaxScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    model = make_model(chosen['params'], seed, jobs)
+    model.fit(X_train_scaled, y_train)
+    # Inference runs one request at a time
+    model.set_params(n_jobs=None)
     print("Model training completed.")
-    
+
     # Model Evaluation
-    y_pred = model.predict(X_test)
-    accuracy = metrics.accuracy_score(y_test, y_pred)
-    precision = metrics.precision_score(y_test, y_pred, average='weighted', zero_division=0)
-    recall = metrics.recall_score(y_test, y_pred, average='weighted', zero_division=0)
-    f1 = metrics.f1_score(y_test, y_pred, average='weighted', zero_division=0)
-    
+    test_metrics = evaluate(y_test, model.predict(scaler.transform(X_test)))
     print('Evaluation Metrics:')
-    print(f'Accuracy: {accuracy:.4f}')
-    print(f'Precision: {precision:.4f}')
-    print(f'Recall: {recall:.4f}')
-    print(f'F1-score: {f1:.4f}')
-    
-    # Save model
+    for name, value in test_metrics.items():
+        print(f'{name.capitalize()}: {value:.4f}')
+
+    # Fused pipeline: one artifact for scaler + model, served by setting MODEL_PATH to PIPELINE_PATH
+    version = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    pipeline = fuse(model, scaler, metadata={
+        "version": version,
+        "params": chosen['params'],
+        "accuracy": test_metrics['accuracy'],
+        "f1": test_metrics['f1'],
+        "train_rows": len(X_train),
+        "data_hash": data_hash,
+        "seed": seed
+    })
+    if not np.array_equal(pipeline.predict(X), model.predict(scaler.transform(X))):
+        print("Error: fused pipeline disagrees with scaler + model; not saved.")
+        return
+
+    run_dir = os.path.join(RUNS_DIR, version)
+    try:
+        os.makedirs(run_dir, exist_ok=True)
+        joblib.dump(model, os.path.join(run_dir, 'model.pkl'))
+        joblib.dump(scaler, os.path.join(run_dir, 'scaler.pkl'))
+        save_pipeline(pipeline, os.path.join(run_dir, 'pipeline.joblib'))
+        with open(os.path.join(run_dir, 'metrics.json'), 'w') as f:
+            json.dump({
+                'version': version,
+                'seed': seed,
+                'folds': folds,
+                'data': {'path': DATA_PATH, 'sha256': data_hash, 'rows': len(X), 'cleaning_version': CLEANING_VERSION},
+                'selected': chosen,
+                'latency_budget_us': latency_budget_us,
+                'test': test_metrics,
+                'candidates': candidates,
+                'environment': environment()
+            }, f, indent=2)
+        print(f"Run saved to '{run_dir}'.")
+    except Exception as e:
+        print(f"Error saving run: {e}")
+        return
+
+    if not promote:
+        return run_dir
     try:
-        joblib.dump(model, 'models/auticare_model.pkl')
-        joblib.dump(scaler, 'models/scaler.pkl')
-        print("Model and scaler saved successfully as 'auticare_model.pkl' and 'scaler.pkl'.")
+        # Replace atomically so a server polling MODEL_PATH never reads a partial file
+        write_atomic(model, MODEL_PATH)
+        write_atomic(scaler, SCALER_PATH)
+        write_atomic(pipeline, PIPELINE_PATH, dump=save_pipeline)
+        print(f"Model, scaler and pipeline saved as '{MODEL_PATH}', '{SCALER_PATH}' and '{PIPELINE_PATH}'.")
     except Exception as e:
-        print(f"Error saving model or scaler: {e}")
+        print(f"Error saving model, scaler or pipeline: {e}")
+    return run_dir
+
+def augment(X, n, rng):
+    """n synthetic feature rows around and between the real rows in X."""
+    jittered = X[rng.integers(0, len(X), size=n // 2)]
+    jittered = jittered + rng.normal(0.0, AUGMENT_JITTER, size=jittered.shape) * X.std(axis=0)
+    uniform = rng.uniform(X.min(axis=0), X.max(axis=0), size=(n - n // 2, X.shape[1]))
+    return np.vstack([jittered, uniform])
+
+def make_student(kind, depth, trees, seed, jobs=1):
+    if kind == 'tree':
+        return DecisionTreeClassifier(max_depth=depth, random_state=seed)
+    return RandomForestClassifier(n_estimators=trees, max_depth=depth, random_state=seed, n_jobs=jobs)
+
+def distill_model(kind='tree', teacher_path=PIPELINE_PATH, depth=8, trees=10, n_augment=20_000,
+                  jobs=-1, seed=42, use_cache=True, promote=True):
+    if teacher_path == PIPELINE_PATH and not os.path.exists(teacher_path):
+        # Trained before pipelines were emitted; load_pipeline fuses the bare model with scaler.pkl
+        teacher_path = MODEL_PATH
+    try:
+        X, y, data_hash = load_dataset(use_cache=use_cache)
+        teacher = load_pipeline(teacher_path, mmap=False)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    # Same split as train_model, so the student never sees the real test rows
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed, stratify=y)
+    rng = np.random.default_rng(seed)
+    X_distill = np.vstack([X_train, augment(X_train, n_augment, rng)])
+    # The student learns the teacher's labels, on raw features: trees need no scaling
+    y_distill = teacher.predict(X_distill)
+    print(f"Distilling into a {kind} on {len(X_train)} real + {n_augment} synthetic rows...")
+    student = make_student(kind, depth, trees, seed, jobs).fit(X_distill, y_distill)
+    if kind == 'forest':
+        student.set_params(n_jobs=None)
+
+    version = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    X_synthetic = augment(X_train, n_augment, rng)
+    agreement = {
+        'real_test': float(np.mean(student.predict(X_test) == teacher.predict(X_test))),
+        'real_all': float(np.mean(student.predict(X) == teacher.predict(X))),
+        'synthetic': float(np.mean(student.predict(X_synthetic) == teacher.predict(X_synthetic)))
+    }
+    pipeline = fuse(student, metadata={
+        "version": version,
+        "distilled": kind,
+        "teacher": teacher.metadata.get("version", os.path.basename(teacher_path)),
+        "agreement": agreement['real_test'],
+        "data_hash": data_hash,
+        "seed": seed
+    })
+    if not np.array_equal(pipeline.predict(X_synthetic), student.predict(X_synthetic)):
+        print("Error: fused pipeline disagrees with the student; not saved.")
         return
 
+    run_dir = os.path.join(RUNS_DIR, f'{version}-distilled-{kind}')
+    os.makedirs(run_dir, exist_ok=True)
+    artifact = os.path.join(run_dir, 'pipeline.joblib')
+    save_pipeline(pipeline, artifact)
+    teacher_cost = inference_cost(teacher, X_test)
+    student_cost = inference_cost(pipeline, X_test)
+    teacher_cost['bytes'] = artifact_bytes(teacher)
+    student_cost['bytes'] = os.path.getsize(artifact)
+    test = {
+        'teacher': evaluate(y_test, teacher.predict(X_test)),
+        'student': evaluate(y_test, pipeline.predict(X_test))
+    }
+
+    print(f"{'':>8} {'trees':>6} {'depth':>6} {'nodes':>7} {'KiB':>8} {'us/pred':>8} {'us/row':>7} {'test acc':>9}")
+    for name, cost in (('teacher', teacher_cost), ('student', student_cost)):
+        print(
+            f"{name:>8} {cost['n_trees']:>6} {cost['depth']:>6} {cost['n_nodes']:>7} {cost['bytes'] / 1024:>8.1f} "
+            f"{cost['us_per_prediction']:>8.1f} {cost['us_per_row_batched']:>7.2f} {test[name]['accuracy']:>9.4f}"
+        )
+    print(
+        f"Agreement with teacher: {agreement['real_test']:.4f} on real test rows, "
+        f"{agreement['real_all']:.4f} on all real rows, {agreement['synthetic']:.4f} on synthetic rows"
+    )
+
+    with open(os.path.join(run_dir, 'metrics.json'), 'w') as f:
+        json.dump({
+            'version': version,
+            'seed': seed,
+            'student': {'kind': kind, 'max_depth': depth, 'n_estimators': trees if kind == 'forest' else 1},
+            'teacher': {'path': teacher_path, 'metadata': teacher.metadata},
+            'data': {'path': DATA_PATH, 'sha256': data_hash, 'rows': len(X), 'augmented_rows': n_augment},
+            'agreement': agreement,
+            'cost': {'teacher': teacher_cost, 'student': student_cost},
+            'test': test,
+            'environment': environment()
+        }, f, indent=2, default=str)
+    print(f"Run saved to '{run_dir}'.")
+
+    if not promote:
+        return run_dir
+    if agreement['real_test'] < MIN_AGREEMENT:
+        print(f"Agreement below {MIN_AGREEMENT}; '{DISTILLED_PATH}' left unchanged.")
+        return run_dir
+    write_atomic(pipeline, DISTILLED_PATH, dump=save_pipeline)
+    print(f"Distilled pipeline saved as '{DISTILLED_PATH}'.")
+    return run_dir
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the AutiCare stress model.")
+    parser.add_argument('--search', action='store_true', help="Cross-validated hyperparameter search over SEARCH_GRID")
+    parser.add_argument('--folds', type=int, default=5, help="Cross-validation folds")
+    parser.add_argument('--jobs', type=int, default=-1, help="Parallel jobs for CV and fitting (-1: all cores)")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for splits, folds and forests")
+    parser.add_argument('--latency-budget-us', type=float, default=None, help="Only select candidates at or under this us per prediction")
+    parser.add_argument('--no-cache', action='store_true', help="Rebuild the cleaned dataset instead of reading models/cache/")
+    parser.add_argument('--no-promote', action='store_true', help="Only write the run directory; leave the served artifacts alone")
+    parser.add_argument('--distill', choices=['tree', 'forest'], help="Distil the served model into a single tree or a small forest")
+    parser.add_argument('--teacher', default=PIPELINE_PATH, help="Model to distil (falls back to models/auticare_model.pkl)")
+    parser.add_argument('--student-depth', type=int, default=8, help="max_depth of the distilled model")
+    parser.add_argument('--student-trees', type=int, default=10, help="Trees in a distilled forest")
+    parser.add_argument('--augment', type=int, default=20_000, help="Synthetic rows labelled by the teacher")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    train_model()
\ No newline at end of file
+    args = parse_args()
+    if args.distill:
+        distill_model(
+            kind=args.distill,
+            teacher_path=args.teacher,
+            depth=args.student_depth,
+            trees=args.student_trees,
+            n_augment=args.augment,
+            jobs=args.jobs,
+            seed=args.seed,
+            use_cache=not args.no_cache,
+            promote=not args.no_promote
+        )
+    else:
+        train_model(
+            search=args.search,
+            folds=args.folds,
+            jobs=args.jobs,
+            seed=args.seed,
+            latency_budget_us=args.latency_budget_us,
+            use_cache=not args.no_cache,
+            promote=not args.no_promote
+        )
@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from database.db import get_db
 from database.models import User, Child, SensorData, Prediction, Dosage
+from utils.rollups import get_channel_averages
 from typing import List, Optional
 
 logging.basicConfig(level=logging.INFO)
@@ -210,8 +211,9 @@ async def get_insights(email: str, db: AsyncSession = Depends(get_db)):
     children = await get_child_data(email, db)
     sensor_data = await get_recent_sensor_data(email, db)
     predictions = await get_recent_predictions(email, db)
+    averages = await get_channel_averages(user.id, datetime.utcnow() - timedelta(hours=12))
 
-    if not (children and (sensor_data or predictions)):
+    if not (children and (sensor_data or predictions or averages)):
         logger.info(f"No insights generated for {email}: Insufficient data")
         return InsightsResponse(insights=[])
 
@@ -220,7 +222,9 @@ async def get_insights(email: str, db: AsyncSession = Depends(get_db)):
     for child in children:
         context = [f"Child: {child['name']}, Age: {child['age']}, Conditions: {child['conditions'] or 'None'}"]
         child_sensor_data = [d for d in sensor_data]  
-        if child_sensor_data:
+        if averages:
+            context.append(f"12h Avg Heart Rate: {averages['heart_rate']:.1f} bpm, Avg GSR: {averages['gsr']:.2f}")
+        elif child_sensor_data:
             hr_mean = sum(d['heart_rate'] for d in child_sensor_data) / len(child_sensor_data)
             gsr_mean = sum(d['gsr'] for d in child_sensor_data) / len(child_sensor_data)
             context.append(f"12h Avg Heart Rate: {hr_mean:.1f} bpm, Avg GSR: {gsr_mean:.2f}")
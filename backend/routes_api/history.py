@@ -1,22 +1,144 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import func
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.db import get_db
+from database.db import get_db, SessionLocal
 from database.models import SensorData, Prediction
-from datetime import datetime, timedelta
+from utils.rollups import epoch_bucket, choose_rollup, get_rollup_buckets
+from utils.history_export import merge_by_timestamp, close_streams, ndjson_chunks, csv_chunks
+from utils.pagination import keyset_page, split_page
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import math
+import re
 import logging
 
 router = APIRouter(prefix="/history", tags=["history"])
 logger = logging.getLogger("history")
 
+RESOLUTION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# Bucket sizes tried by resolution=auto, finest first
+AUTO_RESOLUTIONS = [60, 300, 900, 3600, 6 * 3600, 86400]
+CHANNELS = [
+    ("heart_rate", SensorData.heart_rate),
+    ("temperature", SensorData.temperature),
+    ("gsr", SensorData.gsr),
+]
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", ndjson_chunks),
+    "csv": ("text/csv", csv_chunks),
+}
+# Rows fetched per round-trip from the server-side cursor
+EXPORT_YIELD_PER = 1000
+
+def bucket_count(span: float, seconds: int) -> int:
+    """Most buckets a span can touch: an unaligned start adds one partial bucket."""
+    return math.floor(max(span, 0) / seconds) + 1
+
+def parse_resolution(resolution: str, days: float, max_points: int) -> int:
+    """Bucket size in seconds for e.g. "1m", "15m", "1h" or "auto", within max_points buckets."""
+    span = days * 86400
+    if resolution == "auto":
+        # Smallest step that keeps the worst-case bucket count within max_points
+        step = math.floor(max(span, 0) / max_points) + 1
+        for seconds in AUTO_RESOLUTIONS:
+            if seconds >= step:
+                return seconds
+        # Whole days, so the 1-hour rollup still tiles multi-year spans
+        return math.ceil(step / AUTO_RESOLUTIONS[-1]) * AUTO_RESOLUTIONS[-1]
+    match = re.fullmatch(r"(\d+)([smhd])", resolution)
+    if not match or int(match.group(1)) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="resolution must look like 1m, 15m, 1h or be 'auto'"
+        )
+    seconds = int(match.group(1)) * RESOLUTION_UNITS[match.group(2)]
+    if bucket_count(span, seconds) > max_points:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"resolution {resolution} gives more than {max_points} points over {days} days; use a coarser one or 'auto'"
+        )
+    return seconds
+
+def time_bucket(column, seconds: int):
+    """Epoch seconds of the start of the bucket containing column."""
+    return epoch_bucket(column, seconds).label("bucket")
+
+async def get_sensor_buckets(user_id: int, start_date: datetime, seconds: int, db: AsyncSession) -> dict:
+    """count and min/mean/max per channel, keyed by bucket start in epoch seconds.
+
+    Reads the coarsest rollup that tiles the bucket size; falls back to raw rows otherwise.
+    """
+    if choose_rollup(seconds):
+        aggregates = await get_rollup_buckets(user_id, start_date, seconds)
+        buckets = {}
+        for bucket_start, values in aggregates.items():
+            entry = {"count": values["count"]}
+            for name, _ in CHANNELS:
+                entry[f"{name}_min"] = values[f"{name}_min"]
+                entry[name] = values[f"{name}_sum"] / values["count"]
+                entry[f"{name}_max"] = values[f"{name}_max"]
+            buckets[bucket_start] = entry
+        return buckets
+
+    bucket = time_bucket(SensorData.timestamp, seconds)
+    columns = [bucket, func.count().label("count")]
+    for name, column in CHANNELS:
+        columns += [
+            func.min(column).label(f"{name}_min"),
+            func.avg(column).label(name),
+            func.max(column).label(f"{name}_max"),
+        ]
+    sensor_result = await db.execute(
+        select(*columns)
+        .where(SensorData.user_id == user_id, SensorData.timestamp >= start_date)
+        .group_by(bucket)
+    )
+    return {
+        float(row.bucket): {name: value for name, value in row._mapping.items() if name != "bucket"}
+        for row in sensor_result.all()
+    }
+
+async def get_bucketed_data(user_id: int, start_date: datetime, seconds: int, db: AsyncSession) -> list:
+    """Aggregate sensor data into min/mean/max per channel and predictions into the modal stress level per bucket."""
+    combined_data = await get_sensor_buckets(user_id, start_date, seconds, db)
+
+    stress_bucket = time_bucket(Prediction.timestamp, seconds)
+    prediction_result = await db.execute(
+        select(stress_bucket, func.mode().within_group(Prediction.stress_level).label("stress_level"))
+        .where(Prediction.user_id == user_id, Prediction.timestamp >= start_date)
+        .group_by(stress_bucket)
+    )
+    for row in prediction_result.all():
+        combined_data.setdefault(float(row.bucket), {})["stress_level"] = row.stress_level
+
+    return [
+        {"timestamp": datetime.fromtimestamp(bucket_start, tz=timezone.utc).isoformat(), **entry}
+        for bucket_start, entry in sorted(combined_data.items())
+    ]
+
 @router.get("/processed_data")
 async def get_processed_data(
     user_id: int, 
     days: float = 7.0,
+    resolution: Optional[str] = None,
+    max_points: int = Query(1000, ge=1),
     db: AsyncSession = Depends(get_db)
 ):
+    """Raw merged readings and predictions, or time buckets when resolution is given.
+
+    resolution: bucket size such as 1m, 15m or 1h, or "auto" for the finest
+    bucket that keeps the series within max_points. An explicit size that
+    would exceed max_points is rejected.
+    """
     try:
         start_date = datetime.utcnow() - timedelta(days=days)
+        if resolution:
+            seconds = parse_resolution(resolution, days, max_points)
+            return await get_bucketed_data(user_id, start_date, seconds, db)
+
         sensor_result = await db.execute(
             select(SensorData).where(SensorData.user_id == user_id, SensorData.timestamp >= start_date).order_by(SensorData.timestamp.asc())
         )
@@ -43,11 +165,119 @@ async def get_processed_data(
             combined_data.append(entry)
 
         return combined_data
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching processed data: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
+async def stream_rows(query):
+    """Yield rows from a server-side cursor on a session owned by the stream.
+
+    aclose() releases the cursor and the session's connection.
+    """
+    async with SessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_YIELD_PER))
+        try:
+            async for row in result:
+                yield row
+        finally:
+            await result.close()
+
+@router.get("/export")
+async def export_processed_data(
+    user_id: int,
+    days: float = 7.0,
+    format: str = "ndjson"
+):
+    """Stream merged readings and predictions as NDJSON or CSV with flat memory use."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"format must be one of {list(EXPORT_FORMATS)}")
+    media_type, serialize = EXPORT_FORMATS[format]
+    start_date = datetime.utcnow() - timedelta(days=days)
+
+    # Separate sessions so the two cursors never share a connection
+    sensor_rows = stream_rows(
+        select(SensorData.timestamp, SensorData.heart_rate, SensorData.temperature, SensorData.gsr)
+        .where(SensorData.user_id == user_id, SensorData.timestamp >= start_date)
+        .order_by(SensorData.timestamp.asc())
+    )
+    prediction_rows = stream_rows(
+        select(Prediction.timestamp, Prediction.stress_level)
+        .where(Prediction.user_id == user_id, Prediction.timestamp >= start_date)
+        .order_by(Prediction.timestamp.asc())
+    )
+    return StreamingResponse(
+        serialize(merge_by_timestamp(sensor_rows, prediction_rows)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="history_{user_id}.{format}"'},
+        # Runs after a client disconnect too, when the merge may be left suspended mid-stream
+        background=BackgroundTask(close_streams, sensor_rows, prediction_rows)
+    )
+
+@router.get("/sensor_data")
+async def get_sensor_data_page(
+    user_id: int,
+    limit: int = Query(500, ge=1, le=5000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Raw readings newest first; pass next_cursor back to fetch the following page."""
+    try:
+        result = await db.execute(keyset_page(
+            select(SensorData.id, SensorData.timestamp, SensorData.heart_rate, SensorData.temperature, SensorData.gsr)
+            .where(SensorData.user_id == user_id),
+            SensorData, cursor, limit
+        ))
+        rows, next_cursor = split_page(result.all(), limit)
+        return {
+            "data": [
+                {
+                    "id": r.id,
+                    "timestamp": r.timestamp.isoformat(),
+                    "heart_rate": r.heart_rate,
+                    "temperature": r.temperature,
+                    "gsr": r.gsr
+                }
+                for r in rows
+            ],
+            "next_cursor": next_cursor
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching sensor data page: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/predictions")
+async def get_predictions_page(
+    user_id: int,
+    limit: int = Query(500, ge=1, le=5000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Predictions newest first; pass next_cursor back to fetch the following page."""
+    try:
+        result = await db.execute(keyset_page(
+            select(Prediction.id, Prediction.timestamp, Prediction.stress_level)
+            .where(Prediction.user_id == user_id),
+            Prediction, cursor, limit
+        ))
+        rows, next_cursor = split_page(result.all(), limit)
+        return {
+            "data": [
+                {"id": r.id, "timestamp": r.timestamp.isoformat(), "stress_level": r.stress_level}
+                for r in rows
+            ],
+            "next_cursor": next_cursor
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching predictions page: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
 
 
 # '''
@@ -8,6 +8,8 @@ from database.db import get_db
 from sqlalchemy import desc
 from database.models import Notification, Caregiver
 from utils.websocket_manager import websocket_manager
+from utils.pagination import keyset_page, split_page
+from typing import Optional
 import logging
 import json
 
@@ -20,7 +22,8 @@ logger = logging.getLogger("notifications")
 async def get_notifications(
     email: str,
     db: AsyncSession = Depends(get_db),
-    limit: int = 8
+    limit: int = 8,
+    cursor: Optional[str] = None
 ):
     try:
         result = await db.execute(select(Caregiver).where(Caregiver.email == email))
@@ -28,12 +31,12 @@ async def get_notifications(
         if not caregiver:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Caregiver not found")
 
-        result = await db.execute(
+        result = await db.execute(keyset_page(
             select(Notification)
-            .where(Notification.user_id == caregiver.user_id, Notification.dismissed == False)
-            .order_by(desc(Notification.timestamp)).limit(limit)
-        )
-        notifications = result.scalars().all()
+            .where(Notification.user_id == caregiver.user_id, Notification.dismissed == False),
+            Notification, cursor, limit
+        ))
+        notifications, next_cursor = split_page(result.scalars().all(), limit)
 
         response = [
             {
@@ -46,7 +49,7 @@ async def get_notifications(
             for n in notifications
         ]
         logger.info(f"Fetched {len(notifications)} notifications for user {email}")
-        return {"notifications": response}
+        return {"notifications": response, "next_cursor": next_cursor}
     except HTTPException as e:
         raise e
     except Exception as e:
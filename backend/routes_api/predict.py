@@ -7,9 +7,10 @@ from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.db import get_db
 from database.models import ProcessedData, Prediction, User
-from utils.model_utils import load_model, predict_stress
+from utils.model_registry import model_registry
 from datetime import datetime, timedelta
 from utils.auth import get_current_user
+from utils.prediction_cache import prediction_cache
 
 router = APIRouter()
 
@@ -35,19 +36,20 @@ async def get_prediction(user: User = Depends(get_current_user), db: AsyncSessio
             "temp_avg": processed_data.temp_avg
         }
 
-        model = load_model()
-        stress_level = predict_stress(model, features)
+        stress_level, model_version = await model_registry.predict(features)
 
         # Store prediction
         new_prediction = Prediction(
             stress_level=stress_level,
             user_id=user.id,
-            timestamp=datetime.utcnow()
+            timestamp=datetime.utcnow(),
+            model_version=model_version
         )
         db.add(new_prediction)
         await db.commit()
+        prediction_cache.put(user.id, stress_level, new_prediction.timestamp)
 
-        return {"stress_level": stress_level, "timestamp": new_prediction.timestamp}
+        return {"stress_level": stress_level, "timestamp": new_prediction.timestamp, "model_version": model_version}
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
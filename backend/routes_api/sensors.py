@@ -1,12 +1,24 @@
-from fastapi import APIRouter, WebSocket, HTTPException, status, Query, Depends
+from fastapi import APIRouter, WebSocket, HTTPException, status, Query, Depends, Request
 from starlette.websockets import WebSocketState, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.db import get_db
+from database.db import get_db, pool_metrics
 from database.models import SensorData, Prediction
 from sqlalchemy import select
-from pydantic import BaseModel
-from datetime import datetime
-from utils.websocket_manager import websocket_manager
+from pydantic import BaseModel, Field
+from datetime import datetime, timezone
+from typing import List, Optional
+from utils.websocket_manager import websocket_manager, DELIVERY_MODES
+from utils.ws_protocol import negotiate_subprotocol, SUBPROTOCOL_BINARY
+from utils.stream_aggregator import sensor_aggregator, Reading
+from utils.active_users import active_users
+from utils.ingestion_buffer import ingest_buffer, IngestBufferFull
+from utils.prediction_cache import prediction_cache
+from utils.model_registry import model_registry
+from utils.compute_pool import compute_pool
+from utils.loop_monitor import loop_monitor
+from utils.scheduler_leader import scheduler_leader
+from config import WS_DELIVERY_MODE, WS_DELIVERY_INTERVAL_MS
+import numpy as np
 import asyncio
 import logging
 import json
@@ -17,10 +29,76 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("sensor")
 
 class SensorDataInput(BaseModel):
+    gsr: float = Field(..., allow_inf_nan=False)
+    heart_rate: float = Field(..., allow_inf_nan=False)
+    temperature: float = Field(..., allow_inf_nan=False)
+    user_id: int
+
+# Upper bound on readings per batch request (an hour at 1 Hz)
+MAX_BATCH_READINGS = 3600
+
+# Packed batch record: little-endian float64 unix timestamp (seconds, UTC) + float32 gsr, heart_rate, temperature
+PACKED_READING = np.dtype([
+    ("timestamp", "<f8"),
+    ("gsr", "<f4"),
+    ("heart_rate", "<f4"),
+    ("temperature", "<f4"),
+])
+# Packed timestamps datetime.utcfromtimestamp accepts everywhere: 1970-01-01 up to year 9999
+PACKED_TIMESTAMP_RANGE = (0.0, 253402300799.0)
+
+class SensorReadingInput(BaseModel):
+    timestamp: datetime
     gsr: float
     heart_rate: float
     temperature: float
+
+class SensorBatchInput(BaseModel):
     user_id: int
+    readings: List[SensorReadingInput] = Field(..., min_length=1, max_length=MAX_BATCH_READINGS)
+
+def _utc_naive(timestamp: datetime) -> datetime:
+    """Device timestamps are stored the same way as datetime.utcnow()."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def _parse_ws_reading(data: str, user_id: int) -> SensorDataInput:
+    """Validate a WebSocket reading like POST /sensor/data; user_id comes from the connection."""
+    reading = json.loads(data)
+    if not isinstance(reading, dict):
+        raise ValueError("Expected a JSON object")
+    return SensorDataInput(**{**reading, "user_id": user_id})
+
+async def _store_batch(user_id: int, rows: List[dict], db: AsyncSession) -> dict:
+    """Store a batch of readings in one bulk insert and broadcast the newest one."""
+    rows.sort(key=lambda row: row["timestamp"])
+    ids = await ingest_buffer.submit_many(rows)
+    for i, row in enumerate(rows):
+        sensor_aggregator.add(user_id, Reading(
+            ids[i] if ids else None,
+            row["timestamp"],
+            row["gsr"],
+            row["heart_rate"],
+            row["temperature"]
+        ))
+
+    latest = rows[-1]
+    payload = {
+        "type": "sensor_data",
+        "timestamp": latest["timestamp"].isoformat(),
+        "heart_rate": latest["heart_rate"],
+        "temperature": latest["temperature"],
+        "gsr": latest["gsr"],
+        "stress_level": await prediction_cache.get(user_id, db)
+    }
+    await websocket_manager.broadcast_user(
+        user_id=str(user_id),
+        message=json.dumps(payload),
+        coalesce=True
+    )
+    logger.info(f"Stored batch of {len(rows)} readings for user {user_id}")
+    return {"message": "Batch received successfully", "count": len(rows), "ids": ids}
 
 @router.post("/data")
 async def receive_sensor_data(
@@ -28,54 +106,141 @@ async def receive_sensor_data(
     db: AsyncSession = Depends(get_db)
 ):
     try:
-        new_entry = SensorData(
-            user_id=data.user_id,
-            gsr=data.gsr,
-            heart_rate=data.heart_rate,
-            temperature=data.temperature,
-            timestamp=datetime.utcnow(),
-        )
-        db.add(new_entry)
-        await db.commit()
-        await db.refresh(new_entry)
+        new_entry = {
+            "user_id": data.user_id,
+            "gsr": data.gsr,
+            "heart_rate": data.heart_rate,
+            "temperature": data.temperature,
+            "timestamp": datetime.utcnow(),
+        }
+        new_id = await ingest_buffer.submit(new_entry)
+        sensor_aggregator.add(data.user_id, Reading(new_id, new_entry["timestamp"], data.gsr, data.heart_rate, data.temperature))
         
-        result = await db.execute(
-            select(Prediction)
-            .where(Prediction.user_id == data.user_id)
-            .order_by(Prediction.timestamp.desc())
-            .limit(1)
-        )
-        latest_prediction = result.scalar()
-        stress_level = latest_prediction.stress_level if latest_prediction else None
+        stress_level = await prediction_cache.get(data.user_id, db)
 
         payload = {
             "type": "sensor_data",
-            "timestamp": new_entry.timestamp.isoformat(),
-            "heart_rate": new_entry.heart_rate,
-            "temperature": new_entry.temperature,
-            "gsr": new_entry.gsr,
+            "timestamp": new_entry["timestamp"].isoformat(),
+            "heart_rate": data.heart_rate,
+            "temperature": data.temperature,
+            "gsr": data.gsr,
             "stress_level": stress_level
         }
         await websocket_manager.broadcast_user(
             user_id=str(data.user_id),
-            message=json.dumps(payload) + "\n"
+            message=json.dumps(payload),
+            coalesce=True
         )
-        logger.info(f"Sensor data stored and broadcasted for user {data.user_id}: {payload}")
+        logger.debug(f"Sensor data stored and broadcasted for user {data.user_id}: {payload}")
         
-        return {"message": "Data received successfully", "id": new_entry.id}
+        return {"message": "Data received successfully", "id": new_id}
+    except IngestBufferFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/data/batch")
+async def receive_sensor_batch(
+    data: SensorBatchInput,
+    db: AsyncSession = Depends(get_db)
+):
+    """Store a JSON array of timestamped readings in one bulk insert."""
+    try:
+        rows = [
+            {
+                "user_id": data.user_id,
+                "gsr": reading.gsr,
+                "heart_rate": reading.heart_rate,
+                "temperature": reading.temperature,
+                "timestamp": _utc_naive(reading.timestamp),
+            }
+            for reading in data.readings
+        ]
+        return await _store_batch(data.user_id, rows, db)
+    except IngestBufferFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+@router.post("/data/batch/packed")
+async def receive_sensor_batch_packed(
+    request: Request,
+    user_id: int = Query(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """Store packed binary readings (application/octet-stream, PACKED_READING records)."""
+    body = await request.body()
+    if not body or len(body) % PACKED_READING.itemsize:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Body must be a non-empty sequence of {PACKED_READING.itemsize}-byte records"
+        )
+    records = np.frombuffer(body, dtype=PACKED_READING)
+    if len(records) > MAX_BATCH_READINGS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {MAX_BATCH_READINGS} readings per batch")
+    values = np.column_stack([records["gsr"], records["heart_rate"], records["temperature"]]).astype(np.float64)
+    if not (np.isfinite(values).all() and np.isfinite(records["timestamp"]).all()):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Readings must be finite numbers")
+    low, high = PACKED_TIMESTAMP_RANGE
+    if ((records["timestamp"] < low) | (records["timestamp"] > high)).any():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Timestamps must be unix seconds between {low:.0f} and {high:.0f}"
+        )
+    try:
+        rows = [
+            {
+                "user_id": user_id,
+                "gsr": gsr,
+                "heart_rate": heart_rate,
+                "temperature": temperature,
+                "timestamp": datetime.utcfromtimestamp(timestamp),
+            }
+            for timestamp, (gsr, heart_rate, temperature) in zip(records["timestamp"].tolist(), values.tolist())
+        ]
+        return await _store_batch(user_id, rows, db)
+    except IngestBufferFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/metrics")
+async def ingestion_metrics():
+    """Counters for the ingestion buffer, the latest-prediction cache, WebSocket fan-out, the DB pool, the model, the compute pool, active users, the scheduler and the event loop."""
+    return {
+        "db_pool": pool_metrics(),
+        "model": model_registry.metrics(),
+        "compute_pool": compute_pool.metrics(),
+        "active_users": active_users.metrics(),
+        "scheduler": scheduler_leader.metrics(),
+        "event_loop": loop_monitor.metrics(),
+        "ingest_buffer": ingest_buffer.metrics(),
+        "prediction_cache": prediction_cache.metrics(),
+        "websocket": websocket_manager.metrics()
+    }
+
 @router.websocket("/ws/sensor/data")
 async def websocket_sensor_data(
     websocket: WebSocket,
-    db: AsyncSession = Depends(get_db),
-    user_id: int = Query(...)
+    user_id: int = Query(...),
+    delivery: str = Query(WS_DELIVERY_MODE),
+    interval_ms: int = Query(WS_DELIVERY_INTERVAL_MS, ge=0, le=60000),
+    epoch: Optional[str] = Query(None, description="Epoch from the last resume message"),
+    last_seq: Optional[int] = Query(None, ge=0, description="Last seq received; replays what was missed")
 ):
-    await websocket.accept()
-    connected = await websocket_manager.connect(websocket, str(user_id))
-    if not connected:
+    subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+    if delivery not in DELIVERY_MODES:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=f"Unknown delivery mode: {delivery}")
+        return
+    subscriber = await websocket_manager.connect(
+        websocket, str(user_id), delivery, interval_ms,
+        binary=subprotocol == SUBPROTOCOL_BINARY, epoch=epoch, last_seq=last_seq
+    )
+    if not subscriber:
         logger.info(f"Connection rejected for user_id {user_id}")
         return
     try:
@@ -85,35 +250,52 @@ async def websocket_sensor_data(
                 data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
                 if data != "ping":
                     try:
-                        sensor_data = json.loads(data)
-                        db_sensor_data = SensorData(
-                            user_id=user_id,
-                            heart_rate=sensor_data.get("heart_rate"),
-                            temperature=sensor_data.get("temperature"),
-                            gsr=sensor_data.get("gsr"),
-                            timestamp=datetime.utcnow(),
-                        )
-                        db.add(db_sensor_data)
-                        await db.commit()
+                        sensor_data = _parse_ws_reading(data, user_id)
+                    except json.JSONDecodeError:
+                        await subscriber.send("Error: Invalid JSON data")
+                        logger.error(f"Invalid JSON for user_id {user_id}: {data}")
+                        continue
+                    except ValueError as e:
+                        await subscriber.send("Error: Invalid sensor data")
+                        logger.error(f"Invalid sensor data for user_id {user_id}: {str(e)}")
+                        continue
+                    try:
+                        db_sensor_data = {
+                            "user_id": user_id,
+                            "heart_rate": sensor_data.heart_rate,
+                            "temperature": sensor_data.temperature,
+                            "gsr": sensor_data.gsr,
+                            "timestamp": datetime.utcnow(),
+                        }
+                        # Don't hold the receive loop for the commit: that allows one reading per flush
+                        new_id = await ingest_buffer.submit(db_sensor_data, wait=False)
+                        sensor_aggregator.add(user_id, Reading(
+                            new_id,
+                            db_sensor_data["timestamp"],
+                            db_sensor_data["gsr"],
+                            db_sensor_data["heart_rate"],
+                            db_sensor_data["temperature"]
+                        ))
                         payload = {
                             "type": "sensor_data",
-                            "timestamp": db_sensor_data.timestamp.isoformat(),
-                            "heart_rate": db_sensor_data.heart_rate,
-                            "temperature": db_sensor_data.temperature,
-                            "gsr": db_sensor_data.gsr,
-                            "stress_level": None
+                            "timestamp": db_sensor_data["timestamp"].isoformat(),
+                            "heart_rate": db_sensor_data["heart_rate"],
+                            "temperature": db_sensor_data["temperature"],
+                            "gsr": db_sensor_data["gsr"],
+                            "stress_level": await prediction_cache.get(user_id)
                         }
                         await websocket_manager.broadcast_user(
                             user_id=str(user_id),
-                            message=json.dumps(payload)
+                            message=json.dumps(payload),
+                            coalesce=True
                         )
-                        await websocket.send_text(json.dumps({"message": "Sensor data received"}))
-                        logger.info(f"Received sensor data via WebSocket for user_id {user_id}: {data}")
-                    except json.JSONDecodeError:
-                        await websocket.send_text("Error: Invalid JSON data")
-                        logger.error(f"Invalid JSON for user_id {user_id}: {data}")
+                        await subscriber.send(json.dumps({"message": "Sensor data received"}))
+                        logger.debug(f"Received sensor data via WebSocket for user_id {user_id}: {data}")
+                    except IngestBufferFull as e:
+                        await subscriber.send("Error: Sensor data not stored, try again")
+                        logger.error(f"Ingestion buffer full for user_id {user_id}: {str(e)}")
             except asyncio.TimeoutError:
-                await websocket.send_text("ping")
+                await subscriber.send("ping")
                 logger.debug(f"Sent ping to user_id {user_id}")
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for user_id: {user_id}")
@@ -122,7 +304,7 @@ async def websocket_sensor_data(
     finally:
         if websocket.client_state == WebSocketState.CONNECTED:
             await websocket.close(code=status.WS_1000_NORMAL_CLOSURE)
-        await websocket_manager.disconnect(str(user_id))
+        await websocket_manager.disconnect(str(user_id), websocket)
 
 # '''
 # Receives JSON payload from ESP8266
@@ -10,19 +10,40 @@ Logs inference time to monitor model performance.
 Tracks prediction values for debugging.
 Logs database commits to confirm data storage.
 Sends SMS reminders for active dosages.
+Processes users concurrently with a bounded worker pool, one DB session per worker.
+Reports tick wall time, p50/p99 per-user latency and skipped/failed counts.
+Extracts features for all users in one grouped query (NumPy fallback on SQLite).
+Runs the model once per tick over the stacked (n_users, 6) feature matrix.
+Optionally reads features from the in-memory rolling windows without touching the database.
+Keeps the 1m/15m/1h sensor rollups up to date from new raw rows each tick.
+Runs inference through the shared model registry and records the model version.
+Runs feature extraction and inference in the compute pool (thread or process), never on the event loop,
+and logs the worst event-loop lag seen during each tick.
+Visits only users with readings newer than their processed watermark (utils/active_users.py),
+so a tick costs O(active devices) rather than O(registered users).
+Only one process runs the jobs when several workers are started (utils/scheduler_leader.py).
 '''
 import logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlalchemy import desc, and_
+from sqlalchemy import desc, and_, func, case
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from database.db import get_db
-from utils.model_utils import load_model, predict_stress
-from utils.data_processing import compute_features
-from database.models import User, SensorData, Prediction, ProcessedData, Notification, Dosage, Child, Caregiver
+from database.db import SessionLocal
+from config import SCHEDULER_CONCURRENCY, SCHEDULER_BATCH_FEATURES, SCHEDULER_STREAM_FEATURES
+from utils.model_registry import model_registry
+from utils.data_processing import features_matrix, FEATURE_NAMES
+from utils.compute_pool import compute_pool
+from utils.loop_monitor import loop_monitor
+from utils.active_users import active_users
+from database.models import SensorData, Prediction, ProcessedData, Notification, Dosage, Child, Caregiver
 from datetime import datetime, timedelta
 from utils.websocket_manager import websocket_manager
+from utils.stream_aggregator import sensor_aggregator
+from utils.prediction_cache import prediction_cache
+from utils.rollups import update_rollups
 from routes_api.dosages import send_sms
+import asyncio
+import numpy as np
 import time
 import json
 
@@ -30,34 +51,118 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("stress_model")
 
 scheduler = AsyncIOScheduler(timezone="Africa/Nairobi")
-model = load_model()
 
-async def process_data_for_user(user_id: int, db: AsyncSession):
-    """Process data for a single user with optimized queries"""
+# Outcomes returned by process_data_for_user
+PROCESSED = "processed"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# Readings per user that feed one feature window
+FEATURE_WINDOW_LIMIT = 100
+
+async def fetch_batch_features(db: AsyncSession, since: datetime) -> dict:
+    """Compute features for every user with readings since `since` in one round-trip.
+
+    Ranks each user's readings newest-first over sensor_data_user_timestamp_idx,
+    keeps the latest FEATURE_WINDOW_LIMIT and aggregates them with GROUP BY user_id.
+    SQLite has no stddev_pop, so there the ranked rows are fetched and grouped
+    with NumPy instead.
+
+    Returns:
+        dict: user_id -> (features, latest reading row with id/timestamp/gsr/heart_rate/temperature).
+    """
+    rn = func.row_number().over(
+        partition_by=SensorData.user_id,
+        order_by=desc(SensorData.timestamp)
+    ).label("rn")
+    ranked = select(
+        SensorData.id,
+        SensorData.user_id,
+        SensorData.timestamp,
+        SensorData.gsr,
+        SensorData.heart_rate,
+        SensorData.temperature,
+        rn
+    ).where(SensorData.timestamp >= since).subquery()
+
+    if db.bind.dialect.name == "sqlite":
+        result = await db.execute(
+            select(ranked).where(ranked.c.rn <= FEATURE_WINDOW_LIMIT).order_by(ranked.c.user_id, ranked.c.rn)
+        )
+        rows = result.all()
+        if not rows:
+            return {}
+        features = await compute_pool.features_batch(
+            [r.user_id for r in rows],
+            [r.gsr for r in rows],
+            [r.heart_rate for r in rows],
+            [r.temperature for r in rows]
+        )
+        latest = {r.user_id: r for r in rows if r.rn == 1}
+        return {user_id: (features[user_id], latest[user_id]) for user_id in features}
+
+    def latest(column):
+        return func.max(case((ranked.c.rn == 1, column))).label(column.name)
+
+    result = await db.execute(
+        select(
+            ranked.c.user_id,
+            func.max(ranked.c.gsr).label("gsr_max"),
+            func.min(ranked.c.gsr).label("gsr_min"),
+            func.avg(ranked.c.gsr).label("gsr_mean"),
+            func.stddev_pop(ranked.c.gsr).label("gsr_sd"),
+            func.avg(ranked.c.heart_rate).label("hrate_mean"),
+            func.avg(ranked.c.temperature).label("temp_avg"),
+            latest(ranked.c.id),
+            latest(ranked.c.timestamp),
+            latest(ranked.c.gsr),
+            latest(ranked.c.heart_rate),
+            latest(ranked.c.temperature)
+        ).where(ranked.c.rn <= FEATURE_WINDOW_LIMIT).group_by(ranked.c.user_id)
+    )
+    return {
+        row.user_id: ({name: getattr(row, name) for name in FEATURE_NAMES}, row)
+        for row in result.all()
+    }
+
+async def process_data_for_user(user_id: int, db: AsyncSession, batch_row: tuple = None, prediction: tuple = None) -> str:
+    """Process data for a single user with optimized queries.
+
+    `batch_row` is this user's (features, latest reading) from fetch_batch_features;
+    without it the user's readings are queried and aggregated here.
+    `prediction` is this user's (stress_level, inference_time, model_version) from the tick's
+    batched inference; without it the model is run for this user alone.
+
+    Returns PROCESSED, SKIPPED (no recent sensor data) or FAILED.
+    """
     try:
         start_time = time.time()
-        five_minutes_ago = datetime.utcnow() - timedelta(minutes=5)
-        
-        # Fetch full SensorData objects for compute_features compatibility
-        sensor_query = select(SensorData).where(
-            SensorData.user_id == user_id,
-            SensorData.timestamp >= five_minutes_ago
-        ).order_by(desc(SensorData.timestamp)).limit(100)
-
-        result = await db.execute(sensor_query)
-        data_points = result.scalars().all()
-        
-        if not data_points:
-            logger.debug(f"No sensor data for user {user_id}")
-            return
+        if batch_row is not None:
+            features, latest_data = batch_row
+        else:
+            five_minutes_ago = datetime.utcnow() - timedelta(minutes=5)
 
-        features = compute_features(data_points)
+            # Fetch full SensorData objects for compute_features compatibility
+            sensor_query = select(SensorData).where(
+                SensorData.user_id == user_id,
+                SensorData.timestamp >= five_minutes_ago
+            ).order_by(desc(SensorData.timestamp)).limit(FEATURE_WINDOW_LIMIT)
+
+            result = await db.execute(sensor_query)
+            data_points = result.scalars().all()
+
+            if not data_points:
+                logger.debug(f"No sensor data for user {user_id}")
+                return SKIPPED
+
+            features = await compute_pool.features(data_points)
+            latest_data = data_points[0]
         processing_time = time.time() - start_time
 
         processed_data = ProcessedData(
             user_id=user_id,
             timestamp=datetime.utcnow(),
-            sensor_data_id=data_points[0].id,
+            sensor_data_id=latest_data.id,
             gsr_max=float(features["gsr_max"]),
             gsr_min=float(features["gsr_min"]),
             gsr_mean=float(features["gsr_mean"]),
@@ -68,15 +173,19 @@ async def process_data_for_user(user_id: int, db: AsyncSession):
         db.add(processed_data)
         await db.flush()
 
-        prediction_start = time.time()
-        stress_level = predict_stress(model, features)
-        inference_time = time.time() - prediction_start
+        if prediction is not None:
+            stress_level, inference_time, model_version = prediction
+        else:
+            prediction_start = time.time()
+            stress_level, model_version = await model_registry.predict(features)
+            inference_time = time.time() - prediction_start
 
         prediction = Prediction(
             user_id=user_id,
             stress_level=stress_level,
             timestamp=datetime.utcnow(),
-            inference_time=inference_time,       
+            inference_time=inference_time,
+            model_version=model_version
         )
         db.add(prediction)
         await db.flush()
@@ -115,8 +224,8 @@ async def process_data_for_user(user_id: int, db: AsyncSession):
             )
         db.add(notification)
         await db.commit()
+        prediction_cache.put(user_id, stress_level, prediction.timestamp)
         
-        latest_data = data_points[0]
         sensor_payload = {
             "type": "sensor_data",
             "timestamp": latest_data.timestamp.isoformat(),
@@ -127,7 +236,8 @@ async def process_data_for_user(user_id: int, db: AsyncSession):
         }
         await websocket_manager.broadcast_user(
             user_id=str(user_id),
-            message=json.dumps(sensor_payload)
+            message=json.dumps(sensor_payload),
+            coalesce=True
         )
         
         # Broadcast notifications
@@ -152,10 +262,12 @@ async def process_data_for_user(user_id: int, db: AsyncSession):
             f"Inference: {inference_time:.2f}s | "
             f"Stress: {stress_level}"
         )
+        return PROCESSED
 
     except Exception as e:
         logger.error(f"Error processing user {user_id}: {str(e)}")
         await db.rollback()
+        return FAILED
 
 async def check_dosage_reminders(db: AsyncSession):
     """Check active dosages and send SMS reminders"""
@@ -209,23 +321,116 @@ async def check_dosage_reminders(db: AsyncSession):
         logger.error(f"Error checking dosage reminders: {str(e)}")
         await db.rollback()
 
-async def process_all_users():
-    """Process all users in batches"""
-    db = None
-    db_gen = get_db()
+async def predict_batch(batch: dict) -> dict:
+    """Run the model once over the tick's stacked feature matrix.
+
+    Returns user_id -> (stress_level, amortized inference_time, model_version). On failure
+    returns {} so each user falls back to its own prediction.
+    """
+    if not batch:
+        return {}
+    user_ids = list(batch)
+    X = features_matrix(batch[user_id][0] for user_id in user_ids)
     try:
-        db = await anext(db_gen)
-        result = await db.execute(select(User))
-        users = result.scalars().all()
-        for user in users:
-            await process_data_for_user(user.id, db)
-        await check_dosage_reminders(db)
+        start = time.perf_counter()
+        labels, model_version = await model_registry.predict_batch(X)
+        inference_time = (time.perf_counter() - start) / len(user_ids)
+    except Exception as e:
+        logger.error(f"Batched inference failed for {len(user_ids)} users: {str(e)}")
+        return {}
+    logger.info(f"Batched inference for {len(user_ids)} users in {inference_time * len(user_ids) * 1000:.1f}ms")
+    return {
+        user_id: (int(label), inference_time, model_version)
+        for user_id, label in zip(user_ids, labels)
+    }
+
+async def _user_worker(worker_id: int, queue: asyncio.Queue, latencies: list, outcomes: dict):
+    """Drain (user_id, batch_row, prediction, watermark) items from the queue using a session owned by this worker.
+
+    A failed user gets its session discarded and replaced, so a broken
+    transaction never leaks into the next user handled by this worker.
+    A processed user's watermark is advanced; skipped and failed users stay due.
+    """
+    db = SessionLocal()
+    try:
+        while True:
+            try:
+                user_id, batch_row, prediction, watermark = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                outcome = await process_data_for_user(user_id, db, batch_row, prediction)
+            except Exception as e:
+                logger.error(f"Worker {worker_id} crashed on user {user_id}: {str(e)}")
+                outcome = FAILED
+            latencies.append(time.perf_counter() - start)
+            outcomes[outcome] += 1
+            if outcome == PROCESSED:
+                active_users.processed(user_id, watermark)
+            if outcome == FAILED:
+                await db.close()
+                db = SessionLocal()
+            else:
+                db.expunge_all()
+    finally:
+        await db.close()
+
+async def process_all_users(concurrency: int = SCHEDULER_CONCURRENCY):
+    """Process every user with new readings with a bounded pool of concurrent workers"""
+    tick_start = time.perf_counter()
+    tick_mark = time.monotonic()
+    latencies = []
+    outcomes = {PROCESSED: 0, SKIPPED: 0, FAILED: 0}
+    due = {}
+    try:
+        queue = asyncio.Queue()
+        async with SessionLocal() as db:
+            since = datetime.utcnow() - timedelta(minutes=5)
+            due = await active_users.due(db, since)
+            if due and (SCHEDULER_STREAM_FEATURES or SCHEDULER_BATCH_FEATURES):
+                if SCHEDULER_STREAM_FEATURES:
+                    batch = sensor_aggregator.batch_features()
+                else:
+                    batch = await fetch_batch_features(db, since)
+                batch = {user_id: batch_row for user_id, batch_row in batch.items() if user_id in due}
+                outcomes[SKIPPED] = len(due) - len(batch)
+                predictions = await predict_batch(batch)
+                for user_id, batch_row in batch.items():
+                    queue.put_nowait((user_id, batch_row, predictions.get(user_id), due[user_id]))
+            else:
+                for user_id, watermark in due.items():
+                    queue.put_nowait((user_id, None, None, watermark))
+
+        workers = max(1, min(concurrency, queue.qsize()))
+        await asyncio.gather(*(
+            _user_worker(i, queue, latencies, outcomes) for i in range(workers)
+        ))
+
+        async with SessionLocal() as db:
+            await check_dosage_reminders(db)
     except Exception as e:
         logger.error(f"Error processing all users: {str(e)}")
     finally:
-        if db is not None:
-            await db.close()
-        await db_gen.aclose()
+        wall_time = time.perf_counter() - tick_start
+        p50, p99 = np.percentile(latencies, [50, 99]) if latencies else (0.0, 0.0)
+        logger.info(
+            f"Scheduler tick | Active: {len(due)} | Users: {len(latencies)} | "
+            f"Wall: {wall_time:.2f}s | "
+            f"p50: {p50 * 1000:.1f}ms | p99: {p99 * 1000:.1f}ms | "
+            f"Processed: {outcomes[PROCESSED]} | Skipped: {outcomes[SKIPPED]} | Failed: {outcomes[FAILED]} | "
+            f"Loop lag max: {loop_monitor.max_since(tick_mark) * 1000:.1f}ms"
+        )
+
+async def update_sensor_rollups():
+    """Fold new sensor_data rows into the rollup tables"""
+    try:
+        start = time.perf_counter()
+        async with SessionLocal() as db:
+            rows = await update_rollups(db)
+        logger.info(f"Rollups updated | Raw ids: {rows} | {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        logger.error(f"Error updating rollups: {str(e)}")
 
 def scheduler_startup():
     scheduler.add_job(
@@ -236,6 +441,14 @@ def scheduler_startup():
         replace_existing=True,
         misfire_grace_time=60
     )
-    scheduler.start()
-    logger.info("Scheduler started")
+    scheduler.add_job(
+        update_sensor_rollups,
+        trigger='interval',
+        minutes=5,
+        id='update_rollups',
+        replace_existing=True,
+        misfire_grace_time=60
+    )
+    # Started by utils/scheduler_leader.py in the one process that should run the jobs
+    logger.info("Scheduler jobs registered")
     return scheduler
\ No newline at end of file
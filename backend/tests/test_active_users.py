@@ -0,0 +1,159 @@
+import unittest
+from datetime import datetime, timedelta
+from utils.active_users import ActiveUserIndex
+from utils.ingestion_buffer import SensorIngestBuffer
+
+try:
+    import aiosqlite  # noqa: F401
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from database.models import Base, User, SensorData
+except ImportError:
+    aiosqlite = None
+
+WINDOW = timedelta(minutes=5)
+
+def rows(user_id, *timestamps):
+    return [{"user_id": user_id, "timestamp": timestamp} for timestamp in timestamps]
+
+class TestMemoryIndex(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.index = ActiveUserIndex(source="memory", backplane="inprocess")
+        self.now = datetime.utcnow()
+        self.since = self.now - WINDOW
+
+    async def test_due_until_processed(self):
+        self.index.mark_rows(rows(1, self.now) + rows(2, self.now - timedelta(seconds=30)))
+        due = await self.index.due(None, self.since)
+        self.assertEqual(set(due), {1, 2})
+        for user_id, token in due.items():
+            self.index.processed(user_id, token)
+        self.assertEqual(await self.index.due(None, self.since), {})
+
+    async def test_new_reading_after_processing_is_due_again(self):
+        self.index.mark(1, self.now)
+        token = (await self.index.due(None, self.since))[1]
+        self.index.processed(1, token)
+        self.index.mark(1, self.now)
+        self.assertEqual(set(await self.index.due(None, self.since)), {1})
+
+    async def test_mark_between_due_and_processed_stays_due(self):
+        self.index.mark(1, self.now)
+        token = (await self.index.due(None, self.since))[1]
+        # A reading committed while the scheduler was working on the user
+        self.index.mark(1, self.now)
+        self.index.processed(1, token)
+        self.assertEqual(set(await self.index.due(None, self.since)), {1})
+
+    async def test_processed_never_moves_the_watermark_back(self):
+        self.index.mark(1, self.now)
+        self.index.mark(1, self.now)
+        token = (await self.index.due(None, self.since))[1]
+        self.index.processed(1, token)
+        self.index.processed(1, token - 1)
+        self.assertEqual(await self.index.due(None, self.since), {})
+
+    async def test_idle_users_are_dropped(self):
+        self.index.mark(1, self.now - WINDOW - timedelta(seconds=1))
+        self.index.mark(2, self.now)
+        self.assertEqual(set(await self.index.due(None, self.since)), {2})
+        self.assertNotIn(1, self.index.last_seen)
+        self.assertNotIn(1, self.index.changes)
+
+    async def test_mark_rows_keeps_newest_timestamp(self):
+        older, newer = self.now - timedelta(seconds=20), self.now
+        self.index.mark_rows(rows(1, newer, older))
+        self.assertEqual(self.index.last_seen[1], newer)
+        self.assertEqual(self.index.changes[1], 1)
+
+class FailingSession:
+    async def __aenter__(self):
+        raise RuntimeError("database unavailable")
+
+    async def __aexit__(self, *exc):
+        return False
+
+class TestBufferMarksOnCommit(unittest.IsolatedAsyncioTestCase):
+    async def test_failed_flush_marks_nobody(self):
+        index = ActiveUserIndex(source="memory", backplane="inprocess")
+        buffer = SensorIngestBuffer(session_factory=FailingSession, durability="async", flush_interval=0.01)
+        buffer.add_commit_listener(index.mark_rows)
+        buffer.start()
+        await buffer.submit_many(rows(1, datetime.utcnow()))
+        await buffer.stop()
+        self.assertEqual(buffer.rows_failed, 1)
+        self.assertEqual(index.marks, 0)
+
+    async def test_committed_rows_are_marked(self):
+        index = ActiveUserIndex(source="memory", backplane="inprocess")
+        buffer = SensorIngestBuffer(durability="async")
+        buffer.add_commit_listener(index.mark_rows)
+        now = datetime.utcnow()
+        buffer._committed(rows(1, now) + rows(2, now))
+        self.assertEqual(set(await index.due(None, now - WINDOW)), {1, 2})
+
+class TestSourceSelection(unittest.TestCase):
+    def test_auto_uses_db_with_a_cross_process_backplane(self):
+        self.assertEqual(ActiveUserIndex("auto", "redis").source, "db")
+        self.assertEqual(ActiveUserIndex("auto", "postgres").source, "db")
+        self.assertEqual(ActiveUserIndex("auto", "inprocess").source, "auto")
+        self.assertEqual(ActiveUserIndex("memory", "redis").source, "memory")
+
+    def test_rejects_unknown_source(self):
+        with self.assertRaises(ValueError):
+            ActiveUserIndex("sometimes")
+
+@unittest.skipIf(aiosqlite is None, "needs aiosqlite")
+class TestDatabaseIndex(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all, tables=[User.__table__, SensorData.__table__])
+        self.db = AsyncSession(self.engine, expire_on_commit=False)
+        self.db.add_all([
+            User(id=user_id, first_name="a", last_name="b", email=f"{user_id}@b.c", hashed_password="x")
+            for user_id in (1, 2)
+        ])
+        await self.db.commit()
+        self.now = datetime.utcnow()
+        self.since = self.now - WINDOW
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        await self.engine.dispose()
+
+    async def add(self, user_id, timestamp):
+        reading = SensorData(user_id=user_id, timestamp=timestamp, gsr=1.0, heart_rate=80.0, temperature=36.5)
+        self.db.add(reading)
+        await self.db.commit()
+        return reading.id
+
+    async def test_newest_id_is_the_watermark(self):
+        index = ActiveUserIndex(source="db", backplane="inprocess")
+        await self.add(1, self.now)
+        newest = await self.add(1, self.now)
+        await self.add(2, self.now - WINDOW - timedelta(minutes=1))
+        due = await index.due(self.db, self.since)
+        self.assertEqual(due, {1: newest})
+        index.processed(1, newest)
+        self.assertEqual(await index.due(self.db, self.since), {})
+        newer = await self.add(1, self.now)
+        self.assertEqual(await index.due(self.db, self.since), {1: newer})
+        self.assertEqual(index.db_lookups, 3)
+
+    async def test_auto_queries_the_db_until_it_has_watched_a_window(self):
+        index = ActiveUserIndex(source="auto", backplane="inprocess")
+        stored = await self.add(2, self.now)
+        # Readings from before this process started are only in the database
+        due = await index.due(self.db, index.tracking_since - WINDOW)
+        self.assertEqual(due, {2: stored})
+        self.assertEqual(index.watermark_source, "db")
+        index.processed(2, stored)
+        # A full window later the index answers from memory; watermarks restart with the source
+        index.mark(1, datetime.utcnow())
+        due = await index.due(self.db, index.tracking_since)
+        self.assertEqual(index.watermark_source, "memory")
+        self.assertEqual(set(due), {1})
+        self.assertEqual(index.db_lookups, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+from utils.backplane import Backplane, RedisBackplane, FakeRedis, InProcessBackplane, create_backplane
+
+class Inbox:
+    def __init__(self):
+        self.messages = []
+
+    async def deliver(self, user_id, message, coalesce):
+        self.messages.append((user_id, message, coalesce))
+
+async def settle():
+    # Let the backplanes' reader tasks drain their queues
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+class TestBackplane(unittest.IsolatedAsyncioTestCase):
+    def test_publish_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Backplane()
+
+    async def test_in_process_delivers_directly(self):
+        inbox = Inbox()
+        backplane = InProcessBackplane()
+        await backplane.start(inbox.deliver)
+        await backplane.publish("1", "hello", True)
+        self.assertEqual(inbox.messages, [("1", "hello", True)])
+
+    async def test_two_redis_backplanes_share_a_broker(self):
+        # Two clients of one simulated server, one backplane per simulated process
+        server = FakeRedis()
+        first = RedisBackplane(client=server)
+        second = RedisBackplane(client=FakeRedis(server.broker))
+        first_inbox, second_inbox = Inbox(), Inbox()
+        await first.start(first_inbox.deliver)
+        await second.start(second_inbox.deliver)
+        try:
+            await first.publish("7", "from first")
+            await second.publish("8", "from second", coalesce=True)
+            await settle()
+            expected = [("7", "from first", False), ("8", "from second", True)]
+            self.assertEqual(first_inbox.messages, expected)
+            self.assertEqual(second_inbox.messages, expected)
+            self.assertEqual((first.published, first.received), (1, 2))
+            self.assertEqual((second.published, second.received), (1, 2))
+        finally:
+            await second.stop()
+        # A stopped backplane no longer receives
+        await first.publish("9", "after stop")
+        await settle()
+        await first.stop()
+        self.assertEqual(first_inbox.messages[-1], ("9", "after stop", False))
+        self.assertEqual(len(second_inbox.messages), 2)
+
+    async def test_malformed_payload_is_dropped(self):
+        inbox = Inbox()
+        backplane = create_backplane("fakeredis")
+        await backplane.start(inbox.deliver)
+        try:
+            await backplane.client.publish(backplane.channel, "not json")
+            await backplane.publish("1", "ok")
+            await settle()
+            self.assertEqual(inbox.messages, [("1", "ok", False)])
+        finally:
+            await backplane.stop()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import desc
+from sqlalchemy.future import select
+from database.models import Base, User, SensorData
+from utils.data_processing import compute_features, FEATURE_NAMES
+from utils.compute_pool import compute_pool
+from tasks import fetch_batch_features, FEATURE_WINDOW_LIMIT
+
+try:
+    import aiosqlite  # noqa: F401
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+except ImportError:
+    aiosqlite = None
+
+@unittest.skipIf(aiosqlite is None, "needs aiosqlite")
+class TestBatchFeatures(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all, tables=[User.__table__, SensorData.__table__])
+        self.db = AsyncSession(self.engine, expire_on_commit=False)
+        self.now = datetime.utcnow()
+        self.since = self.now - timedelta(minutes=5)
+        rng = random.Random(0)
+        # Users below, at and above the window limit, plus one with only stale readings
+        counts = {1: 3, 2: FEATURE_WINDOW_LIMIT, 3: FEATURE_WINDOW_LIMIT + 37, 4: 0}
+        for user_id, count in counts.items():
+            self.db.add(User(id=user_id, first_name="a", last_name="b", email=f"{user_id}@b.c", hashed_password="x"))
+            readings = [self.now - timedelta(seconds=rng.uniform(0, 290)) for _ in range(count)]
+            readings += [self.now - timedelta(minutes=rng.uniform(6, 30)) for _ in range(5)]
+            for timestamp in readings:
+                self.db.add(SensorData(
+                    user_id=user_id,
+                    timestamp=timestamp,
+                    gsr=rng.uniform(300, 700),
+                    heart_rate=rng.gauss(85, 8),
+                    temperature=rng.gauss(36.6, 0.3)
+                ))
+        await self.db.commit()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        await self.engine.dispose()
+
+    async def per_user(self, user_id):
+        # The query process_data_for_user runs without a batch row
+        result = await self.db.execute(
+            select(SensorData).where(
+                SensorData.user_id == user_id,
+                SensorData.timestamp >= self.since
+            ).order_by(desc(SensorData.timestamp)).limit(FEATURE_WINDOW_LIMIT)
+        )
+        return result.scalars().all()
+
+    async def test_matches_per_user_compute_features(self):
+        batch = await fetch_batch_features(self.db, self.since)
+        self.assertEqual(set(batch), {1, 2, 3})
+        for user_id, (features, latest) in batch.items():
+            data_points = await self.per_user(user_id)
+            expected = compute_features(data_points)
+            for name in FEATURE_NAMES:
+                self.assertAlmostEqual(features[name], expected[name], places=9, msg=f"user {user_id} {name}")
+            self.assertEqual(latest.id, data_points[0].id)
+            self.assertEqual(latest.timestamp, data_points[0].timestamp)
+
+    async def test_no_recent_readings(self):
+        self.assertEqual(await fetch_batch_features(self.db, self.now + timedelta(minutes=1)), {})
+
+    @classmethod
+    def tearDownClass(cls):
+        compute_pool.shutdown()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+from utils.compiled_forest import compile_forest, verify, CHUNK_ROWS, ACCUMULATE_MAX_ROWS
+from utils.model_pipeline import fuse, save_pipeline, load_pipeline
+
+def training_data(rows=400, features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, features))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int) + (X[:, 2] > 1).astype(int)
+    return X, y
+
+class TestCompiledForest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.X, cls.y = training_data()
+        cls.forest = RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0).fit(cls.X, cls.y)
+        cls.compiled = compile_forest(cls.forest)
+        rng = np.random.default_rng(1)
+        cls.inputs = rng.normal(size=(300, 6))
+
+    def assert_identical(self, model, compiled, X):
+        np.testing.assert_array_equal(compiled.predict_proba(X), model.predict_proba(X))
+        np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+
+    def test_identical_on_fresh_inputs(self):
+        self.assert_identical(self.forest, self.compiled, self.inputs)
+        self.assertTrue(verify(self.forest, self.compiled, self.inputs)["ok"])
+
+    def test_identical_on_both_sum_paths_and_chunks(self):
+        for rows in [1, ACCUMULATE_MAX_ROWS, ACCUMULATE_MAX_ROWS + 1, CHUNK_ROWS + 3]:
+            with self.subTest(rows=rows):
+                X = np.random.default_rng(rows).normal(size=(rows, 6))
+                self.assert_identical(self.forest, self.compiled, X)
+
+    def test_identical_outside_the_training_range(self):
+        # Far beyond every threshold: the extreme leaves, rarely or never reached in training
+        X = np.array([[1e6] * 6, [-1e6] * 6, [1e6, -1e6, 1e6, -1e6, 0.0, 0.0], [0.0] * 6])
+        self.assert_identical(self.forest, self.compiled, X)
+
+    def test_identical_with_nan(self):
+        X = self.inputs[:50].copy()
+        X[::2, 0] = np.nan
+        X[1::3, 2] = np.nan
+        X[5] = np.nan
+        self.assert_identical(self.forest, self.compiled, X)
+
+    def test_identical_when_trained_with_nan(self):
+        X = self.X.copy()
+        X[::7, 1] = np.nan
+        forest = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, self.y)
+        inputs = self.inputs[:80].copy()
+        inputs[::4, 1] = np.nan
+        self.assert_identical(forest, compile_forest(forest), inputs)
+
+    def test_single_tree(self):
+        tree = DecisionTreeClassifier(random_state=0).fit(self.X, self.y)
+        self.assert_identical(tree, compile_forest(tree), self.inputs)
+
+    def test_rejects_wrong_shape(self):
+        with self.assertRaises(ValueError):
+            self.compiled.predict(np.zeros((2, 5)))
+
+    def test_pipeline_round_trip_memory_mapped(self):
+        pipeline = fuse(self.forest)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pipeline.joblib")
+            save_pipeline(pipeline, path)
+            loaded = load_pipeline(path, mmap=True)
+            np.testing.assert_array_equal(loaded.predict_proba(self.inputs), self.forest.predict_proba(self.inputs))
+
+if __name__ == "__main__":
+    unittest.main()
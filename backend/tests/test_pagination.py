@@ -0,0 +1,97 @@
+import base64
+import json
+import unittest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+from database.models import Base, User, SensorData
+from utils.pagination import encode_cursor, decode_cursor, keyset_page, split_page
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+class TestCursor(unittest.TestCase):
+    def test_round_trip(self):
+        timestamp = datetime(2025, 3, 1, 12, 30, 15, 123456)
+        cursor = encode_cursor(timestamp, 42)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor), (timestamp, 42))
+
+    def test_round_trip_keeps_timezone(self):
+        timestamp = datetime.fromisoformat("2025-03-01T12:30:15+00:00")
+        self.assertEqual(decode_cursor(encode_cursor(timestamp, 7)), (timestamp, 7))
+
+    def assert_rejected(self, cursor):
+        with self.assertRaises(HTTPException) as raised:
+            decode_cursor(cursor)
+        self.assertEqual(raised.exception.status_code, 400)
+
+    def test_rejects_invalid_base64(self):
+        for cursor in ["!!!", "a", "%%%%", "abc$def"]:
+            self.assert_rejected(cursor)
+
+    def test_rejects_tampered_payload(self):
+        valid = encode_cursor(datetime(2025, 3, 1), 42)
+        # Not JSON once a character is swapped
+        self.assert_rejected(valid[:-3] + "___")
+        for value in [
+            {"timestamp": "2025-03-01T00:00:00", "id": 1},
+            ["2025-03-01T00:00:00"],
+            ["2025-03-01T00:00:00", 1, 2],
+            ["not a date", 1],
+            [1700000000, 1],
+            ["2025-03-01T00:00:00", "1"],
+            ["2025-03-01T00:00:00", 1.5],
+            ["2025-03-01T00:00:00", True],
+            ["2025-03-01T00:00:00", None],
+            "2025-03-01T00:00:00",
+        ]:
+            with self.subTest(value=value):
+                self.assert_rejected(raw_cursor(value))
+
+class TestKeysetPages(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine, tables=[User.__table__, SensorData.__table__])
+        self.session = Session(self.engine)
+        self.session.add(User(id=1, first_name="a", last_name="b", email="a@b.c", hashed_password="x"))
+        start = datetime(2025, 1, 1)
+        # Groups of readings sharing a timestamp, so pages split inside a tie
+        for i in range(1, 24):
+            self.session.add(SensorData(
+                id=i, user_id=1, timestamp=start + timedelta(seconds=i // 4),
+                gsr=1.0, heart_rate=80.0, temperature=36.5
+            ))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def pages(self, limit):
+        cursor, pages = None, []
+        while True:
+            query = keyset_page(select(SensorData.id, SensorData.timestamp), SensorData, cursor, limit)
+            rows, cursor = split_page(self.session.execute(query).all(), limit)
+            pages.append([row.id for row in rows])
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_every_row_once_newest_first(self):
+        for limit in [1, 3, 4, 5, 23, 50]:
+            with self.subTest(limit=limit):
+                pages = self.pages(limit)
+                ids = [row_id for page in pages for row_id in page]
+                # Newest timestamp first, higher id first within a tie
+                self.assertEqual(ids, list(range(23, 0, -1)))
+                self.assertTrue(all(len(page) == limit for page in pages[:-1]))
+                self.assertLessEqual(len(pages[-1]), limit)
+
+    def test_last_page_has_no_cursor(self):
+        rows, cursor = split_page(list(range(3)), 3)
+        self.assertEqual((rows, cursor), ([0, 1, 2], None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from utils.prediction_cache import LatestPredictionCache
+
+START = datetime(2025, 1, 1)
+
+class TestPredictionCacheBounds(unittest.TestCase):
+    def setUp(self):
+        self.clock = 1000.0
+        patcher = mock.patch("utils.prediction_cache.time.monotonic", lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_put_evicts_expired_entries(self):
+        cache = LatestPredictionCache(ttl=30, max_entries=100)
+        for user_id in range(10):
+            cache.put(user_id, 1, START)
+        self.clock += 20
+        cache.put(10, 2, START)
+        self.clock += 15
+        cache.put(11, 0, START)
+        # Users 0-9 were stored 35s ago; 10 and 11 are still fresh
+        self.assertEqual(sorted(cache.entries), [10, 11])
+        self.assertEqual(sorted(cache.stored_at), [10, 11])
+        self.assertEqual(cache.metrics()["expired"], 10)
+
+    def test_refreshed_entry_is_kept(self):
+        cache = LatestPredictionCache(ttl=30, max_entries=100)
+        cache.put(1, 1, START)
+        cache.put(2, 1, START)
+        self.clock += 20
+        cache.put(1, 2, START + timedelta(seconds=20))
+        self.clock += 15
+        cache.put(3, 0, START)
+        self.assertEqual(sorted(cache.entries), [1, 3])
+        self.assertEqual(cache.entries[1][0], 2)
+
+    def test_size_is_capped_without_ttl(self):
+        cache = LatestPredictionCache(ttl=0, max_entries=3)
+        for user_id in range(5):
+            cache.put(user_id, 1, START)
+            self.clock += 1
+        cache.put(2, 0, START + timedelta(seconds=1))
+        cache.put(5, 1, START)
+        # Least recently stored go first; storing user 2 again moved it to the back
+        self.assertEqual(sorted(cache.entries), [2, 4, 5])
+        self.assertEqual(cache.metrics()["evicted"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
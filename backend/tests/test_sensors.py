@@ -0,0 +1,32 @@
+import json
+import unittest
+from routes_api.sensors import _parse_ws_reading
+
+VALID = {"gsr": 1.5, "heart_rate": 70, "temperature": 36.5}
+
+class TestWebSocketReading(unittest.TestCase):
+    def test_user_id_comes_from_the_connection(self):
+        reading = _parse_ws_reading(json.dumps({**VALID, "user_id": 9}), 3)
+        self.assertEqual(reading.user_id, 3)
+        self.assertEqual((reading.gsr, reading.heart_rate, reading.temperature), (1.5, 70.0, 36.5))
+
+    def test_invalid_readings_are_rejected(self):
+        payloads = [
+            "[1, 2]",
+            "null",
+            json.dumps({"heart_rate": 70, "temperature": 36.5}),
+            json.dumps({**VALID, "gsr": None}),
+            json.dumps({**VALID, "gsr": "high"}),
+            json.dumps({**VALID, "temperature": float("nan")}),
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                with self.assertRaises(ValueError):
+                    _parse_ws_reading(payload, 3)
+
+    def test_malformed_json(self):
+        with self.assertRaises(json.JSONDecodeError):
+            _parse_ws_reading("{gsr", 3)
+
+if __name__ == "__main__":
+    unittest.main()
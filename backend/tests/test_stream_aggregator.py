@@ -0,0 +1,91 @@
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+from utils.stream_aggregator import RollingWindow, StreamAggregator, Reading, _epoch
+
+def reading(i, start, gsr, hr=80.0, temp=36.5, seconds=None):
+    return Reading(i, start + timedelta(seconds=i if seconds is None else seconds), gsr, hr, temp)
+
+class TestRollingWindow(unittest.TestCase):
+    def assert_matches_recomputed(self, window):
+        gsr = np.array([r.gsr for _, _, r in window.entries])
+        hr = np.array([r.heart_rate for _, _, r in window.entries])
+        temp = np.array([r.temperature for _, _, r in window.entries])
+        features = window.features()
+        self.assertEqual(window.count, len(gsr))
+        self.assertEqual(features["gsr_max"], gsr.max())
+        self.assertEqual(features["gsr_min"], gsr.min())
+        scale = max(1.0, np.abs(gsr).max())
+        self.assertAlmostEqual(features["gsr_mean"] / scale, gsr.mean() / scale, places=9)
+        self.assertAlmostEqual(features["gsr_sd"] / scale, gsr.std() / scale, places=6)
+        self.assertAlmostEqual(features["hrate_mean"], hr.mean(), places=9)
+        self.assertAlmostEqual(features["temp_avg"], temp.mean(), places=9)
+
+    def test_welford_add_remove_does_not_drift(self):
+        rng = np.random.default_rng(0)
+        window = RollingWindow(window_seconds=300, max_entries=100)
+        start = datetime(2025, 1, 1)
+        # Large offset with small spread is the worst case for running variance
+        for i in range(50_000):
+            window.add(reading(i, start, 1000.0 + rng.normal(0, 2), rng.normal(90, 5), rng.normal(36.5, 0.3)))
+            if i % 997 == 0:
+                self.assert_matches_recomputed(window)
+        self.assert_matches_recomputed(window)
+
+    def test_time_eviction_matches_recomputed(self):
+        rng = np.random.default_rng(1)
+        window = RollingWindow(window_seconds=60, max_entries=1000)
+        start = datetime(2025, 1, 1)
+        for i in range(5_000):
+            window.add(reading(i, start, rng.uniform(0, 700)))
+            window.evict(_epoch(start + timedelta(seconds=i)))
+            if i % 250 == 0:
+                self.assert_matches_recomputed(window)
+        self.assertEqual(window.count, 61)
+
+    def test_evicting_everything_resets(self):
+        window = RollingWindow(window_seconds=10)
+        start = datetime(2025, 1, 1)
+        for i in range(5):
+            window.add(reading(i, start, float(i)))
+        window.evict(_epoch(start + timedelta(seconds=100)))
+        self.assertIsNone(window.features())
+        window.add(reading(200, start, 3.0))
+        self.assert_matches_recomputed(window)
+
+    def test_out_of_order_reading_is_dropped(self):
+        window = RollingWindow(window_seconds=300)
+        start = datetime(2025, 1, 1)
+        self.assertTrue(window.add(reading(0, start, 1.0, seconds=10)))
+        self.assertTrue(window.add(reading(1, start, 2.0, seconds=20)))
+        self.assertFalse(window.add(reading(2, start, 50.0, seconds=15)))
+        self.assertEqual(window.latest().id, 1)
+        self.assertEqual(window.features()["gsr_max"], 2.0)
+        self.assert_matches_recomputed(window)
+
+    def test_invalid_reading_leaves_window_unchanged(self):
+        window = RollingWindow(window_seconds=300)
+        start = datetime(2025, 1, 1)
+        window.add(reading(0, start, 1.0))
+        for gsr, hr, temp in ((None, 70.0, 36.5), (2.0, None, 36.5), (2.0, 70.0, float("nan")), (2.0, float("inf"), 36.5), ("2", 70.0, 36.5)):
+            with self.assertRaises(ValueError):
+                window.add(reading(1, start, gsr, hr, temp))
+        self.assertEqual(window.count, 1)
+        self.assertTrue(window.add(reading(2, start, 3.0)))
+        self.assertEqual(window.features()["gsr_max"], 3.0)
+        self.assert_matches_recomputed(window)
+
+class TestStreamAggregator(unittest.TestCase):
+    def test_invalid_reading_does_not_break_the_user(self):
+        aggregator = StreamAggregator()
+        now = datetime.utcnow()
+        self.assertFalse(aggregator.add(1, Reading(1, now, None, 70.0, 36.5)))
+        self.assertEqual(aggregator.invalid, 1)
+        self.assertTrue(aggregator.add(1, Reading(2, now, 5.0, 70.0, 36.5)))
+        self.assertTrue(aggregator.add(1, Reading(3, now + timedelta(seconds=1), np.float32(6.0), 72.0, 36.6)))
+        features = aggregator.features(1, now + timedelta(seconds=1))
+        self.assertEqual(features["gsr_max"], 6.0)
+        self.assertEqual(features["hrate_mean"], 71.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import json
+import struct
+import unittest
+from datetime import datetime, timezone
+from utils.ws_protocol import (
+    encode_sensor_frame, encode_sensor_frames, decode_sensor_frame, sensor_record, HEADER, READING_SIZE, FRAME_SENSOR
+)
+from utils.websocket_manager import Subscriber, Outgoing
+
+START = 1_735_689_600.0  # 2025-01-01T00:00:00Z
+
+def record(offset, heart_rate=80.5, temperature=36.5, gsr=1.25, stress_level=1):
+    return (START + offset, heart_rate, temperature, gsr, stress_level)
+
+class TestSensorFrame(unittest.TestCase):
+    def assert_round_trip(self, records, seq=7):
+        frame = encode_sensor_frame(records, seq)
+        self.assertEqual(len(frame), HEADER.size + len(records) * READING_SIZE)
+        decoded_seq, readings = decode_sensor_frame(frame)
+        self.assertEqual(decoded_seq, seq)
+        self.assertEqual(len(readings), len(records))
+        for (timestamp, heart_rate, temperature, gsr, stress_level), reading in zip(records, readings):
+            # Millisecond resolution, with no drift along the frame
+            self.assertAlmostEqual(reading["timestamp"], timestamp, delta=0.0005 + 1e-9)
+            for value, decoded in [(heart_rate, reading["heart_rate"]), (temperature, reading["temperature"]), (gsr, reading["gsr"])]:
+                if value is None:
+                    self.assertIsNone(decoded)
+                else:
+                    self.assertAlmostEqual(decoded, value, places=5)
+            self.assertEqual(reading["stress_level"], stress_level)
+        return readings
+
+    def test_in_order(self):
+        self.assert_round_trip([record(i * 0.25) for i in range(40)])
+
+    def test_out_of_order_keeps_order_and_timestamps(self):
+        offsets = [0.0, 2.0, 1.0, 3.5, -4.0, 3.0, 10.0]
+        readings = self.assert_round_trip([record(offset) for offset in offsets])
+        self.assertEqual([round(r["timestamp"] - START, 3) for r in readings], offsets)
+
+    def test_sub_millisecond_steps_do_not_drift(self):
+        records = [record(i * 0.0004) for i in range(1000)]
+        self.assert_round_trip(records)
+
+    def test_missing_channels_and_stress(self):
+        self.assert_round_trip([record(0, None, None, None, None), record(1, 70.0, None, 0.5, 2)])
+
+    def test_in_order_bytes_unchanged(self):
+        # In-order deltas encode exactly as the original unsigned layout did
+        frame = encode_sensor_frame([record(0), record(1.5)], 3)
+        delta = struct.unpack_from("<I", frame, HEADER.size + READING_SIZE)[0]
+        self.assertEqual(delta, 1500)
+
+    def test_rejects_bad_frames(self):
+        with self.assertRaises(ValueError):
+            encode_sensor_frame([])
+        with self.assertRaises(ValueError):
+            encode_sensor_frame([record(0), record(30 * 86400)])
+        frame = encode_sensor_frame([record(0), record(1)])
+        with self.assertRaises(ValueError):
+            decode_sensor_frame(frame[:-1])
+        with self.assertRaises(ValueError):
+            decode_sensor_frame(bytes([FRAME_SENSOR + 1]) + frame[1:])
+
+    def test_sensor_record_from_broadcast_json(self):
+        message = json.dumps({
+            "type": "sensor_data", "timestamp": "2025-01-01T00:00:01",
+            "heart_rate": 80.0, "temperature": 36.6, "gsr": None, "stress_level": None
+        })
+        timestamp, heart_rate, temperature, gsr, stress_level = sensor_record(message)
+        self.assertEqual(timestamp, START + 1)
+        self.assertEqual((heart_rate, temperature, gsr, stress_level), (80.0, 36.6, None, None))
+        self.assertIsNone(sensor_record(json.dumps({"type": "ping"})))
+        self.assertIsNone(sensor_record("not json"))
+
+class TestWideGaps(unittest.IsolatedAsyncioTestCase):
+    MONTH = 30 * 86400
+
+    def decode_all(self, frames):
+        decoded = [decode_sensor_frame(frame) for frame in frames]
+        return [seq for seq, _ in decoded], [r["timestamp"] - START for _, readings in decoded for r in readings]
+
+    def test_frames_split_at_gaps(self):
+        offsets = [0, 1, self.MONTH, self.MONTH + 1, 0.5]
+        frames = encode_sensor_frames([record(offset) for offset in offsets], [1, 2, 3, 4, 5])
+        seqs, timestamps = self.decode_all(frames)
+        self.assertEqual(seqs, [2, 4, 5])
+        self.assertEqual([round(t, 3) for t in timestamps], offsets)
+
+    def sensor_message(self, offset, seq):
+        timestamp = datetime.fromtimestamp(START + offset, timezone.utc).replace(tzinfo=None)
+        return Outgoing(json.dumps({"type": "sensor_data", "timestamp": timestamp.isoformat(), "gsr": 1.0}), True, seq)
+
+    async def test_batch_flush_and_replay_survive_gaps(self):
+        subscriber = Subscriber(None, "1", delivery="batch", interval_ms=60000, binary=True)
+        for seq, offset in enumerate([0, self.MONTH, self.MONTH + 2], start=1):
+            subscriber.offer(self.sensor_message(offset, seq))
+        subscriber.flush_handle.cancel()
+        subscriber.flush()
+        self.assertEqual(subscriber.pending, [])
+        frames = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+        self.assertEqual(self.decode_all(frames), ([1, 3], [0, self.MONTH, self.MONTH + 2]))
+
+        subscriber.replay([self.sensor_message(0, 4), self.sensor_message(self.MONTH, 5)])
+        frames = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+        self.assertEqual(self.decode_all(frames), ([4, 5], [0, self.MONTH]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+'''
+Index of users with new sensor readings, so the scheduler visits active wearers only.
+The ingestion buffer marks users once their readings have committed (mark_rows is a commit
+listener, see main.py), so the scheduler never finds a user due before it can read their rows.
+The scheduler asks for the users whose readings changed since the watermark it last
+processed for them, then advances it.
+Cost per tick scales with devices active in the window, not with the number of signups.
+Until the index has watched a full window (after a restart), or when several API
+processes ingest (ACTIVE_USERS_SOURCE=db, or auto with a cross-process WS_BACKPLANE), the
+active set comes from one grouped query over sensor_data rows in the window instead,
+with the newest row id as the watermark.
+Users idle for longer than the window are dropped, so memory stays bounded too.
+'''
+import logging
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from config import ACTIVE_USERS_SOURCE, WS_BACKPLANE
+from database.models import SensorData
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("active_users")
+
+ACTIVE_USERS_SOURCES = ("auto", "memory", "db")
+
+class ActiveUserIndex:
+    def __init__(self, source: str = ACTIVE_USERS_SOURCE, backplane: str = WS_BACKPLANE):
+        if source not in ACTIVE_USERS_SOURCES:
+            raise ValueError(f"Unknown active users source '{source}', expected one of {ACTIVE_USERS_SOURCES}")
+        if source == "auto" and backplane != "inprocess":
+            # Other workers ingest readings this process never sees
+            source = "db"
+        self.source = source
+        # Readings older than this were ingested before the index was watching
+        self.tracking_since = datetime.utcnow()
+        # user_id -> newest reading timestamp
+        self.last_seen: Dict[int, datetime] = {}
+        # user_id -> change counter, bumped on every mark; the in-memory watermark token
+        self.changes: Dict[int, int] = {}
+        # user_id -> token of the newest data processed (change counter, or sensor_data id from the DB)
+        self.watermarks: Dict[int, int] = {}
+        self.watermark_source = None
+        self.marks = 0
+        self.db_lookups = 0
+        self.last_due = 0
+
+    def mark(self, user_id: int, timestamp: datetime):
+        """Record a new reading for user_id."""
+        previous = self.last_seen.get(user_id)
+        if previous is None or timestamp > previous:
+            self.last_seen[user_id] = timestamp
+        self.changes[user_id] = self.changes.get(user_id, 0) + 1
+        self.marks += 1
+
+    def mark_rows(self, rows: List[dict]):
+        """Record committed sensor_data rows: one mark per user, at their newest timestamp."""
+        newest: Dict[int, datetime] = {}
+        for row in rows:
+            user_id, timestamp = row["user_id"], row["timestamp"]
+            if user_id not in newest or timestamp > newest[user_id]:
+                newest[user_id] = timestamp
+        for user_id, timestamp in newest.items():
+            self.mark(user_id, timestamp)
+
+    def _uses_db(self, since: datetime) -> bool:
+        if self.source == "auto":
+            return since < self.tracking_since
+        return self.source == "db"
+
+    def _due_memory(self, since: datetime) -> Dict[int, int]:
+        due = {}
+        for user_id, seen in list(self.last_seen.items()):
+            if seen < since:
+                # Idle for a whole window: nothing left to process
+                del self.last_seen[user_id]
+                self.changes.pop(user_id, None)
+                self.watermarks.pop(user_id, None)
+                continue
+            token = self.changes[user_id]
+            if token > self.watermarks.get(user_id, 0):
+                due[user_id] = token
+        return due
+
+    async def _due_db(self, db: AsyncSession, since: datetime) -> Dict[int, int]:
+        self.db_lookups += 1
+        result = await db.execute(
+            select(SensorData.user_id, func.max(SensorData.id))
+            .where(SensorData.timestamp >= since)
+            .group_by(SensorData.user_id)
+        )
+        rows = result.all()
+        active = {user_id for user_id, _ in rows}
+        for user_id in [u for u in self.watermarks if u not in active]:
+            del self.watermarks[user_id]
+        return {
+            user_id: newest_id for user_id, newest_id in rows
+            if newest_id > self.watermarks.get(user_id, 0)
+        }
+
+    async def due(self, db: AsyncSession, since: datetime) -> Dict[int, int]:
+        """Users with readings since `since` that are newer than their watermark.
+
+        Returns:
+            dict: user_id -> token to pass to processed() once the user is handled.
+        """
+        source = "db" if self._uses_db(since) else "memory"
+        if source != self.watermark_source:
+            # Tokens from the two sources are not comparable; at most one extra pass per user
+            self.watermarks.clear()
+            self.watermark_source = source
+        if source == "db":
+            due = await self._due_db(db, since)
+        else:
+            due = self._due_memory(since)
+        self.last_due = len(due)
+        return due
+
+    def processed(self, user_id: int, token: int):
+        """Advance user_id's watermark to the token due() returned for it."""
+        if token > self.watermarks.get(user_id, 0):
+            self.watermarks[user_id] = token
+
+    def metrics(self) -> dict:
+        return {
+            "source": self.source,
+            "watermark_source": self.watermark_source,
+            "tracked_users": len(self.last_seen),
+            "last_due": self.last_due,
+            "marks": self.marks,
+            "db_lookups": self.db_lookups
+        }
+
+# Singleton instance
+active_users = ActiveUserIndex()
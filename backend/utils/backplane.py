@@ -0,0 +1,235 @@
+'''
+Pub/sub backplane behind WebSocketManager.broadcast_user.
+Every published (user_id, message) reaches the local subscribers of every process,
+so the API can run with several uvicorn workers.
+InProcessBackplane: single process, delivers directly.
+PostgresBackplane: LISTEN/NOTIFY on the application database.
+RedisBackplane: Redis PUBLISH/SUBSCRIBE; FakeRedis stands in for a server in tests.
+'''
+import logging
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Awaitable, Callable, Optional, Set
+from sqlalchemy.engine import make_url
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("backplane")
+
+CHANNEL = "auticare_ws"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+PG_NOTIFY_MAX_BYTES = 7900
+RECONNECT_DELAY = 5.0
+
+Deliver = Callable[[str, str, bool], Awaitable[None]]
+
+def encode(user_id: str, message: str, coalesce: bool) -> str:
+    return json.dumps({"user_id": user_id, "message": message, "coalesce": coalesce})
+
+def decode(payload):
+    data = json.loads(payload)
+    return data["user_id"], data["message"], data.get("coalesce", False)
+
+class Backplane(ABC):
+    """Fans published messages out to `deliver` in every process."""
+
+    def __init__(self):
+        self.deliver: Optional[Deliver] = None
+        self.published = 0
+        self.received = 0
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, user_id: str, message: str, coalesce: bool = False):
+        """Deliver (user_id, message) to the local subscribers of every process."""
+
+    async def _receive(self, payload):
+        try:
+            user_id, message, coalesce = decode(payload)
+        except Exception as e:
+            logger.error(f"Malformed backplane payload: {str(e)}")
+            return
+        self.received += 1
+        await self.deliver(user_id, message, coalesce)
+
+    def metrics(self) -> dict:
+        return {"backend": type(self).__name__, "published": self.published, "received": self.received}
+
+class InProcessBackplane(Backplane):
+    async def publish(self, user_id: str, message: str, coalesce: bool = False):
+        self.published += 1
+        self.received += 1
+        await self.deliver(user_id, message, coalesce)
+
+class PostgresBackplane(Backplane):
+    """LISTEN/NOTIFY over dedicated asyncpg connections (one listening, one publishing)."""
+
+    def __init__(self, database_url: str, channel: str = CHANNEL):
+        super().__init__()
+        self.dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self.listen_conn = None
+        self.publish_conn = None
+        self.publish_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+        # Deliveries in flight; the loop only keeps weak references to tasks
+        self._receiving: Set[asyncio.Task] = set()
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        await self._connect()
+        self._watch_task = asyncio.create_task(self._watch())
+        logger.info(f"Postgres backplane listening on channel {self.channel}")
+
+    async def _connect(self):
+        import asyncpg
+        self.listen_conn = await asyncpg.connect(self.dsn)
+        await self.listen_conn.add_listener(self.channel, self._on_notify)
+        self.publish_conn = await asyncpg.connect(self.dsn)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        task = asyncio.create_task(self._receive(payload))
+        self._receiving.add(task)
+        task.add_done_callback(self._receiving.discard)
+
+    async def _watch(self):
+        """Reconnect if either connection drops."""
+        while True:
+            await asyncio.sleep(RECONNECT_DELAY)
+            if not (self.listen_conn.is_closed() or self.publish_conn.is_closed()):
+                continue
+            logger.warning("Postgres backplane connection lost, reconnecting")
+            try:
+                await self._close_connections()
+                await self._connect()
+            except Exception as e:
+                logger.error(f"Postgres backplane reconnect failed: {str(e)}")
+
+    async def _close_connections(self):
+        for conn in (self.listen_conn, self.publish_conn):
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+        await self._close_connections()
+
+    async def publish(self, user_id: str, message: str, coalesce: bool = False):
+        payload = encode(user_id, message, coalesce)
+        if len(payload.encode()) > PG_NOTIFY_MAX_BYTES:
+            logger.warning(f"Message for user_id {user_id} too large for NOTIFY, delivering locally only")
+            await self.deliver(user_id, message, coalesce)
+            return
+        async with self.publish_lock:
+            await self.publish_conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+        self.published += 1
+
+class RedisBackplane(Backplane):
+    """Redis PUBLISH/SUBSCRIBE. Pass `client` (e.g. FakeRedis) to skip connecting to `url`."""
+
+    def __init__(self, url: Optional[str] = None, channel: str = CHANNEL, client=None):
+        super().__init__()
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("WS_BACKPLANE=redis requires the redis package")
+            client = aioredis.from_url(url)
+        self.client = client
+        self.channel = channel
+        self.pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        self._reader = asyncio.create_task(self._read())
+        logger.info(f"Redis backplane subscribed to channel {self.channel}")
+
+    async def _read(self):
+        while True:
+            try:
+                async for item in self.pubsub.listen():
+                    if item.get("type") == "message":
+                        await self._receive(item["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis backplane read error: {str(e)}")
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def stop(self):
+        if self._reader:
+            self._reader.cancel()
+        if self.pubsub is not None:
+            await self.pubsub.unsubscribe(self.channel)
+            await self.pubsub.aclose()
+
+    async def publish(self, user_id: str, message: str, coalesce: bool = False):
+        await self.client.publish(self.channel, encode(user_id, message, coalesce))
+        self.published += 1
+
+class FakeRedis:
+    """In-memory stand-in for redis.asyncio.Redis pub/sub.
+
+    Instances sharing a `broker` behave like clients of one server, so several
+    RedisBackplanes (one per simulated process) can be wired together in tests.
+    """
+
+    def __init__(self, broker: Optional[dict] = None):
+        self.broker = broker if broker is not None else defaultdict(set)
+
+    def pubsub(self):
+        return FakePubSub(self.broker)
+
+    async def publish(self, channel: str, data: str) -> int:
+        subscribers = list(self.broker.get(channel, ()))
+        for pubsub in subscribers:
+            pubsub.queue.put_nowait({"type": "message", "channel": channel, "data": data})
+        return len(subscribers)
+
+class FakePubSub:
+    def __init__(self, broker: dict):
+        self.broker = broker
+        self.channels = set()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        for channel in channels:
+            self.channels.add(channel)
+            self.broker[channel].add(self)
+            self.queue.put_nowait({"type": "subscribe", "channel": channel, "data": 1})
+
+    async def unsubscribe(self, *channels):
+        for channel in channels or list(self.channels):
+            self.channels.discard(channel)
+            self.broker[channel].discard(self)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self):
+        await self.unsubscribe()
+
+def create_backplane(kind: str, database_url: Optional[str] = None, redis_url: Optional[str] = None) -> Backplane:
+    if kind == "inprocess":
+        return InProcessBackplane()
+    if kind == "postgres":
+        return PostgresBackplane(database_url)
+    if kind == "redis":
+        return RedisBackplane(redis_url)
+    if kind == "fakeredis":
+        return RedisBackplane(client=FakeRedis())
+    raise ValueError(f"Unknown WS_BACKPLANE: {kind}")
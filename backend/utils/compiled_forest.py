@@ -0,0 +1,145 @@
+'''
+Array-backed evaluator for a fitted RandomForestClassifier (or a single DecisionTreeClassifier).
+compile_forest flattens every tree into contiguous NumPy arrays shared by all trees:
+feature, threshold, left, right and the normalised leaf class probabilities.
+Leaves point to themselves, so a batch walks all trees at once for max_depth steps
+with no per-node Python work.
+Matches sklearn exactly: X is cast to float32 as sklearn does, nodes split on x <= threshold,
+NaN follows each node's missing_go_to_left, and per-tree probabilities are summed in tree
+order before dividing by the tree count.
+CompiledForest has predict/predict_proba/classes_, so it drops in wherever the model is used.
+'''
+from typing import Optional
+import numpy as np
+
+# Rows evaluated per chunk; bounds the (rows, trees) node matrix
+CHUNK_ROWS = 4096
+# Below this many rows the per-tree sum is one add.accumulate over (rows, trees, classes);
+# above it a loop over trees is cheaper. Both add in tree order.
+ACCUMULATE_MAX_ROWS = 64
+
+class CompiledForest:
+    # Artifacts compiled before NaN routing was recorded send NaN right
+    missing_left = None
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes, n_features, missing_left=None):
+        # feature/threshold/left/right/value are indexed by global node id; roots[t] is tree t's first node
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # children[2 * node] is the left child, children[2 * node + 1] the right one
+        self.children = np.ascontiguousarray(np.stack([left, right], axis=1).ravel().astype(np.intp))
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        # missing_left[node]: a NaN feature value takes the left child
+        self.missing_left = missing_left
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node index reached in each tree, shape (n_samples, n_trees)."""
+        X = self._validate(X)
+        rows = np.arange(X.shape[0], dtype=np.intp)[:, np.newaxis]
+        nodes = np.repeat(self.roots[np.newaxis, :].astype(np.intp), X.shape[0], axis=0)
+        has_nan = self.missing_left is not None and np.isnan(X).any()
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_right = ~(x <= self.threshold[nodes])
+            if has_nan:
+                go_right = np.where(np.isnan(x), ~self.missing_left[nodes], go_right)
+            nodes = self.children[2 * nodes + go_right]
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = self._validate(X)
+        proba = np.empty((X.shape[0], len(self.classes_)), dtype=np.float64)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            leaves = self.apply(X[start:start + CHUNK_ROWS])
+            # Sum strictly in tree order, like sklearn's per-tree +=, so results are bit-identical
+            if leaves.shape[0] <= ACCUMULATE_MAX_ROWS:
+                summed = np.add.accumulate(self.value[leaves], axis=1)[:, -1, :]
+            else:
+                summed = np.zeros((leaves.shape[0], len(self.classes_)), dtype=np.float64)
+                for tree in range(self.n_trees):
+                    summed += self.value[leaves[:, tree]]
+            proba[start:start + CHUNK_ROWS] = summed / self.n_trees
+        return proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def _validate(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected shape (n_samples, {self.n_features_in_}), got {X.shape}")
+        return X
+
+def compile_forest(model) -> CompiledForest:
+    """Flatten a fitted single-output RandomForestClassifier or DecisionTreeClassifier."""
+    estimators = getattr(model, "estimators_", None) or [model]
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("Only single-output classifiers can be compiled")
+
+    features, thresholds, lefts, rights, values, roots, missing = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left < 0
+        own = np.arange(offset, offset + n, dtype=np.int32)
+
+        # Leaves loop back to themselves and compare against any valid feature
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold).astype(np.float64))
+        lefts.append(np.where(is_leaf, own, tree.children_left + offset).astype(np.int32))
+        rights.append(np.where(is_leaf, own, tree.children_right + offset).astype(np.int32))
+        # Trees from sklearn before 1.3 have no NaN routing; NaN then goes right, as here
+        missing_go_to_left = getattr(tree, "missing_go_to_left", None)
+        missing.append(np.zeros(n, dtype=bool) if missing_go_to_left is None else np.asarray(missing_go_to_left, dtype=bool))
+
+        # Same normalisation as DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :len(model.classes_)].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer)
+
+        roots.append(offset)
+        max_depth = max(max_depth, tree.max_depth)
+        offset += n
+
+    return CompiledForest(
+        feature=np.ascontiguousarray(np.concatenate(features)),
+        threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+        left=np.ascontiguousarray(np.concatenate(lefts)),
+        right=np.ascontiguousarray(np.concatenate(rights)),
+        value=np.ascontiguousarray(np.concatenate(values)),
+        roots=np.asarray(roots, dtype=np.int32),
+        max_depth=max_depth,
+        classes=np.asarray(model.classes_),
+        n_features=model.n_features_in_,
+        missing_left=np.ascontiguousarray(np.concatenate(missing))
+    )
+
+def verify(model, forest: CompiledForest, X, proba_tolerance: Optional[float] = 0.0) -> dict:
+    """Compare forest against model on X; labels must be identical."""
+    expected = model.predict(X)
+    actual = forest.predict(X)
+    diff = float(np.max(np.abs(model.predict_proba(X) - forest.predict_proba(X)))) if len(X) else 0.0
+    mismatches = int(np.sum(expected != actual))
+    return {
+        "rows": len(X),
+        "label_mismatches": mismatches,
+        "max_proba_diff": diff,
+        "ok": mismatches == 0 and (proba_tolerance is None or diff <= proba_tolerance)
+    }
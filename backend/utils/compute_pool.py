@@ -0,0 +1,168 @@
+'''
+Runs CPU-bound feature extraction and inference off the event loop.
+COMPUTE_POOL=thread shares the loaded model with a thread pool; COMPUTE_POOL=process runs a
+spawned process pool, free of the GIL, whose workers memory-map the registry's archived artifact.
+Process workers cache the model by version: a hot reload only sends the new (version, path)
+and each worker maps it on first use. warm() pre-loads it in every worker before it is needed.
+Large batches are split into chunks of COMPUTE_POOL_BATCH_USERS users scored concurrently.
+A dead worker process is replaced on the next call instead of failing every later tick.
+'''
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from config import COMPUTE_POOL, COMPUTE_POOL_WORKERS, COMPUTE_POOL_BATCH_USERS
+from utils.data_processing import compute_features_arrays, compute_features_batch, features_matrix, FEATURE_NAMES
+from utils.model_pipeline import load_pipeline
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("compute_pool")
+
+POOL_KINDS = ("thread", "process")
+
+# Per-process model cache of a process worker: version -> model
+_worker_models = {}
+
+def _init_worker():
+    # Ctrl-C is handled by the server, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _resolve(model_ref):
+    """The model itself (thread pool), or a (version, artifact path) to load once per process."""
+    if not isinstance(model_ref, tuple):
+        return model_ref
+    version, artifact = model_ref
+    if version not in _worker_models:
+        _worker_models.clear()
+        # Always the registry's fused copy: a worker never fuses with SCALER_PATH itself
+        _worker_models[version] = load_pipeline(artifact, mmap=True, bare=False)
+    return _worker_models[version]
+
+def _warm(model_ref) -> int:
+    _resolve(model_ref).predict(np.zeros((1, len(FEATURE_NAMES))))
+    return os.getpid()
+
+def _predict(model_ref, X) -> np.ndarray:
+    # Plain model errors only: they must pickle back from a process worker
+    return _resolve(model_ref).predict(X)
+
+class ComputePool:
+    def __init__(self, kind: str = COMPUTE_POOL, workers: int = COMPUTE_POOL_WORKERS, batch_users: int = COMPUTE_POOL_BATCH_USERS):
+        if kind not in POOL_KINDS:
+            raise ValueError(f"Unknown compute pool '{kind}', expected one of {POOL_KINDS}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.batch_users = max(1, batch_users)
+        self.executor = None
+        self.tasks = 0
+        self.rows = 0
+        self.failures = 0
+        self.restarts = 0
+        self.warmed_version = None
+
+    def start(self):
+        if self.executor is not None:
+            return
+        if self.kind == "process":
+            # spawn, not fork: the server process has an event loop and live threads
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="compute")
+        logger.info(f"Started {self.kind} compute pool with {self.workers} workers")
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool."""
+        self.start()
+        self.tasks += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        except BrokenProcessPool:
+            self.failures += 1
+            self.restarts += 1
+            logger.error("Compute pool worker died; restarting the pool")
+            self.shutdown()
+            self.warmed_version = None
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+
+    def _model_ref(self, loaded):
+        if self.kind == "process" and getattr(loaded, "artifact", None):
+            return (loaded.version, loaded.artifact)
+        # Threads share the object; a process pool without an archived copy gets it pickled
+        return loaded.model
+
+    async def warm(self, loaded):
+        """Load the model in every worker ahead of the first tick."""
+        if loaded is None or self.warmed_version == loaded.version:
+            return
+        self.start()
+        model_ref = self._model_ref(loaded)
+        pids = await asyncio.gather(*(self.run(_warm, model_ref) for _ in range(self.workers)))
+        self.warmed_version = loaded.version
+        logger.info(f"Compute pool warmed with model {loaded.version} in {len(set(pids))} process(es)")
+
+    async def predict_batch(self, loaded, X) -> np.ndarray:
+        """Labels for a (n_users, 6) matrix, scored in chunks of batch_users across the workers."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(FEATURE_NAMES):
+            raise ValueError(f"Expected shape (n_users, {len(FEATURE_NAMES)}), got {X.shape}")
+        if X.shape[0] == 0:
+            return np.empty(0, dtype=loaded.model.classes_.dtype)
+        model_ref = self._model_ref(loaded)
+        if len(X) <= self.batch_users:
+            labels = await self.run(_predict, model_ref, X)
+        else:
+            chunks = await asyncio.gather(*(
+                self.run(_predict, model_ref, X[start:start + self.batch_users])
+                for start in range(0, len(X), self.batch_users)
+            ))
+            labels = np.concatenate(chunks)
+        self.rows += len(X)
+        return labels
+
+    async def predict(self, loaded, features: dict):
+        labels = await self.predict_batch(loaded, features_matrix([features]))
+        return labels[0]
+
+    async def features(self, data_points) -> dict:
+        """compute_features for one user's SensorData rows."""
+        return await self.run(
+            compute_features_arrays,
+            [dp.gsr for dp in data_points],
+            [dp.heart_rate for dp in data_points],
+            [dp.temperature for dp in data_points]
+        )
+
+    async def features_batch(self, user_ids, gsr, heart_rate, temperature) -> dict:
+        """compute_features_batch over every user's readings."""
+        return await self.run(compute_features_batch, user_ids, gsr, heart_rate, temperature)
+
+    def metrics(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "batch_users": self.batch_users,
+            "warmed_version": self.warmed_version,
+            "tasks": self.tasks,
+            "rows": self.rows,
+            "failures": self.failures,
+            "restarts": self.restarts
+        }
+
+# Singleton instance
+compute_pool = ComputePool()
@@ -13,7 +13,18 @@ def compute_features(data_points):
     gsr_values = [dp.gsr for dp in data_points]
     hr_values = [dp.heart_rate for dp in data_points]
     temp_values = [dp.temperature for dp in data_points]
+    return compute_features_arrays(gsr_values, hr_values, temp_values)
+
+def compute_features_arrays(gsr_values, hr_values, temp_values):
+    """
+    compute_features over plain value lists, so it can run where SensorData objects cannot be sent.
+    
+    Args:
+        gsr_values, hr_values, temp_values: Readings for one user, aligned.
     
+    Returns:
+        dict: Same features as compute_features.
+    """
     return {
         "gsr_max": max(gsr_values),
         "gsr_min": min(gsr_values),
@@ -21,4 +32,57 @@ def compute_features(data_points):
         "gsr_sd": np.std(gsr_values),
         "hrate_mean": np.mean(hr_values),
         "temp_avg": np.mean(temp_values)
-    }
\ No newline at end of file
+    }
+
+FEATURE_NAMES = ["gsr_max", "gsr_min", "gsr_mean", "gsr_sd", "hrate_mean", "temp_avg"]
+
+def compute_features_batch(user_ids, gsr, heart_rate, temperature):
+    """
+    Grouped equivalent of compute_features for many users in one pass.
+
+    Args:
+        user_ids: 1-D array of user ids, one per reading.
+        gsr, heart_rate, temperature: 1-D arrays aligned with user_ids.
+
+    Returns:
+        dict: user_id -> features dict with the same keys as compute_features.
+    """
+    user_ids = np.asarray(user_ids)
+    order = np.argsort(user_ids, kind="stable")
+    user_ids = user_ids[order]
+    gsr = np.asarray(gsr, dtype=np.float64)[order]
+    hr = np.asarray(heart_rate, dtype=np.float64)[order]
+    temp = np.asarray(temperature, dtype=np.float64)[order]
+
+    users, starts, counts = np.unique(user_ids, return_index=True, return_counts=True)
+    gsr_mean = np.add.reduceat(gsr, starts) / counts
+    gsr_dev = gsr - np.repeat(gsr_mean, counts)
+
+    columns = {
+        "gsr_max": np.maximum.reduceat(gsr, starts),
+        "gsr_min": np.minimum.reduceat(gsr, starts),
+        "gsr_mean": gsr_mean,
+        "gsr_sd": np.sqrt(np.add.reduceat(gsr_dev ** 2, starts) / counts),
+        "hrate_mean": np.add.reduceat(hr, starts) / counts,
+        "temp_avg": np.add.reduceat(temp, starts) / counts,
+    }
+    return {
+        user.item(): {name: columns[name][i] for name in FEATURE_NAMES}
+        for i, user in enumerate(users)
+    }
+
+
+def features_matrix(features_list):
+    """
+    Stacks feature dicts into a model input matrix.
+
+    Args:
+        features_list: Iterable of dicts as returned by compute_features.
+
+    Returns:
+        np.ndarray: Array of shape (n, 6), columns ordered as FEATURE_NAMES.
+    """
+    return np.array(
+        [[features[name] for name in FEATURE_NAMES] for features in features_list],
+        dtype=np.float64
+    ).reshape(-1, len(FEATURE_NAMES))
@@ -0,0 +1,77 @@
+'''
+Streams merged sensor and prediction history without materialising it.
+Merges two timestamp-ordered async row streams lazily, one row of lookahead each.
+Closes both input streams when the merge ends, fails or is closed early.
+Serialises entries to NDJSON or CSV in chunks for StreamingResponse.
+'''
+import csv
+import io
+import json
+from typing import AsyncIterator
+
+EXPORT_FIELDS = ["timestamp", "heart_rate", "temperature", "gsr", "stress_level"]
+# Entries serialised per chunk handed to the response
+CHUNK_SIZE = 1000
+
+async def _next(rows: AsyncIterator):
+    try:
+        return await rows.__anext__()
+    except StopAsyncIteration:
+        return None
+
+async def close_streams(*streams):
+    """aclose() each async generator; a no-op for ones already finished or closed."""
+    for stream in streams:
+        await stream.aclose()
+
+async def merge_by_timestamp(sensor_rows: AsyncIterator, prediction_rows: AsyncIterator):
+    """Merge (timestamp, heart_rate, temperature, gsr) and (timestamp, stress_level) rows.
+
+    Both streams must be ordered by timestamp ascending. Rows with equal timestamps
+    are combined into one entry, as in /history/processed_data.
+    """
+    try:
+        sensor = await _next(sensor_rows)
+        prediction = await _next(prediction_rows)
+        while sensor is not None or prediction is not None:
+            entry = {}
+            if prediction is None or (sensor is not None and sensor[0] <= prediction[0]):
+                timestamp = sensor[0]
+                entry.update(heart_rate=sensor[1], temperature=sensor[2], gsr=sensor[3])
+                sensor = await _next(sensor_rows)
+                if prediction is not None and prediction[0] == timestamp:
+                    entry["stress_level"] = prediction[1]
+                    prediction = await _next(prediction_rows)
+            else:
+                timestamp = prediction[0]
+                entry["stress_level"] = prediction[1]
+                prediction = await _next(prediction_rows)
+            yield {"timestamp": timestamp.isoformat(), **entry}
+    finally:
+        await close_streams(sensor_rows, prediction_rows)
+
+async def ndjson_chunks(entries: AsyncIterator, chunk_size: int = CHUNK_SIZE):
+    lines = []
+    async for entry in entries:
+        lines.append(json.dumps(entry))
+        if len(lines) >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+async def csv_chunks(entries: AsyncIterator, chunk_size: int = CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    rows = 0
+    async for entry in entries:
+        writer.writerow(entry)
+        rows += 1
+        if rows >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if buffer.tell():
+        yield buffer.getvalue()
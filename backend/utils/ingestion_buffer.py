@@ -0,0 +1,210 @@
+'''
+Write-behind buffer for sensor readings.
+Queues readings from the ingestion routes and stores them with one multi-row INSERT
+once INGEST_BATCH_SIZE rows are queued or INGEST_FLUSH_INTERVAL seconds have passed.
+Bounded queue gives backpressure: submitters wait, then get IngestBufferFull.
+Durability "sync" acknowledges a reading only after its batch commits (group commit);
+"async" acknowledges as soon as the reading is queued. A sync submitter waits at most
+INGEST_COMMIT_TIMEOUT for the commit. The sensor WebSocket queues with wait=False (its reply only
+confirms receipt): waiting there would cap a socket at one reading per flush interval.
+A failed flush fails that batch's waiting submitters and the writer keeps running.
+Commit listeners are called with the rows of every committed insert (the active-user index
+marks users there, so a user is only due once their readings are visible to the scheduler).
+Flushes everything still queued on shutdown.
+'''
+import logging
+import asyncio
+from typing import Callable, List, Optional
+from sqlalchemy import insert
+from database.db import SessionLocal
+from database.models import SensorData
+from config import (
+    INGEST_BATCH_SIZE, INGEST_FLUSH_INTERVAL, INGEST_MAX_PENDING, INGEST_SUBMIT_TIMEOUT, INGEST_DURABILITY,
+    INGEST_COMMIT_TIMEOUT
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ingestion_buffer")
+
+class IngestBufferFull(Exception):
+    """Raised when a reading cannot be queued within the submit timeout."""
+
+class IngestCommitTimeout(IngestBufferFull):
+    """Raised when a queued reading is not committed within the commit timeout (also a 503)."""
+
+class SensorIngestBuffer:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL,
+        max_pending: int = INGEST_MAX_PENDING,
+        submit_timeout: float = INGEST_SUBMIT_TIMEOUT,
+        durability: str = INGEST_DURABILITY,
+        commit_timeout: float = INGEST_COMMIT_TIMEOUT
+    ):
+        if durability not in ("sync", "async"):
+            raise ValueError(f"Unknown ingest durability mode: {durability}")
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.submit_timeout = submit_timeout
+        self.commit_timeout = commit_timeout
+        self.durability = durability
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self.rows_flushed = 0
+        self.batches_flushed = 0
+        self.rows_failed = 0
+        self.flush_errors = 0
+        # Called with each list of committed rows
+        self.commit_listeners: List[Callable[[List[dict]], None]] = []
+
+    def add_commit_listener(self, listener: Callable[[List[dict]], None]):
+        self.commit_listeners.append(listener)
+
+    def _committed(self, rows: List[dict]):
+        for listener in self.commit_listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                logger.error(f"Commit listener failed: {str(e)}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Ingestion buffer started ({self.durability}, batch {self.batch_size}, {self.flush_interval}s)")
+
+    async def stop(self):
+        """Flush queued readings and stop the writer."""
+        if self._task is None or self._task.done():
+            return
+        await self.queue.put(None)
+        await self._task
+        logger.info(f"Ingestion buffer stopped. Flushed {self.rows_flushed} rows in {self.batches_flushed} batches")
+
+    async def submit(self, row: dict, wait: Optional[bool] = None) -> Optional[int]:
+        """Queue one reading. Returns its id in sync mode, None in async mode."""
+        ids = await self.submit_many([row], wait)
+        return ids[0] if ids else None
+
+    async def submit_many(self, rows: List[dict], wait: Optional[bool] = None) -> List[int]:
+        """Queue readings to be stored together. Returns their ids in sync mode, [] in async mode.
+
+        wait overrides the durability mode for this call: False returns once the rows are queued.
+        """
+        if self._task is None or self._task.done():
+            raise RuntimeError("Ingestion buffer is not running")
+        if wait is None:
+            wait = self.durability == "sync"
+        future = asyncio.get_running_loop().create_future() if wait else None
+        try:
+            await asyncio.wait_for(self.queue.put((rows, future)), timeout=self.submit_timeout)
+        except asyncio.TimeoutError:
+            raise IngestBufferFull(f"Ingestion buffer full ({self.queue.qsize()} pending)")
+        if future is None:
+            return []
+        try:
+            return await asyncio.wait_for(future, timeout=self.commit_timeout)
+        except asyncio.TimeoutError:
+            raise IngestCommitTimeout(f"Readings not committed within {self.commit_timeout}s")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            rows = len(item[0])
+            deadline = loop.time() + self.flush_interval
+            while rows < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                # Keep the writer alive; only this batch is lost
+                self.flush_errors += 1
+                self._fail(batch, e)
+
+    def _fail(self, batch: list, error: Exception):
+        rows = sum(len(item_rows) for item_rows, _ in batch)
+        self.rows_failed += rows
+        logger.error(f"Flush of {rows} readings failed: {str(error)}")
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    async def _flush(self, batch: list):
+        rows = [row for item_rows, _ in batch for row in item_rows]
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    insert(SensorData).returning(SensorData.id, sort_by_parameter_order=True),
+                    rows
+                )
+                ids = result.scalars().all()
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Batch insert of {len(rows)} readings failed, retrying individually: {str(e)}")
+            await self._flush_individually(batch)
+            return
+
+        self._committed(rows)
+
+        self.rows_flushed += len(rows)
+        self.batches_flushed += 1
+        offset = 0
+        for item_rows, future in batch:
+            if future is not None and not future.done():
+                future.set_result(ids[offset:offset + len(item_rows)])
+            offset += len(item_rows)
+        logger.debug(f"Flushed {len(rows)} readings")
+
+    async def _flush_individually(self, batch: list):
+        """Isolate bad rows (e.g. unknown user_id) so they don't sink the whole batch."""
+        async with self.session_factory() as db:
+            for item_rows, future in batch:
+                try:
+                    result = await db.execute(
+                        insert(SensorData).returning(SensorData.id, sort_by_parameter_order=True),
+                        item_rows
+                    )
+                    ids = result.scalars().all()
+                    await db.commit()
+                    self.rows_flushed += len(item_rows)
+                    self._committed(item_rows)
+                    if future is not None and not future.done():
+                        future.set_result(ids)
+                except Exception as e:
+                    await db.rollback()
+                    self.rows_failed += len(item_rows)
+                    logger.error(f"Dropped {len(item_rows)} readings: {str(e)}")
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+        self.batches_flushed += 1
+
+    def metrics(self) -> dict:
+        return {
+            "pending": self.queue.qsize(),
+            "rows_flushed": self.rows_flushed,
+            "batches_flushed": self.batches_flushed,
+            "rows_failed": self.rows_failed,
+            "flush_errors": self.flush_errors,
+            "durability": self.durability
+        }
+
+# Singleton instance
+ingest_buffer = SensorIngestBuffer()
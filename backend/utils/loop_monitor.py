@@ -0,0 +1,50 @@
+'''
+Measures event-loop lag: how late a sleep of LOOP_LAG_INTERVAL_MS wakes up.
+Anything that blocks the loop (CPU work, sync I/O) delays every WebSocket send and HTTP
+request by the same amount, and shows up here.
+Keeps recent samples for p50/p99/max, and the worst lag since a mark (one scheduler tick).
+'''
+import asyncio
+import time
+from collections import deque
+import numpy as np
+from config import LOOP_LAG_INTERVAL_MS
+
+# Samples kept for the percentiles, about 5 minutes at the default interval
+LOOP_LAG_SAMPLES = 3000
+
+class LoopLagMonitor:
+    def __init__(self, interval_ms: int = LOOP_LAG_INTERVAL_MS, samples: int = LOOP_LAG_SAMPLES):
+        self.interval = interval_ms / 1000
+        # (time.monotonic() at wake-up, lag in seconds)
+        self.samples = deque(maxlen=samples)
+        self.max_lag = 0.0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.samples.append((time.monotonic(), lag))
+            self.max_lag = max(self.max_lag, lag)
+
+    def max_since(self, mark: float) -> float:
+        """Worst lag in seconds among samples taken after time.monotonic() == mark."""
+        return max((lag for at, lag in self.samples if at >= mark), default=0.0)
+
+    def metrics(self) -> dict:
+        lags = np.fromiter((lag for _, lag in self.samples), dtype=np.float64, count=len(self.samples))
+        p50, p99 = np.percentile(lags, [50, 99]) if len(lags) else (0.0, 0.0)
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(lags),
+            "last_ms": float(lags[-1]) * 1000 if len(lags) else None,
+            "p50_ms": float(p50) * 1000,
+            "p99_ms": float(p99) * 1000,
+            "max_ms": float(lags.max()) * 1000 if len(lags) else 0.0,
+            "max_since_start_ms": self.max_lag * 1000
+        }
+
+# Singleton instance
+loop_monitor = LoopLagMonitor()
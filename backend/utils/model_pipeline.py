@@ -0,0 +1,122 @@
+'''
+One artifact for preprocessing plus model.
+The MinMaxScaler fitted in training is folded in as an affine transform, X * scale + offset,
+computed in float64 exactly as MinMaxScaler.transform does, ahead of the model.
+Forests are stored compiled (utils/compiled_forest.py), so every array in the artifact is a
+plain NumPy array that joblib can memory-map: forked workers share the pages.
+StressPipeline.predict is the single vectorised entry point for the scheduler and the API.
+Bare model pickles from older training runs are fused with scaler.pkl on load.
+read_pipeline also returns a content hash over every file the pipeline was built from
+(model and, for a bare model, the scaler), so a new scaler is a new version.
+'''
+import hashlib
+import io
+import logging
+import os
+from datetime import datetime
+from typing import Optional, Tuple
+import joblib
+import numpy as np
+from utils.compiled_forest import CompiledForest, compile_forest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("model_pipeline")
+
+SCALER_PATH = os.getenv("SCALER_PATH", "models/scaler.pkl")
+
+class StressPipeline:
+    def __init__(self, model, scale: Optional[np.ndarray] = None, offset: Optional[np.ndarray] = None, metadata: Optional[dict] = None):
+        self.model = model
+        self.scale = scale
+        self.offset = offset
+        self.metadata = metadata or {}
+
+    @property
+    def classes_(self) -> np.ndarray:
+        return self.model.classes_
+
+    @property
+    def n_features_in_(self) -> int:
+        return self.model.n_features_in_
+
+    def transform(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if self.scale is None:
+            return X
+        return X * self.scale + self.offset
+
+    def predict(self, X) -> np.ndarray:
+        return self.model.predict(self.transform(X))
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.model.predict_proba(self.transform(X))
+
+def _compilable(model) -> bool:
+    return hasattr(model, "tree_") or (
+        hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in model.estimators_)
+    )
+
+def fuse(model, scaler=None, compiled: bool = True, metadata: Optional[dict] = None) -> StressPipeline:
+    """Fold a fitted MinMaxScaler (or None) and a fitted classifier into one StressPipeline."""
+    if compiled and not isinstance(model, CompiledForest) and _compilable(model):
+        model = compile_forest(model)
+    scale = offset = None
+    if scaler is not None:
+        scale = np.ascontiguousarray(scaler.scale_, dtype=np.float64)
+        offset = np.ascontiguousarray(scaler.min_, dtype=np.float64)
+    metadata = {
+        "created_at": datetime.utcnow().isoformat(),
+        "model": type(model).__name__,
+        "scaled": scaler is not None,
+        **(metadata or {})
+    }
+    return StressPipeline(model, scale, offset, metadata)
+
+def save_pipeline(pipeline: StressPipeline, path: str):
+    # Uncompressed, so the arrays can be memory-mapped on load
+    joblib.dump(pipeline, path)
+
+def _fuse_bare(model, path: str, scaler, compiled: bool = True) -> StressPipeline:
+    if scaler is None:
+        logger.warning(f"{path} is a bare model and no scaler was found; features will not be scaled")
+    return fuse(model, scaler, compiled=compiled, metadata={"source": os.path.basename(path)})
+
+def load_pipeline(
+    path: str,
+    mmap: bool = True,
+    scaler_path: str = SCALER_PATH,
+    bare: bool = True,
+    compiled: bool = True
+) -> StressPipeline:
+    """Load a pipeline artifact, or fuse a bare model pickle with the scaler saved next to it.
+
+    bare=False only accepts fused pipelines (raises ValueError otherwise);
+    compiled=False keeps a bare model's sklearn estimator instead of compiling it.
+    """
+    obj = joblib.load(path, mmap_mode="r" if mmap else None)
+    if isinstance(obj, StressPipeline):
+        return obj
+    if not bare:
+        raise ValueError(f"{path} is not a fused StressPipeline")
+    scaler = joblib.load(scaler_path) if scaler_path and os.path.exists(scaler_path) else None
+    return _fuse_bare(obj, path, scaler, compiled)
+
+def read_pipeline(path: str, scaler_path: str = SCALER_PATH) -> Tuple[StressPipeline, str]:
+    """load_pipeline into memory, plus a sha256 of the bytes it was built from.
+
+    Each file is read once and loaded from those same bytes, so the hash always matches
+    the pipeline even if a file is replaced meanwhile.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data)
+    obj = joblib.load(io.BytesIO(data))
+    if isinstance(obj, StressPipeline):
+        return obj, digest.hexdigest()
+    scaler = None
+    if scaler_path and os.path.exists(scaler_path):
+        with open(scaler_path, "rb") as f:
+            scaler_data = f.read()
+        digest.update(scaler_data)
+        scaler = joblib.load(io.BytesIO(scaler_data))
+    return _fuse_bare(obj, path, scaler), digest.hexdigest()
@@ -0,0 +1,172 @@
+'''
+Loads the stress model once and shares it between the scheduler and the API.
+Versions every artifact by a content hash of the model and, for a bare model, the scaler it
+is fused with, and archives the fused pipeline in MODEL_VERSIONS_DIR.
+Hot-reloads when MODEL_PATH or SCALER_PATH changes: the new model is loaded and smoke-tested
+off the event loop, then swapped in with one assignment, so a request sees either the
+old or the new model, never a half-loaded one. A bad artifact leaves the old model in place.
+Runs inference in the compute pool (utils/compute_pool.py) so the event loop is never blocked,
+and pre-warms its workers with every model it swaps in.
+Every prediction comes back with the version of the model that produced it.
+MODEL_VARIANT=distilled serves the distilled model from models/train.py --distill instead.
+Serves StressPipeline artifacts (scaler folded in, see utils/model_pipeline.py), memory-mapped
+from the immutable archived copy so later writes to MODEL_PATH cannot change mapped pages.
+Process workers map that same fused copy, so none of them re-fuses from SCALER_PATH on its own.
+'''
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+import numpy as np
+from fastapi import HTTPException, status
+from config import MODEL_VERSIONS_DIR, MODEL_RELOAD_INTERVAL
+from utils.data_processing import FEATURE_NAMES
+from utils.model_utils import MODEL_PATH, MODEL_VARIANT, predict_stress_batch
+from utils.model_pipeline import SCALER_PATH, StressPipeline, load_pipeline, read_pipeline, save_pipeline
+from utils.compute_pool import compute_pool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("model_registry")
+
+class LoadedModel(NamedTuple):
+    model: object
+    version: str
+    path: str
+    loaded_at: datetime
+    # Immutable archived copy, which process workers memory-map
+    artifact: Optional[str] = None
+
+class ModelRegistry:
+    def __init__(
+        self,
+        path: str = MODEL_PATH,
+        versions_dir: str = MODEL_VERSIONS_DIR,
+        scaler_path: str = SCALER_PATH
+    ):
+        self.path = path
+        self.scaler_path = scaler_path
+        self.versions_dir = versions_dir
+        # Loads only; inference runs in the compute pool
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-load")
+        self.current: Optional[LoadedModel] = None
+        # (mtime_ns, size) of the model and scaler files the current model was read from
+        self._stat: Optional[tuple] = None
+        self._reload_lock = asyncio.Lock()
+        self.reloads = 0
+        self.reload_failures = 0
+        self.predictions = 0
+
+    def _file_stat(self) -> tuple:
+        st = os.stat(self.path)
+        try:
+            scaler = os.stat(self.scaler_path)
+            scaler_stat = (scaler.st_mtime_ns, scaler.st_size)
+        except (OSError, TypeError):
+            scaler_stat = None
+        return (st.st_mtime_ns, st.st_size), scaler_stat
+
+    def _read(self) -> Tuple[LoadedModel, tuple]:
+        stat = self._file_stat()
+        pipeline, digest = read_pipeline(self.path, self.scaler_path)
+        version = digest[:12]
+        archived = self._archive(version, pipeline)
+        model = load_pipeline(archived, mmap=True, bare=False) if archived else pipeline
+        # Refuse artifacts that cannot score a feature row
+        predict_stress_batch(model, np.zeros((1, len(FEATURE_NAMES))))
+        return LoadedModel(model, version, self.path, datetime.utcnow(), archived), stat
+
+    def _archive(self, version: str, pipeline: StressPipeline) -> Optional[str]:
+        """Keep the fused pipeline of every version served. Returns its path, or None."""
+        target = os.path.join(self.versions_dir, f"{version}.joblib")
+        if os.path.exists(target):
+            return target
+        try:
+            os.makedirs(self.versions_dir, exist_ok=True)
+            tmp = f"{target}.tmp"
+            save_pipeline(pipeline, tmp)
+            os.replace(tmp, target)
+            return target
+        except OSError as e:
+            logger.warning(f"Could not archive model version {version}: {str(e)}")
+            return None
+
+    def load(self) -> LoadedModel:
+        """Load MODEL_PATH synchronously (startup). Raises HTTPException if it cannot be loaded."""
+        try:
+            self.current, self._stat = self._read()
+        except FileNotFoundError:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Model file not found")
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error loading model: {str(e)}")
+        logger.info(f"Loaded model {self.current.version} from {self.path}")
+        return self.current
+
+    def get(self) -> LoadedModel:
+        if self.current is None:
+            self.load()
+        return self.current
+
+    async def reload_if_changed(self) -> bool:
+        """Swap in the artifact at MODEL_PATH if it or the scaler changed since it was loaded."""
+        async with self._reload_lock:
+            try:
+                if self.current is not None and self._file_stat() == self._stat:
+                    return False
+                loaded, stat = await asyncio.get_running_loop().run_in_executor(self.executor, self._read)
+            except Exception as e:
+                self.reload_failures += 1
+                logger.error(f"Model reload from {self.path} failed, keeping current model: {str(e)}")
+                return False
+            previous = self.current.version if self.current else None
+            self.current, self._stat = loaded, stat
+            if loaded.version == previous:
+                return False
+            self.reloads += 1
+            logger.info(f"Model reloaded: {previous} -> {loaded.version}")
+            try:
+                await compute_pool.warm(loaded)
+            except Exception as e:
+                logger.error(f"Could not warm the compute pool with model {loaded.version}: {str(e)}")
+            return True
+
+    async def watch(self, interval: float = MODEL_RELOAD_INTERVAL):
+        """Poll MODEL_PATH and SCALER_PATH for changes"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.reload_if_changed()
+
+    async def predict(self, features: dict) -> Tuple[int, str]:
+        """Stress level for one feature dict and the model version that produced it."""
+        current = self.get()
+        try:
+            label = await compute_pool.predict(current, features)
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error predicting stress: {str(e)}")
+        self.predictions += 1
+        return int(label), current.version
+
+    async def predict_batch(self, X) -> Tuple[np.ndarray, str]:
+        """Stress levels for a (n_users, 6) feature matrix and the model version that produced them."""
+        current = self.get()
+        try:
+            labels = await compute_pool.predict_batch(current, X)
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error predicting stress: {str(e)}")
+        self.predictions += len(labels)
+        return labels, current.version
+
+    def metrics(self) -> dict:
+        return {
+            "variant": MODEL_VARIANT,
+            "version": self.current.version if self.current else None,
+            "pipeline": self.current.model.metadata if self.current else None,
+            "loaded_at": self.current.loaded_at.isoformat() if self.current else None,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "predictions": self.predictions
+        }
+
+# Singleton instance
+model_registry = ModelRegistry()
@@ -2,23 +2,55 @@
 import pickle
 import os
 import joblib
+import numpy as np
 from fastapi import HTTPException, status
+from utils.data_processing import FEATURE_NAMES
+from utils.model_pipeline import load_pipeline
 
-MODEL_PATH = os.getenv("MODEL_PATH", "models/auticare_model.pkl")
+# Served model: "full" (MODEL_PATH) or "distilled" (DISTILLED_MODEL_PATH, from models/train.py --distill)
+MODEL_VARIANTS = {
+    "full": os.getenv("MODEL_PATH", "models/auticare_model.pkl"),
+    "distilled": os.getenv("DISTILLED_MODEL_PATH", "models/auticare_distilled.joblib")
+}
+MODEL_VARIANT = os.getenv("MODEL_VARIANT", "full")
 
-def load_model():
+def model_path(variant=None):
+    """
+    Path of the artifact for a model variant.
+    
+    Args:
+        variant: Key of MODEL_VARIANTS; defaults to MODEL_VARIANT.
+    
+    Returns:
+        str: Path of the model file.
+    
+    Raises:
+        ValueError: If the variant is unknown.
+    """
+    variant = variant or MODEL_VARIANT
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant '{variant}', expected one of {list(MODEL_VARIANTS)}")
+    return MODEL_VARIANTS[variant]
+
+MODEL_PATH = model_path()
+
+def load_model(variant=None, compiled=True):
     """
     Loads the pre-trained machine learning model from the specified path.
     
+    Args:
+        variant: "full" or "distilled"; defaults to MODEL_VARIANT.
+        compiled: Compile a bare sklearn forest; False keeps the sklearn estimator.
+    
     Returns:
-        model: Loaded Random Forest Classifier model.
+        StressPipeline: The model with the scaler folded in, so it takes raw features.
+        A bare model pickle is fused with SCALER_PATH.
     
     Raises:
         HTTPException: If model loading fails.
     """
     try:
-        with open(MODEL_PATH, "rb") as f:
-            return joblib.load(f)
+        return load_pipeline(model_path(variant), mmap=False, compiled=compiled)
     except FileNotFoundError:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Model file not found")
     except Exception as e:
@@ -29,8 +61,8 @@ def predict_stress(model, features):
     Makes a stress level prediction using the loaded model.
     
     Args:
-        model: Trained Random Forest Classifier.
-        features: Dictionary of features (gsr_max, gsr_min, etc.).
+        model: StressPipeline from load_model.
+        features: Dictionary of raw features (gsr_max, gsr_min, etc.).
     
     Returns:
         int: Predicted stress level (0, 1, 2, or 3).
@@ -46,4 +78,33 @@ def predict_stress(model, features):
         ]
         return model.predict([feature_list])[0]
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error predicting stress: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error predicting stress: {str(e)}")
+
+def predict_stress_batch(model, X, return_proba=False):
+    """
+    Makes stress level predictions for many users in a single model call.
+    
+    Args:
+        model: StressPipeline from load_model.
+        X: Array of shape (n_users, 6), columns ordered as FEATURE_NAMES.
+        return_proba: Also return the class probabilities.
+    
+    Returns:
+        np.ndarray: Predicted stress levels, shape (n_users,).
+        With return_proba, a (labels, probabilities) tuple where probabilities
+        has shape (n_users, n_classes) ordered as model.classes_.
+    """
+    try:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(FEATURE_NAMES):
+            raise ValueError(f"Expected shape (n_users, {len(FEATURE_NAMES)}), got {X.shape}")
+        if X.shape[0] == 0:
+            labels = np.empty(0, dtype=model.classes_.dtype)
+            return (labels, np.empty((0, len(model.classes_)))) if return_proba else labels
+        if return_proba:
+            # RandomForest.predict is argmax over predict_proba; derive labels from the same pass
+            proba = model.predict_proba(X)
+            return model.classes_.take(np.argmax(proba, axis=1)), proba
+        return model.predict(X)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error predicting stress: {str(e)}")
@@ -0,0 +1,40 @@
+'''
+Keyset pagination on (timestamp, id), newest first.
+Cursors are opaque url-safe tokens holding the last row's timestamp and id,
+so each page is an index range scan no matter how deep it is.
+'''
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import desc, tuple_
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        # Only what encode_cursor produces: an ISO string and an integer id
+        if not isinstance(timestamp, str) or type(row_id) is not int:
+            raise ValueError(cursor)
+        return datetime.fromisoformat(timestamp), row_id
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def keyset_page(query, model, cursor: Optional[str], limit: int):
+    """Order query newest first and start it after cursor; fetches one extra row to detect a next page."""
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.timestamp, model.id) < tuple_(timestamp, row_id))
+    return query.order_by(desc(model.timestamp), desc(model.id)).limit(limit + 1)
+
+def split_page(rows: List, limit: int) -> Tuple[List, Optional[str]]:
+    """Trim the lookahead row and build next_cursor from the last row kept."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].timestamp, rows[-1].id)
@@ -0,0 +1,118 @@
+'''
+Caches the latest stress level per user for the sensor broadcast payload.
+The scheduler and /predict write through after committing a new Prediction.
+Misses fall back to the database and populate the cache; callers without a session
+get a short-lived one for the miss only.
+Entries expire after PREDICTION_CACHE_TTL seconds, so workers that don't run the scheduler
+pick up its predictions from the database within that time.
+Every store drops the expired entries and, beyond PREDICTION_CACHE_MAX_ENTRIES, the least
+recently stored ones, so users who stop connecting don't stay in memory.
+Counts hits, misses and evictions.
+'''
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from database.db import SessionLocal
+from database.models import Prediction
+from config import PREDICTION_CACHE_TTL, PREDICTION_CACHE_MAX_ENTRIES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("prediction_cache")
+
+class LatestPredictionCache:
+    def __init__(self, ttl: float = PREDICTION_CACHE_TTL, max_entries: int = PREDICTION_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # user_id -> (stress_level, timestamp); (None, None) caches "no prediction yet"
+        self.entries: Dict[int, Tuple[Optional[int], Optional[datetime]]] = {}
+        # user_id -> time.monotonic() when the entry was stored, oldest first
+        self.stored_at: Dict[int, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    async def get(self, user_id: int, db: Optional[AsyncSession] = None) -> Optional[int]:
+        """Latest stress level for user_id, querying the database on a miss."""
+        entry = self.entries.get(user_id)
+        if entry is not None and self.ttl and time.monotonic() - self.stored_at[user_id] > self.ttl:
+            self.expired += 1
+            self.invalidate(user_id)
+            entry = None
+        if entry is not None:
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        if db is None:
+            async with SessionLocal() as session:
+                return await self._load(user_id, session)
+        return await self._load(user_id, db)
+
+    async def _load(self, user_id: int, db: AsyncSession) -> Optional[int]:
+        result = await db.execute(
+            select(Prediction.stress_level, Prediction.timestamp)
+            .where(Prediction.user_id == user_id)
+            .order_by(Prediction.timestamp.desc())
+            .limit(1)
+        )
+        row = result.first()
+        entry = (row.stress_level, row.timestamp) if row else (None, None)
+        # A write-through may have landed while we were querying
+        return self._store(user_id, entry)[0]
+
+    def put(self, user_id: int, stress_level: int, timestamp: datetime):
+        """Write through a newly committed prediction."""
+        self._store(user_id, (int(stress_level), timestamp))
+
+    def invalidate(self, user_id: int):
+        self.entries.pop(user_id, None)
+        self.stored_at.pop(user_id, None)
+
+    def _store(self, user_id: int, entry: tuple) -> tuple:
+        current = self.entries.get(user_id)
+        if current is not None and current[1] is not None and (entry[1] is None or self._older(entry[1], current[1])):
+            return current
+        now = time.monotonic()
+        self.entries[user_id] = entry
+        # Re-insert so stored_at stays in store order
+        self.stored_at.pop(user_id, None)
+        self.stored_at[user_id] = now
+        self._evict(now)
+        return entry
+
+    def _evict(self, now: float):
+        """Drop expired entries, then the oldest ones beyond max_entries; both sit at the front of stored_at."""
+        while self.stored_at:
+            user_id, stored = next(iter(self.stored_at.items()))
+            if self.ttl and now - stored > self.ttl:
+                self.expired += 1
+            elif len(self.stored_at) > self.max_entries:
+                self.evicted += 1
+            else:
+                break
+            self.invalidate(user_id)
+
+    @staticmethod
+    def _older(a: datetime, b: datetime) -> bool:
+        # Rows read back are tz-aware, rows written by this process are naive UTC
+        def naive_utc(ts):
+            return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+        return naive_utc(a) < naive_utc(b)
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+# Singleton instance
+prediction_cache = LatestPredictionCache()
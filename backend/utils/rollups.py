@@ -0,0 +1,228 @@
+'''
+Maintains 1-minute, 15-minute and 1-hour rollups of sensor_data per user.
+Each scheduler tick aggregates only raw rows past the last watermark and upserts them.
+Rows are rolled up one tick after they are first seen, so ids handed out to
+still-open transactions are not skipped.
+A backlog (the first run over existing data) is worked off in chunks of
+MAX_IDS_PER_TICK ids, each in its own transaction, until the watermark catches up.
+Readers take the coarsest rollup that fits the requested bucket and add the
+not-yet-rolled-up tail from sensor_data, so cost stays flat as raw data grows.
+Rollup buckets that start before the window are replaced by raw rows from the window's
+start to the next rollup boundary, so nothing outside the window is counted.
+Readers see the watermark, rollups and tail in one REPEATABLE READ snapshot.
+'''
+import logging
+import math
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import func, literal, or_, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from database.db import SessionLocal
+from database.models import SensorData, SensorRollup, RollupWatermark
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("rollups")
+
+ROLLUP_RESOLUTIONS = [60, 900, 3600]
+WATERMARK_NAME = "sensor_rollups"
+CHANNELS = ["heart_rate", "temperature", "gsr"]
+# Cap on raw ids aggregated per transaction so the first run over existing data is chunked
+MAX_IDS_PER_TICK = 500_000
+
+def epoch_bucket(column, seconds: int):
+    """Epoch seconds of the start of the bucket containing column."""
+    return func.floor(func.extract("epoch", column) / seconds) * seconds
+
+def choose_rollup(seconds: int) -> Optional[int]:
+    """Coarsest rollup whose buckets tile a bucket of `seconds` exactly."""
+    fitting = [r for r in ROLLUP_RESOLUTIONS if seconds % r == 0]
+    return max(fitting) if fitting else None
+
+def _upsert_rollup(resolution: int, low_id: int, high_id: int):
+    bucket = func.to_timestamp(epoch_bucket(SensorData.timestamp, resolution))
+    columns = [SensorData.user_id, literal(resolution, Integer), bucket, func.count()]
+    target = ["user_id", "resolution", "bucket_start", "count"]
+    for name in CHANNELS:
+        column = getattr(SensorData, name)
+        columns += [func.sum(column), func.min(column), func.max(column)]
+        target += [f"{name}_sum", f"{name}_min", f"{name}_max"]
+    source = (
+        select(*columns)
+        .where(SensorData.id > low_id, SensorData.id <= high_id)
+        .group_by(SensorData.user_id, bucket)
+    )
+
+    stmt = pg_insert(SensorRollup).from_select(target, source)
+    excluded = stmt.excluded
+    updates = {"count": SensorRollup.count + excluded["count"]}
+    for name in CHANNELS:
+        updates[f"{name}_sum"] = getattr(SensorRollup, f"{name}_sum") + excluded[f"{name}_sum"]
+        updates[f"{name}_min"] = func.least(getattr(SensorRollup, f"{name}_min"), excluded[f"{name}_min"])
+        updates[f"{name}_max"] = func.greatest(getattr(SensorRollup, f"{name}_max"), excluded[f"{name}_max"])
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "resolution", "bucket_start"],
+        set_=updates
+    )
+
+async def _update_rollups_chunk(db: AsyncSession):
+    """Fold up to MAX_IDS_PER_TICK ids past the watermark. Returns (id span, caught up)."""
+    result = await db.execute(
+        select(RollupWatermark).where(RollupWatermark.name == WATERMARK_NAME).with_for_update()
+    )
+    watermark = result.scalar_one_or_none()
+    if watermark is None:
+        watermark = RollupWatermark(name=WATERMARK_NAME, last_sensor_data_id=0, pending_sensor_data_id=0)
+        db.add(watermark)
+        await db.flush()
+
+    low_id = watermark.last_sensor_data_id
+    high_id = min(watermark.pending_sensor_data_id, low_id + MAX_IDS_PER_TICK)
+    if high_id > low_id:
+        for resolution in ROLLUP_RESOLUTIONS:
+            await db.execute(_upsert_rollup(resolution, low_id, high_id))
+
+    watermark.last_sensor_data_id = high_id
+    caught_up = high_id >= watermark.pending_sensor_data_id
+    if caught_up:
+        newest_id = await db.scalar(select(func.max(SensorData.id))) or 0
+        watermark.pending_sensor_data_id = max(newest_id, watermark.pending_sensor_data_id)
+    await db.commit()
+    return high_id - low_id, caught_up
+
+async def update_rollups(db: AsyncSession) -> int:
+    """Fold raw rows past the watermark into every rollup. Returns the id span processed."""
+    total = 0
+    caught_up = False
+    while not caught_up:
+        span, caught_up = await _update_rollups_chunk(db)
+        total += span
+    return total
+
+@asynccontextmanager
+async def rollup_snapshot():
+    """A read-only session whose queries all see one snapshot."""
+    async with SessionLocal() as db:
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        yield db
+
+def _next_boundary(moment: datetime, resolution: int) -> datetime:
+    """First multiple of resolution (epoch seconds) at or after a naive UTC datetime."""
+    epoch = moment.replace(tzinfo=timezone.utc).timestamp()
+    return datetime.utcfromtimestamp(math.ceil(epoch / resolution) * resolution)
+
+def _raw_rows(rolled_up_through: int, user_id: int, start: datetime, head_end: datetime):
+    """Raw rows in the window that the rollups don't cover: the tail, and the head before head_end."""
+    return (
+        SensorData.user_id == user_id,
+        SensorData.timestamp >= start,
+        or_(SensorData.id > rolled_up_through, SensorData.timestamp < head_end)
+    )
+
+async def _rolled_up_through(db: AsyncSession) -> int:
+    return await db.scalar(
+        select(RollupWatermark.last_sensor_data_id).where(RollupWatermark.name == WATERMARK_NAME)
+    ) or 0
+
+def _aggregate_columns(source, rollup: bool) -> list:
+    """count/sum/min/max per channel, re-aggregating rollup rows or raw rows."""
+    if rollup:
+        columns = [func.sum(source.count).label("count")]
+        for name in CHANNELS:
+            columns += [
+                func.sum(getattr(source, f"{name}_sum")).label(f"{name}_sum"),
+                func.min(getattr(source, f"{name}_min")).label(f"{name}_min"),
+                func.max(getattr(source, f"{name}_max")).label(f"{name}_max"),
+            ]
+        return columns
+    columns = [func.count().label("count")]
+    for name in CHANNELS:
+        column = getattr(source, name)
+        columns += [
+            func.sum(column).label(f"{name}_sum"),
+            func.min(column).label(f"{name}_min"),
+            func.max(column).label(f"{name}_max"),
+        ]
+    return columns
+
+def _merge(into: dict, row) -> dict:
+    # Row is a tuple, so "count" must be read through the mapping rather than as an attribute
+    values = row._mapping
+    if into is None:
+        return {name: values[name] for name in values.keys() if name != "bucket"}
+    into["count"] += values["count"]
+    for name in CHANNELS:
+        into[f"{name}_sum"] += values[f"{name}_sum"]
+        into[f"{name}_min"] = min(into[f"{name}_min"], values[f"{name}_min"])
+        into[f"{name}_max"] = max(into[f"{name}_max"], values[f"{name}_max"])
+    return into
+
+async def get_rollup_buckets(user_id: int, start_date: datetime, seconds: int) -> dict:
+    """Per-bucket count/sum/min/max per channel from the coarsest fitting rollup plus raw head and tail.
+
+    Returns:
+        dict: bucket start (epoch seconds, float) -> aggregates.
+    """
+    resolution = choose_rollup(seconds)
+    if resolution is None:
+        raise ValueError(f"No rollup tiles {seconds}s buckets")
+    head_end = _next_boundary(start_date, resolution)
+
+    async with rollup_snapshot() as db:
+        rolled_up_through = await _rolled_up_through(db)
+        bucket = epoch_bucket(SensorRollup.bucket_start, seconds).label("bucket")
+        rollup_result = await db.execute(
+            select(bucket, *_aggregate_columns(SensorRollup, rollup=True))
+            .where(
+                SensorRollup.user_id == user_id,
+                SensorRollup.resolution == resolution,
+                SensorRollup.bucket_start >= head_end
+            )
+            .group_by(bucket)
+        )
+        raw_bucket = epoch_bucket(SensorData.timestamp, seconds).label("bucket")
+        raw_result = await db.execute(
+            select(raw_bucket, *_aggregate_columns(SensorData, rollup=False))
+            .where(*_raw_rows(rolled_up_through, user_id, start_date, head_end))
+            .group_by(raw_bucket)
+        )
+        rows = [*rollup_result.all(), *raw_result.all()]
+
+    buckets = {}
+    for row in rows:
+        key = float(row.bucket)
+        buckets[key] = _merge(buckets.get(key), row)
+    return buckets
+
+async def get_channel_averages(user_id: int, since: datetime) -> Optional[dict]:
+    """Mean of each channel since `since` from the coarsest rollup within the window plus raw head and tail."""
+    span = (datetime.utcnow() - since).total_seconds()
+    fitting = [r for r in ROLLUP_RESOLUTIONS if r <= span]
+    resolution = max(fitting) if fitting else ROLLUP_RESOLUTIONS[0]
+    head_end = _next_boundary(since, resolution)
+
+    async with rollup_snapshot() as db:
+        rolled_up_through = await _rolled_up_through(db)
+        rollup = (await db.execute(
+            select(*_aggregate_columns(SensorRollup, rollup=True))
+            .where(
+                SensorRollup.user_id == user_id,
+                SensorRollup.resolution == resolution,
+                SensorRollup.bucket_start >= head_end
+            )
+        )).one()._mapping
+        tail = (await db.execute(
+            select(*_aggregate_columns(SensorData, rollup=False))
+            .where(*_raw_rows(rolled_up_through, user_id, since, head_end))
+        )).one()._mapping
+
+    count = (rollup["count"] or 0) + (tail["count"] or 0)
+    if not count:
+        return None
+    averages = {"count": count}
+    for name in CHANNELS:
+        total = (rollup[f"{name}_sum"] or 0.0) + (tail[f"{name}_sum"] or 0.0)
+        averages[name] = total / count
+    return averages
@@ -0,0 +1,112 @@
+'''
+Runs the scheduled jobs in exactly one process when several API workers share the database.
+RUN_SCHEDULER=auto: every process tries a Postgres session-level advisory lock on a dedicated
+autocommit connection; the holder runs the scheduler, the others retry every SCHEDULER_LOCK_RETRY
+seconds and take over once the holder's connection (and with it the lock) goes away.
+The leader checks its connection on the same interval and pauses the scheduler if it is lost.
+RUN_SCHEDULER=true always runs it (one process, or a database without advisory locks);
+RUN_SCHEDULER=false never does (API-only workers beside a dedicated scheduler process).
+'''
+import asyncio
+import logging
+from sqlalchemy import func, select, text
+from config import RUN_SCHEDULER, SCHEDULER_LOCK_RETRY
+from database.db import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("scheduler_leader")
+
+RUN_SCHEDULER_MODES = ("auto", "true", "false")
+# Advisory lock id shared by every process of this application ("Auti")
+SCHEDULER_LOCK_KEY = 0x41757469
+
+class SchedulerLeader:
+    def __init__(self, mode: str = RUN_SCHEDULER, retry: float = SCHEDULER_LOCK_RETRY, key: int = SCHEDULER_LOCK_KEY):
+        if mode not in RUN_SCHEDULER_MODES:
+            raise ValueError(f"Unknown RUN_SCHEDULER '{mode}', expected one of {RUN_SCHEDULER_MODES}")
+        self.mode = mode
+        self.retry = retry
+        self.key = key
+        self.scheduler = None
+        self.connection = None
+        self.leading = False
+        self.acquired = 0
+        self.lost = 0
+
+    async def run(self, scheduler):
+        """Start scheduler here if this process should run it, and keep competing for the lock."""
+        self.scheduler = scheduler
+        if self.mode == "false":
+            logger.info("RUN_SCHEDULER=false: scheduled jobs run in another process")
+            return
+        if self.mode == "true" or engine.dialect.name != "postgresql":
+            self._lead()
+            return
+        while True:
+            try:
+                if self.connection is None:
+                    await self._try_acquire()
+                else:
+                    await self.connection.execute(text("SELECT 1"))
+            except Exception as e:
+                logger.error(f"Scheduler lock connection failed: {str(e)}")
+                await self._step_down()
+            await asyncio.sleep(self.retry)
+
+    async def _try_acquire(self):
+        connection = await engine.connect()
+        try:
+            # Autocommit: the lock belongs to the session, so no transaction is left open
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            if await connection.scalar(select(func.pg_try_advisory_lock(self.key))):
+                self.connection = connection
+                self.acquired += 1
+                self._lead()
+                return
+        except Exception:
+            await connection.close()
+            raise
+        await connection.close()
+
+    def _lead(self):
+        if self.scheduler.running:
+            self.scheduler.resume()
+        else:
+            self.scheduler.start()
+        self.leading = True
+        logger.info("This process runs the scheduled jobs")
+
+    async def _step_down(self):
+        if self.leading:
+            self.lost += 1
+            logger.warning("Lost the scheduler lock; pausing scheduled jobs")
+            self.scheduler.pause()
+            self.leading = False
+        if self.connection is not None:
+            await self._discard()
+
+    async def stop(self):
+        if self.scheduler is not None and self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        self.leading = False
+        if self.connection is not None:
+            await self._discard()
+
+    async def _discard(self):
+        # Invalidate rather than close: a pooled connection would keep holding the lock
+        try:
+            await self.connection.invalidate()
+        except Exception as e:
+            logger.error(f"Failed to drop the scheduler lock connection: {str(e)}")
+        self.connection = None
+
+    def metrics(self) -> dict:
+        return {
+            "mode": self.mode,
+            "leading": self.leading,
+            "acquired": self.acquired,
+            "lost": self.lost
+        }
+
+# Singleton instance
+scheduler_leader = SchedulerLeader()
@@ -0,0 +1,222 @@
+'''
+Keeps a rolling window of recent readings per user in memory.
+Updates feature statistics incrementally as each reading arrives.
+Welford-style running mean/variance for GSR, running means for heart rate and temperature.
+Monotonic deques give GSR max/min in O(1).
+Evicts readings older than the window or beyond the entry cap.
+Drops readings older than the newest one in the window: eviction and latest() rely on time order.
+Rejects readings with a missing or non-finite channel before touching any window state.
+Snapshot/restore lets the windows be rebuilt after a restart.
+'''
+import logging
+import math
+import numbers
+from collections import deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from sqlalchemy import desc
+from sqlalchemy.future import select
+from database.models import SensorData
+from utils.data_processing import FEATURE_NAMES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("stream_aggregator")
+
+# Same window the scheduler aggregates over: last 5 minutes, at most 100 readings
+WINDOW_SECONDS = 300
+WINDOW_MAX_ENTRIES = 100
+
+Reading = namedtuple("Reading", ["id", "timestamp", "gsr", "heart_rate", "temperature"])
+
+CHANNELS = ("gsr", "heart_rate", "temperature")
+
+def _valid(reading: Reading) -> bool:
+    """Every channel is a finite number (bool is not a reading)."""
+    for name in CHANNELS:
+        value = getattr(reading, name)
+        if isinstance(value, bool) or not isinstance(value, numbers.Real) or not math.isfinite(value):
+            return False
+    return True
+
+def _epoch(timestamp: datetime) -> float:
+    """Naive datetimes are UTC throughout this codebase (datetime.utcnow())."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+class RollingWindow:
+    """Rolling feature statistics for one user's readings."""
+
+    def __init__(self, window_seconds: float = WINDOW_SECONDS, max_entries: int = WINDOW_MAX_ENTRIES):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.entries = deque()   # (seq, epoch, Reading), oldest first
+        self.max_gsr = deque()   # (seq, gsr), values decreasing
+        self.min_gsr = deque()   # (seq, gsr), values increasing
+        self.seq = 0
+        self.count = 0
+        self.gsr_mean = 0.0
+        self.gsr_m2 = 0.0
+        self.hr_mean = 0.0
+        self.temp_mean = 0.0
+
+    def add(self, reading: Reading) -> bool:
+        """Add a reading. Returns False if it is older than the newest one and was dropped.
+
+        Raises ValueError for a reading with a missing or non-finite channel; the window is unchanged.
+        """
+        if not _valid(reading):
+            raise ValueError(f"Reading {reading.id} has a missing or non-finite channel")
+        epoch = _epoch(reading.timestamp)
+        if self.entries and epoch < self.entries[-1][1]:
+            # Out of order: entries must stay sorted by time for eviction and latest()
+            return False
+        seq = self.seq
+        self.seq += 1
+        self.entries.append((seq, epoch, reading))
+
+        while self.max_gsr and self.max_gsr[-1][1] <= reading.gsr:
+            self.max_gsr.pop()
+        self.max_gsr.append((seq, reading.gsr))
+        while self.min_gsr and self.min_gsr[-1][1] >= reading.gsr:
+            self.min_gsr.pop()
+        self.min_gsr.append((seq, reading.gsr))
+
+        self.count += 1
+        delta = reading.gsr - self.gsr_mean
+        self.gsr_mean += delta / self.count
+        self.gsr_m2 += delta * (reading.gsr - self.gsr_mean)
+        self.hr_mean += (reading.heart_rate - self.hr_mean) / self.count
+        self.temp_mean += (reading.temperature - self.temp_mean) / self.count
+
+        while self.count > self.max_entries:
+            self._evict_oldest()
+        return True
+
+    def _evict_oldest(self):
+        seq, _, reading = self.entries.popleft()
+        if self.max_gsr and self.max_gsr[0][0] == seq:
+            self.max_gsr.popleft()
+        if self.min_gsr and self.min_gsr[0][0] == seq:
+            self.min_gsr.popleft()
+
+        self.count -= 1
+        if self.count == 0:
+            self.gsr_mean = self.gsr_m2 = self.hr_mean = self.temp_mean = 0.0
+            return
+        delta = reading.gsr - self.gsr_mean
+        self.gsr_mean -= delta / self.count
+        self.gsr_m2 = max(self.gsr_m2 - delta * (reading.gsr - self.gsr_mean), 0.0)
+        self.hr_mean -= (reading.heart_rate - self.hr_mean) / self.count
+        self.temp_mean -= (reading.temperature - self.temp_mean) / self.count
+
+    def evict(self, now: float):
+        cutoff = now - self.window_seconds
+        while self.entries and self.entries[0][1] < cutoff:
+            self._evict_oldest()
+
+    def features(self) -> Optional[dict]:
+        if not self.count:
+            return None
+        values = (
+            self.max_gsr[0][1],
+            self.min_gsr[0][1],
+            self.gsr_mean,
+            (self.gsr_m2 / self.count) ** 0.5,
+            self.hr_mean,
+            self.temp_mean
+        )
+        return dict(zip(FEATURE_NAMES, values))
+
+    def latest(self) -> Optional[Reading]:
+        return self.entries[-1][2] if self.entries else None
+
+class StreamAggregator:
+    """Per-user RollingWindows fed by the sensor ingestion routes."""
+
+    def __init__(self, window_seconds: float = WINDOW_SECONDS, max_entries: int = WINDOW_MAX_ENTRIES):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.windows: Dict[int, RollingWindow] = {}
+        # Out-of-order readings left out of the windows (still stored in the database)
+        self.dropped = 0
+        # Readings with a missing or non-finite channel, left out of the windows
+        self.invalid = 0
+
+    def add(self, user_id: int, reading: Reading) -> bool:
+        if not _valid(reading):
+            self.invalid += 1
+            logger.warning(f"Ignoring reading with a missing or non-finite channel for user {user_id}")
+            return False
+        window = self.windows.get(user_id)
+        if window is None:
+            window = self.windows[user_id] = RollingWindow(self.window_seconds, self.max_entries)
+        added = window.add(reading)
+        if not added:
+            self.dropped += 1
+        return added
+
+    def add_entry(self, entry: SensorData):
+        """Record a stored SensorData row."""
+        self.add(entry.user_id, Reading(entry.id, entry.timestamp, entry.gsr, entry.heart_rate, entry.temperature))
+
+    def features(self, user_id: int, now: Optional[datetime] = None) -> Optional[dict]:
+        window = self.windows.get(user_id)
+        if window is None:
+            return None
+        window.evict(_epoch(now or datetime.utcnow()))
+        return window.features()
+
+    def batch_features(self, now: Optional[datetime] = None) -> dict:
+        """Features for every user with readings in the window.
+
+        Returns:
+            dict: user_id -> (features, latest Reading), the shape of tasks.fetch_batch_features.
+        """
+        now_epoch = _epoch(now or datetime.utcnow())
+        batch = {}
+        for user_id, window in list(self.windows.items()):
+            window.evict(now_epoch)
+            if not window.count:
+                del self.windows[user_id]
+                continue
+            batch[user_id] = (window.features(), window.latest())
+        return batch
+
+    def snapshot(self) -> dict:
+        """Plain user_id -> [Reading, ...] copy of every window, oldest first."""
+        return {
+            user_id: [reading for _, _, reading in window.entries]
+            for user_id, window in self.windows.items()
+        }
+
+    def restore(self, snapshot: dict):
+        """Rebuild the windows from a snapshot, replacing current state."""
+        self.windows = {}
+        for user_id, readings in snapshot.items():
+            for reading in sorted(readings, key=lambda r: _epoch(r.timestamp)):
+                self.add(user_id, Reading(*reading))
+        logger.info(f"Restored rolling windows for {len(self.windows)} users")
+
+    async def warm_up(self, db):
+        """Restore the windows from the last WINDOW_SECONDS of sensor_data."""
+        since = datetime.utcnow() - timedelta(seconds=self.window_seconds)
+        result = await db.execute(
+            select(
+                SensorData.user_id,
+                SensorData.id,
+                SensorData.timestamp,
+                SensorData.gsr,
+                SensorData.heart_rate,
+                SensorData.temperature
+            ).where(SensorData.timestamp >= since).order_by(desc(SensorData.timestamp))
+        )
+        snapshot = {}
+        for row in result.all():
+            readings = snapshot.setdefault(row.user_id, [])
+            if len(readings) < self.max_entries:
+                readings.append(Reading(row.id, row.timestamp, row.gsr, row.heart_rate, row.temperature))
+        self.restore(snapshot)
+
+# Singleton instance
+sensor_aggregator = StreamAggregator()
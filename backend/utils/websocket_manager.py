@@ -5,105 +5,454 @@ Logs new connections and disconnections.
 Catches errors when broadcasting messages.
 WebSockets require authentication using JWT tokens.
 Ensures only logged-in users receive stress predictions.
+Fans each user's messages out to every socket they have open (phone, tablet, several caregivers).
+Every socket gets a bounded send queue drained by its own writer task,
+so a slow client drops its own oldest messages instead of stalling the others.
+broadcast and ping send to all sockets concurrently (bounded), with a timeout per send,
+and evict every dead or stalled peer in one pass.
+broadcast_user publishes through a backplane (in-process, Postgres or Redis),
+so a user's sockets are reached whichever worker process holds them.
+Sensor streams can be coalesced per socket: "immediate" sends every reading,
+"latest" sends the newest reading at most every interval, "batch" sends the readings
+of each interval as one sensor_batch frame. Messages are serialised once and shared by all sockets.
+Sockets that negotiated the binary subprotocol get sensor readings as packed binary frames
+(see utils/ws_protocol.py); each message is packed at most once however many sockets want it.
+A batch whose readings are too far apart for one binary frame goes out as several.
+Every message to a user gets the next per-user sequence number ("seq") and is kept in a
+per-user ring buffer. A reconnecting client passes its epoch and last seq and is sent only
+what it missed; if the gap is no longer buffered (or it reconnected to another process)
+it is told to reset and reload history instead.
+Numbering and buffering only happen while a resume is possible: while the user has a socket
+here, or for WS_REPLAY_TTL seconds after the last one closed. After that the user's sequence
+and buffer are dropped, so memory follows connected users, not every user ever messaged.
 '''
 import logging
 import asyncio
+import json
+import time
+import uuid
+from collections import deque
 from fastapi import WebSocket, WebSocketDisconnect, status
 from starlette.websockets import WebSocketState
-from typing import Dict
+from typing import Dict, List, Optional, Set, Union
+from utils.ws_protocol import sensor_record, encode_sensor_frame, encode_sensor_frames
+from config import WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT, WS_BROADCAST_CONCURRENCY, WS_DELIVERY_MODE, WS_DELIVERY_INTERVAL_MS, WS_REPLAY_BUFFER_SIZE, WS_REPLAY_TTL
+from utils.backplane import Backplane, InProcessBackplane
 
 # logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("websocket_manager")
 
+DELIVERY_MODES = ("immediate", "latest", "batch")
+# Readings held per socket between batch frames; the oldest are dropped beyond this
+BATCH_MAX_MESSAGES = 500
+
+class Outgoing:
+    """A message on its way to a user's sockets, with its binary form computed on first use."""
+
+    __slots__ = ("text", "coalesce", "seq", "_record", "_binary")
+    _UNSET = object()
+
+    def __init__(self, text: str, coalesce: bool = False, seq: int = 0):
+        self.text = text
+        self.coalesce = coalesce
+        self.seq = seq
+        self._record = self._UNSET
+        self._binary = self._UNSET
+
+    @property
+    def record(self):
+        """Parsed sensor reading, or None if this is not a sensor_data message."""
+        if self._record is self._UNSET:
+            self._record = sensor_record(self.text) if self.coalesce else None
+        return self._record
+
+    @property
+    def binary(self) -> Optional[bytes]:
+        if self._binary is self._UNSET:
+            self._binary = encode_sensor_frame([self.record], self.seq) if self.record is not None else None
+        return self._binary
+
+class Subscriber:
+    """One WebSocket connection with its own send queue and writer task."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        queue_size: int = WS_SEND_QUEUE_SIZE,
+        delivery: str = WS_DELIVERY_MODE,
+        interval_ms: int = WS_DELIVERY_INTERVAL_MS,
+        binary: bool = False
+    ):
+        if delivery not in DELIVERY_MODES:
+            raise ValueError(f"Unknown delivery mode: {delivery}")
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Serialises writer-task sends with direct sends on the same socket
+        self.send_lock = asyncio.Lock()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.task: Optional[asyncio.Task] = None
+        self.delivery = delivery
+        self.interval = interval_ms / 1000
+        # Sensor readings as binary frames (auticare.bin.v1) instead of JSON text
+        self.binary = binary
+        # Coalescable messages held until the next flush
+        self.pending: List[Outgoing] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.last_flush = 0.0
+
+    def start(self, on_failure):
+        self.task = asyncio.create_task(self._writer(on_failure))
+
+    def _enqueue_all(self, messages: List[Union[str, bytes]]):
+        for message in messages:
+            self.enqueue(message)
+
+    def enqueue(self, message: Union[str, bytes]):
+        """Queue a message without blocking; drops the oldest queued message when full."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    def offer(self, message: Outgoing):
+        """Queue a message, holding coalescable ones back according to the delivery mode."""
+        if not message.coalesce:
+            self.enqueue(message.text)
+            return
+        if self.delivery == "immediate":
+            self._enqueue_all(self._frames([message]))
+            return
+        if self.delivery == "latest":
+            self.coalesced += len(self.pending)
+            self.pending = [message]
+        else:
+            if len(self.pending) >= BATCH_MAX_MESSAGES:
+                self.pending.pop(0)
+                self.dropped += 1
+            self.pending.append(message)
+
+        if self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            delay = max(0.0, self.last_flush + self.interval - loop.time())
+            self.flush_handle = loop.call_later(delay, self.flush)
+
+    def flush(self):
+        """Move held messages to the send queue as one frame."""
+        self.flush_handle = None
+        if not self.pending:
+            return
+        self.last_flush = asyncio.get_running_loop().time()
+        pending, self.pending = self.pending, []
+        if self.delivery == "batch":
+            self.coalesced += len(pending) - 1
+        self._enqueue_all(self._frames(pending))
+
+    def _frames(self, messages: List[Outgoing]) -> List[Union[str, bytes]]:
+        if self.delivery != "batch" and len(messages) == 1:
+            message = messages[0]
+            return [message.binary if self.binary and message.binary is not None else message.text]
+        return self._batch_frames(messages)
+
+    def _batch_frames(self, messages: List[Outgoing]) -> List[Union[str, bytes]]:
+        if self.binary and all(m.record is not None for m in messages):
+            if len(messages) == 1:
+                return [messages[0].binary]
+            return encode_sensor_frames([m.record for m in messages], [m.seq for m in messages])
+        # Messages are already JSON objects, so the frame is assembled without re-encoding them
+        return [
+            f'{{"type": "sensor_batch", "seq": {messages[-1].seq}, "data": ['
+            + ", ".join(m.text for m in messages) + "]}"
+        ]
+
+    def replay(self, messages: List[Outgoing]):
+        """Queue missed messages, packing runs of sensor readings into batch frames."""
+        run: List[Outgoing] = []
+        for message in messages:
+            if message.coalesce and len(run) < BATCH_MAX_MESSAGES:
+                run.append(message)
+                continue
+            if run:
+                self._enqueue_all(self._batch_frames(run))
+                run = []
+            if message.coalesce:
+                run.append(message)
+            else:
+                self.enqueue(message.text)
+        if run:
+            self._enqueue_all(self._batch_frames(run))
+
+    def cancel(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.task and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    async def send(self, message: Union[str, bytes], timeout: float = WS_SEND_TIMEOUT):
+        """Send immediately, bypassing the queue. The timeout includes waiting for the writer."""
+        await asyncio.wait_for(self._send_locked(message), timeout=timeout)
+        self.sent += 1
+
+    async def _send_locked(self, message: Union[str, bytes]):
+        async with self.send_lock:
+            if isinstance(message, bytes):
+                await self.websocket.send_bytes(message)
+            else:
+                await self.websocket.send_text(message)
+
+    async def _writer(self, on_failure):
+        try:
+            while True:
+                message = await self.queue.get()
+                if self.websocket.client_state != WebSocketState.CONNECTED:
+                    break
+                await self.send(message)
+        except asyncio.CancelledError:
+            raise
+        except WebSocketDisconnect:
+            logger.info(f"User_id {self.user_id} disconnected during message send")
+        except asyncio.TimeoutError:
+            logger.warning(f"Send to user_id {self.user_id} timed out after {WS_SEND_TIMEOUT}s")
+        except Exception as e:
+            logger.error(f"Failed to send message to user_id {self.user_id}: {str(e)}")
+        await on_failure(self)
+
 class WebSocketManager:
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.user_map: Dict[str, str] = {}
+        self.active_connections: Dict[str, Set[Subscriber]] = {}
+        # Totals carried over from subscribers that have disconnected
+        self.closed_sent = 0
+        self.closed_dropped = 0
+        self.closed_coalesced = 0
+        # Sequence numbers restart with each process; clients resuming with another epoch are reset
+        self.epoch = uuid.uuid4().hex[:12]
+        self.sequences: Dict[str, int] = {}
+        self.replay_buffers: Dict[str, deque] = {}
+        # user_id -> time.monotonic() when the user's last socket here closed
+        self.idle_since: Dict[str, float] = {}
+        self.replay_expired = 0
+        # Delivers directly until main.py starts the configured backplane
+        self.backplane: Backplane = InProcessBackplane()
+        self.backplane.deliver = self.deliver_local
 
-    async def connect(self, websocket: WebSocket, user_id: str):
-        """Register WebSocket connection with user_id"""
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        delivery: str = WS_DELIVERY_MODE,
+        interval_ms: int = WS_DELIVERY_INTERVAL_MS,
+        binary: bool = False,
+        epoch: Optional[str] = None,
+        last_seq: Optional[int] = None
+    ) -> Optional[Subscriber]:
+        """Register WebSocket connection with user_id, its sensor delivery mode and wire format.
+
+        When last_seq is given, the client is first sent a resume message followed by what it missed.
+        """
         try:
-            if user_id in self.active_connections:
-                logger.warning(f"Duplicate connection for user_id {user_id}")
-                if websocket.client_state == WebSocketState.CONNECTED:
-                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Duplicate connection")
-                return False
-
-            self.active_connections[user_id] = websocket
-            self.user_map[user_id] = user_id
-            logger.info(f"User_id {user_id} connected. Active: {len(self.active_connections)}")
-            return True
+            subscriber = Subscriber(websocket, user_id, delivery=delivery, interval_ms=interval_ms, binary=binary)
+            self.active_connections.setdefault(user_id, set()).add(subscriber)
+            self.idle_since.pop(user_id, None)
+            # No await between registering and replaying, so live messages queue up after the replay
+            if last_seq is not None:
+                self._resume(subscriber, epoch, last_seq)
+            subscriber.start(self._close)
+            logger.info(
+                f"User_id {user_id} connected ({len(self.active_connections[user_id])} sockets). "
+                f"Active users: {len(self.active_connections)}"
+            )
+            return subscriber
 
         except Exception as e:
             logger.error(f"Connection error: {str(e)}")
             if websocket.client_state == WebSocketState.CONNECTED:
                 await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason="Internal error")
-            return False
+            return None
 
-    async def disconnect(self, user_id: str):
-        """Cleanup disconnected clients"""
-        websocket = self.active_connections.pop(user_id, None)
-        if websocket and websocket.client_state == WebSocketState.CONNECTED:
+    def _resume(self, subscriber: Subscriber, epoch: Optional[str], last_seq: int):
+        current = self.sequences.get(subscriber.user_id, 0)
+        buffer = self.replay_buffers.get(subscriber.user_id, ())
+        complete = epoch == self.epoch and last_seq <= current and (
+            last_seq == current or (len(buffer) > 0 and buffer[0].seq <= last_seq + 1)
+        )
+        missed = [m for m in buffer if m.seq > last_seq] if complete else []
+        subscriber.enqueue(json.dumps({
+            "type": "resume",
+            "epoch": self.epoch,
+            "seq": current,
+            "replayed": len(missed),
+            "reset": not complete
+        }))
+        subscriber.replay(missed)
+        logger.info(
+            f"User_id {subscriber.user_id} resumed from seq {last_seq}: "
+            f"{'replayed ' + str(len(missed)) + ' messages' if complete else 'gap not buffered, reset'}"
+        )
+
+    async def _close(self, subscriber: Subscriber):
+        """Unregister one subscriber, stop its writer and close its socket."""
+        subscribers = self.active_connections.get(subscriber.user_id)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.active_connections[subscriber.user_id]
+            self.idle_since[subscriber.user_id] = time.monotonic()
+        self.closed_sent += subscriber.sent
+        self.closed_dropped += subscriber.dropped
+        self.closed_coalesced += subscriber.coalesced
+
+        subscriber.cancel()
+        if subscriber.websocket.client_state == WebSocketState.CONNECTED:
             try:
-                await websocket.close(code=status.WS_1000_NORMAL_CLOSURE)
-                logger.info(f"Closed WebSocket for user_id {user_id}")
+                await subscriber.websocket.close(code=status.WS_1000_NORMAL_CLOSURE)
+                logger.info(f"Closed WebSocket for user_id {subscriber.user_id}")
             except Exception as e:
-                logger.warning(f"Error closing connection for user_id {user_id}: {str(e)}")
-
-        if user_id in self.user_map:
-            del self.user_map[user_id]
-        
-        logger.info(f"User_id {user_id} disconnected. Active: {len(self.active_connections)}")
-
-    async def broadcast_user(self, user_id: str, message: str):
-        """Send message to specific user"""
-        websocket = self.active_connections.get(user_id)
-        if not websocket:
-            logger.warning(f"User_id {user_id} is not connected. Skipping message.")
-            return
-        
+                logger.warning(f"Error closing connection for user_id {subscriber.user_id}: {str(e)}")
+
+    async def disconnect(self, user_id: str, websocket: Optional[WebSocket] = None):
+        """Cleanup disconnected clients: one socket if given, otherwise all of the user's sockets"""
+        for subscriber in list(self.active_connections.get(user_id, ())):
+            if websocket is None or subscriber.websocket is websocket:
+                await self._close(subscriber)
+
+        logger.info(f"User_id {user_id} disconnected. Active users: {len(self.active_connections)}")
+
+    async def start_backplane(self, backplane: Backplane):
+        """Swap in a cross-process backplane; messages it receives go to local sockets."""
+        await backplane.start(self.deliver_local)
+        self.backplane = backplane
+
+    async def stop_backplane(self):
+        await self.backplane.stop()
+
+    async def broadcast_user(self, user_id: str, message: Union[str, dict], coalesce: bool = False):
+        """Send message to every socket of a specific user, in whichever process holds them.
+
+        Dicts are serialised here, once. Pass coalesce=True for sensor readings that
+        sockets in "latest" or "batch" mode may merge or skip.
+        """
+        if not isinstance(message, str):
+            message = json.dumps(message)
         try:
-            if websocket.client_state == WebSocketState.CONNECTED:
-                await websocket.send_text(message)
-                logger.info(f"Sent message to user_id {user_id}: {message}")
-        except WebSocketDisconnect:
-            logger.info(f"User_id {user_id} disconnected during message send")
-            await self.disconnect(user_id)
+            await self.backplane.publish(user_id, message, coalesce)
         except Exception as e:
-            logger.error(f"Failed to send message to user_id {user_id}: {str(e)}")
-            await self.disconnect(user_id)
-            
+            logger.error(f"Backplane publish failed for user_id {user_id}, delivering locally: {str(e)}")
+            await self.deliver_local(user_id, message, coalesce)
+
+    def _resumable(self, user_id: str) -> bool:
+        """Whether a client of user_id could still resume here; forgets the user once it can't."""
+        if user_id in self.active_connections:
+            return True
+        idle_since = self.idle_since.get(user_id)
+        if idle_since is not None and time.monotonic() - idle_since <= WS_REPLAY_TTL:
+            return True
+        self.idle_since.pop(user_id, None)
+        if self.sequences.pop(user_id, None) is not None:
+            self.replay_buffers.pop(user_id, None)
+            self.replay_expired += 1
+        return False
+
+    def expire_replay(self):
+        """Drop sequences and replay buffers of users idle here for longer than WS_REPLAY_TTL."""
+        for user_id in list(self.sequences.keys() | self.idle_since.keys()):
+            self._resumable(user_id)
+
+    async def deliver_local(self, user_id: str, message: str, coalesce: bool = False):
+        """Number and buffer the message, then queue it on this process's sockets for the user"""
+        if not self._resumable(user_id):
+            # Expected with several workers: the user's sockets live in another process
+            logger.debug(f"User_id {user_id} is not connected here")
+            return
+        seq = self.sequences.get(user_id, 0) + 1
+        self.sequences[user_id] = seq
+        if message.startswith('{"'):
+            # Splice the sequence number into the already-serialised object
+            message = f'{{"seq": {seq}, ' + message[1:]
+        outgoing = Outgoing(message, coalesce, seq)
+        if WS_REPLAY_BUFFER_SIZE > 0:
+            buffer = self.replay_buffers.get(user_id)
+            if buffer is None:
+                buffer = self.replay_buffers[user_id] = deque(maxlen=WS_REPLAY_BUFFER_SIZE)
+            buffer.append(outgoing)
+
+        subscribers = self.active_connections.get(user_id)
+        if not subscribers:
+            # Disconnected less than WS_REPLAY_TTL ago: kept for a resume
+            logger.debug(f"User_id {user_id} has no sockets here. Buffered message {seq}.")
+            return
+
+        for subscriber in subscribers:
+            subscriber.offer(outgoing)
+        logger.debug(f"Queued message for user_id {user_id} on {len(subscribers)} sockets")
+
+    def subscribers(self):
+        return [s for subscribers in self.active_connections.values() for s in subscribers]
+
+    async def _send_all(self, subscribers: List[Subscriber], message: str) -> List[Subscriber]:
+        """Send to every subscriber concurrently, at most WS_BROADCAST_CONCURRENCY at a time.
+
+        Returns the subscribers that are disconnected, failed or timed out.
+        """
+        semaphore = asyncio.Semaphore(WS_BROADCAST_CONCURRENCY)
+
+        async def send_one(subscriber: Subscriber) -> Optional[Subscriber]:
+            if subscriber.websocket.client_state != WebSocketState.CONNECTED:
+                return subscriber
+            async with semaphore:
+                try:
+                    await subscriber.send(message)
+                    return None
+                except Exception as e:
+                    logger.debug(f"Send to user_id {subscriber.user_id} failed: {str(e) or type(e).__name__}")
+                    return subscriber
+
+        results = await asyncio.gather(*(send_one(s) for s in subscribers))
+        return [s for s in results if s is not None]
+
+    async def _evict(self, subscribers: List[Subscriber], reason: str):
+        if not subscribers:
+            return
+        await asyncio.gather(*(self._close(s) for s in subscribers), return_exceptions=True)
+        logger.info(f"Evicted {len(subscribers)} dead connections after {reason}")
+
     async def ping_connections(self, interval: int = 30):
-        """Periodically ping connected clients"""
+        """Periodically ping connected clients and expire idle replay state"""
         while True:
             await asyncio.sleep(interval)
-            for user_id, websocket in list(self.active_connections.items()):
-                try:
-                    if websocket.client_state != WebSocketState.CONNECTED:
-                        await self.disconnect(user_id)
-                        continue
-                    await websocket.send_text("ping")
-                except Exception as e:
-                    logger.warning(f"Error pinging user_id {user_id}: {str(e)}")
-                    await self.disconnect(user_id)
+            self.expire_replay()
+            try:
+                failed = await self._send_all(self.subscribers(), "ping")
+                await self._evict(failed, "ping")
+            except Exception as e:
+                logger.warning(f"Error pinging connections: {str(e)}")
 
     async def broadcast(self, message: str):
         """Broadcast to all connected users"""
-        disconnected = []
-        for user_id, ws in self.active_connections.items():
-            try:
-                if ws.client_state == WebSocketState.CONNECTED:
-                    await ws.send_text(message)
-            except WebSocketDisconnect:
-                logger.info(f"User_id {user_id} disconnected during broadcast")
-                disconnected.append(user_id)
-            except Exception as e:
-                logger.error(f"Broadcast error to user_id {user_id}: {str(e)}")
-                disconnected.append(user_id)
+        failed = await self._send_all(self.subscribers(), message)
+        await self._evict(failed, "broadcast")
 
-        for user_id in disconnected:
-            await self.disconnect(user_id)
+    def metrics(self) -> dict:
+        subscribers = self.subscribers()
+        depths = [s.queue.qsize() for s in subscribers]
+        return {
+            "users": len(self.active_connections),
+            "connections": len(subscribers),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "sent": self.closed_sent + sum(s.sent for s in subscribers),
+            "dropped": self.closed_dropped + sum(s.dropped for s in subscribers),
+            "coalesced": self.closed_coalesced + sum(s.coalesced for s in subscribers),
+            "replay_buffers": len(self.replay_buffers),
+            "replay_messages": sum(len(b) for b in self.replay_buffers.values()),
+            "replay_expired": self.replay_expired,
+            "backplane": self.backplane.metrics()
+        }
 
 # Singleton instance
-websocket_manager = WebSocketManager()
\ No newline at end of file
+websocket_manager = WebSocketManager()